@@ -5,6 +5,14 @@
 # and other game code. It will search in
 # this directory and in Thonny's directory.
 
+#Lets us measure how long each frame takes to make
+import time
+#Times each part of starting up, and loads the first
+#level in the background while the main menu is up.
+#This comes first so it can time the other imports too.
+import startup
+startup_timer = startup.Startup_Timer()
+
 #Import Pygame
 import pygame
 #Share all of Pygame's methods and variables
@@ -20,16 +28,6 @@ from pygame.locals import *
 import math
 import random
 
-#Import functions that let us read and write
-#to .tmx files, which are what Tiled Map Editor
-#creates. If you don't have pytmx, it can be
-#added from within Thonny under Tools->Manage Packages.
-import pytmx
-#Share one of pytmx's methods.Note that we're not using
-#the * function this time, so the only methods that
-#get imported are those we expressly name.
-from pytmx.util_pygame import load_pygame
-
 #Import other game files. These are in the same
 #directory as Notmario and exist basically to help
 #organize the code.
@@ -44,80 +42,233 @@ import constants
 #More bad practice importing all of constant
 from constants import *
 
-#Import the game classes
-import game_objects
-import camera
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Handles the window and scaling the game's picture up to fit it
+import window
+#Turns graphics quality down when frames take too long
+import governor
+#The sound bank, which loads and plays all the sound effects and music
+import audio
+#Runs the simulation on a second thread, if PIPELINED_MODE is on
+import pipeline
+#Keeps track of memory use, to find leaks
+import memory_tracker
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Keeps the garbage collector from pausing the game while playing
+import gc_control
+
+#The game classes (game_objects and camera) and pytmx, which
+#reads the maps, aren't imported here. Nothing needs them until
+#the level loads, so load_starting_level() below imports them
+#in the background while the menu is up.
+
+startup_timer.stage_done("imports")
 
 # ============================================
 # ==     I N I T I A L I Z A T I O N        ==
 # ============================================
 # This section sets up the objects and variables
 # I will need in the game loop later.
+#
+# To get the menu up as fast as possible, we only set up
+# what the menu needs (the window and a font) first. The
+# level, sprites and sounds load in the background while
+# the menu is showing.
 
 #Screen - This is the game screen we'll see
-# in windows.
+# in windows. We draw everything onto "screen", which is
+# always SCREEN_W x SCREEN_H, and the game window scales
+# it up to fit whatever size the real window is.
 pygame.init()
-width, height = SCREEN_W, SCREEN_H
-screen=pygame.display.set_mode((width, height))
+game_window = window.open_game_window()
+screen = game_window.render_target
+startup_timer.stage_done("pygame and window")
 
-#Input - This is an array that will hold
-# information about what keys we pressed.
-keys = [False, False, False, False, False, False, False, False]
+# Set up the menus
+pygame.font.init()
+myfont = pygame.font.SysFont('Times New Roman', 30)
+startup_timer.stage_done("fonts")
 
-# Create a new sprite handler object.
-sprite_handler=game_objects.Sprite_Handler()
+# Everything the game needs before it can start playing on a map.
+# This runs on the background loader, so it mustn't touch the window.
+def load_starting_level(map_name):
+
+    startup_timer.start_track("loader")
+    import game_objects
+    import camera
+    startup_timer.stage_done("imports", "loader")
+
+    # Create a new sprite handler object.
+    sprite_handler=game_objects.Sprite_Handler()
+    # Add the second player before the map loads, so they get put at the
+    # entrance too.
+    if(SPLIT_SCREEN == True): sprite_handler.add_player_two()
+    startup_timer.stage_done("sprite handler", "loader")
+
+    if(WORLD_MODE == True):
+        # In world mode, the "map" is the whole world, and it draws
+        # itself from the maps it has loaded. See world.py.
+        import world
+        tmxdata = world.World(WORLD_FILE, map_name)
+        enter_map(tmxdata, sprite_handler, RIGHT)
+    else:
+        # Loading a new map and associated information
+        tmxdata = load_new_map(map_name, sprite_handler, RIGHT) # Load new map and ask Sprite Handler to redo sprites
+                                                                # Use "RIGHT" as default entrance tile.
+    startup_timer.stage_done("parse map and spawn", "loader")
+
+    if(is_streamed_map(tmxdata)):
+        # Streamed maps draw themselves a bit at a time, so there's no
+        # picture of the whole map.
+        map_image = None
+        loaded_map_image = None
+    else:
+        map_image = load_map_image(tmxdata) # Set up an image size for the new map
+        loaded_map_image = load_map_image(tmxdata) # Save a copy of the new map's appareance
+        blit_all_tiles(loaded_map_image, tmxdata, (0, 0))
+        startup_timer.stage_done("render map", "loader")
+
+    # Load all the sound effects now so there's no hiccup the first time
+    # one plays. Music isn't loaded here; it streams from the file as it plays.
+    sound_bank = audio.get_sound_bank()
+    startup_timer.stage_done("sound effects", "loader")
+
+    # Create a game camera to handle rendering. In split screen, each
+    # player gets a camera half the height of the screen.
+    player_two_camera = None
+    if(SPLIT_SCREEN == True):
+        game_camera=camera.Camera((SCREEN_W, SCREEN_H//2))
+        player_two_camera=camera.Camera((SCREEN_W, SCREEN_H//2))
+        player_two_camera.change_follow(sprite_handler.player_two)
+        player_two_camera.snap_to_target()
+    else:
+        game_camera=camera.Camera()
+    # Tell camera to follow the player sprite
+    game_camera.change_follow(sprite_handler.get_player())
+    game_camera.snap_to_target()
+    startup_timer.stage_done("camera", "loader")
+
+    return sprite_handler, tmxdata, map_image, loaded_map_image, sound_bank, game_camera, player_two_camera
 
 # Set the starting map
 current_map = "Notlevel1.tmx"
 screen_transition = False # A variable to tell us if we're in the middle of transitioning screens.
 screen_transition_counter = 0
 
-# Loading a new map and associated information
-tmxdata = load_new_map(current_map, sprite_handler, RIGHT) # Load new map and ask Sprite Handler to redo sprites
-                                                           # Use "RIGHT" as default entrance tile.
+# Writes down memory use at every map load, transition and respawn.
+# It has to start before anything gets loaded. See memory_tracker.py.
+game_memory = None
+if(MEMORY_TRACKING == True):
+    game_memory = memory_tracker.Memory_Tracker()
 
-map_width = tmxdata.width*TILESIZE # Save the size of the incoming map
-map_height = tmxdata.height*TILESIZE
-map_image = load_map_image(tmxdata) # Set up an image size for the new map
+# Start loading, then show the main menu while that happens.
+level_loader = startup.Background_Loader(load_starting_level, (current_map,), BACKGROUND_LOADING)
+
+# A clock. This will make our game run the same speed regardless of hardware.
+clock = pygame.time.Clock()
 
-loaded_map_image =  pygame.Surface((map_width, map_height)) # Save a copy of the new map's appareance
-loaded_oldmap_image = pygame.Surface((SCREEN_W, SCREEN_H)) # Used during screen transitions
-loaded_newmap_image = pygame.Surface((SCREEN_W, SCREEN_H)) # Used during screen transitions
-blit_all_tiles(loaded_map_image, tmxdata, (0, 0)) 
+main_menu(screen, clock, myfont, lambda: startup_timer.milestone("menu on screen"))
+startup_timer.stage_done("main menu")
 
-# Set up the game music track.
-background_music = pygame.mixer.Sound("lost_woods.wav")
-background_music.set_volume(0.3)
+# If the player was quicker than the loader, let them know we're working on it.
+if not level_loader.is_done():
+    loading_screen(screen, myfont)
+sprite_handler, tmxdata, map_image, loaded_map_image, sound_bank, game_camera, player_two_camera = level_loader.wait(pygame.event.pump)
+# The loader is still holding onto everything it loaded, which would keep
+# the first map in memory forever. We're done with it, so let it go.
+level_loader = None
+startup_timer.stage_done("waiting for loader")
 
-# Create a new player object. Note that I have to use "game_object."
-# to tell the code where to find the class definition because I did
-# not expressly import that class from "game_object" above when I did
-# my import statements.
+map_width = tmxdata.width*TILESIZE # Save the size of the incoming map
+map_height = tmxdata.height*TILESIZE
+loaded_oldmap_image = surfaces.new_surface((SCREEN_W, SCREEN_H), category = "transition") # Used during screen transitions
+loaded_newmap_image = surfaces.new_surface((SCREEN_W, SCREEN_H), category = "transition") # Used during screen transitions
+
+#Input - This is an array that will hold
+# information about what keys we pressed.
+keys = [False, False, False, False, False, False, False, False, False]
 
-# Create a game camera to handle rendering.
-game_camera=camera.Camera()
-# Tell camera to follow the player sprite
-game_camera.change_follow(sprite_handler.get_player())
-game_camera.snap_to_target()
+# The second player's keys, in split screen, and which keyboard keys
+# press which of them.
+player_two_keys = None
+if(SPLIT_SCREEN == True):
+    player_two_keys = [False, False, False, False, False, False, False, False, False]
+player_two_bindings = {K_UP: UP, K_DOWN: DOWN, K_LEFT: LEFT, K_RIGHT: RIGHT, K_RCTRL: JUMP, K_RSHIFT: SHOOT}
 
 # A variable to track if our code should exit
 done = False
 
-# A clock. This will make our game run the same speed regardless of hardware.
-clock = pygame.time.Clock()
+# Watches how long frames take and turns quality down if they're too slow.
+quality_governor = governor.Quality_Governor()
 
-# Set up the menus
-pygame.font.init()
-myfont = pygame.font.SysFont('Times New Roman', 30)
+# Now the first map is loaded, write down how much memory it took.
+if(game_memory is not None): game_memory.mark("map load", current_map)
+
+# Tells the garbage collector when it's a good time to clean up.
+# See gc_control.py.
+gc_manager = None
+if(GC_CONTROL == True):
+    gc_manager = gc_control.GC_Manager()
+    gc_manager.after_map_load()
+
+# Shows changes to the map as soon as they're saved in Tiled.
+# See hot_reload.py.
+map_watcher = None
+if(HOT_RELOAD == True):
+    import hot_reload
+    map_watcher = hot_reload.Map_Watcher(current_map)
 
 # Start music once menu is done
-background_music.play(-1)
+sound_bank.play_music(MUSIC_FILE)
 
 # Variables to control the state of the game.
-game_state = MAIN_MENU
+# The main menu has already been shown, so go straight to playing.
+game_state = PLAYING
 player_has_died = False
 player_death_counter = 0
 
+# Set this whenever something other than the game (like a menu) has drawn
+# on the screen, so the next frame redraws everything instead of just the
+# dirty rectangles.
+force_full_redraw = True
+last_hud_size = (0,0)
+
+# Press F3 to show the counters on screen. See counters.py.
+show_counters = False
+
+# One tick of the game: move everything, check collisions, move the camera.
+# In pipelined mode this runs on the simulation thread, so it mustn't
+# touch the window or anything else the renderer is using.
+@tracing.traced("simulate tick", "update")
+def simulate_tick(keys):
+
+    # Update game objects
+    sprite_handler.update(tmxdata, keys, player_two_keys)
+
+    # Check for collisions
+    sprite_handler.player_enemy_collision_check()
+    sprite_handler.projectile_collision_check()
+
+    # Update the camera
+    game_camera.update(map_width,map_height,keys)
+    if(player_two_camera is not None):
+        # Enemies near either player keep moving.
+        player_two_camera.update(map_width,map_height,keys)
+        sprite_handler.set_activity_area(game_camera.get_view_rect().union(player_two_camera.get_view_rect()))
+    else:
+        sprite_handler.set_activity_area(game_camera.get_view_rect())
+
+# In pipelined mode, the simulation runs on its own thread. See pipeline.py.
+# Streamed maps load bits of themselves between ticks, so they don't
+# use it even when it's on. Neither does split screen.
+sim_pipeline = None
+if(PIPELINED_MODE == True and SPLIT_SCREEN == False):
+    sim_pipeline = pipeline.Sim_Pipeline(sprite_handler, game_camera, simulate_tick)
+
 # Oh boy it's the
 # =========================================
 # ==        G A M E  L O O P             ==
@@ -126,6 +277,11 @@ player_death_counter = 0
 
 while not done:
     
+    # Remember when this frame started so we can see how long it took.
+    frame_start_time = time.perf_counter()
+    tracing.begin_frame()
+    tracing.begin("input")
+    
     # ----------------------------
     # Updating
     # ----------------------------
@@ -139,11 +295,16 @@ while not done:
         
         if event.type==pygame.QUIT:
             done = True
+
+        # Let the window deal with being resized or going fullscreen.
+        game_window.handle_event(event)
             
         # When I'm changing the keys array, see how I'm using UP, DOWN, LEFT, RIGHT
         # as my indexes? It makes it super easy to understand what each element in the
         # keys array is used for, right? That's why I used them as global constants!
         if event.type == pygame.KEYDOWN:
+            if(player_two_keys is not None and event.key in player_two_bindings):
+                player_two_keys[player_two_bindings[event.key]] = True
             if event.key==K_w:
                 keys[UP]=True
             elif event.key==K_s:
@@ -154,14 +315,23 @@ while not done:
                 keys[RIGHT]=True
             elif event.key==K_SPACE:
                 keys[JUMP]=True
+            elif event.key==K_j:
+                keys[SHOOT]=True
             elif event.key==K_g:
                 keys[ZOOM_IN]=True
             elif event.key==K_h:
                 keys[ZOOM_OUT]=True
             elif event.key==K_ESCAPE:
                 keys[PAUSE] = True
+            elif event.key==K_F9:
+                tracing.save()
+            elif event.key==K_F3:
+                show_counters = not show_counters
+                force_full_redraw = True
                 
         if event.type == pygame.KEYUP:
+            if(player_two_keys is not None and event.key in player_two_bindings):
+                player_two_keys[player_two_bindings[event.key]] = False
             if event.key==K_w:
                 keys[UP]=False
             elif event.key==K_s:
@@ -172,6 +342,8 @@ while not done:
                 keys[RIGHT]=False
             elif event.key==K_SPACE:
                 keys[JUMP]=False
+            elif event.key==K_j:
+                keys[SHOOT]=False
             elif event.key==K_g:
                 keys[ZOOM_IN]=False
             elif event.key==K_h:
@@ -179,17 +351,28 @@ while not done:
             elif event.key==K_ESCAPE:
                 keys[PAUSE] = False
     
+    tracing.end()
+    tracing.begin("update")
+
+    # Only keep the garbage collector quiet while the game is being played.
+    if(gc_manager is not None): gc_manager.set_playing(game_state == PLAYING)
+
     # Main menu state just displays the main menu until the state ends.
     if(game_state == MAIN_MENU):
         
-        background_music.stop()
+        sound_bank.stop_music()
+        # Nobody will notice a pause while the menu comes up, so clean up now.
+        if(gc_manager is not None): gc_manager.collect()
         main_menu(screen, clock, myfont)
         game_state = PLAYING
-        background_music.play(-1)
+        force_full_redraw = True
+        if(sim_pipeline is not None): sim_pipeline.resync()
+        sound_bank.play_music(MUSIC_FILE)
         
     elif(game_state == GAME_OVER):
         
-        background_music.stop()
+        sound_bank.stop_music()
+        if(gc_manager is not None): gc_manager.collect()
         game_over_menu(screen, clock, myfont)
         
         # Add code to reload game from save (once save is made)        
@@ -197,7 +380,10 @@ while not done:
         player_death_counter = 0
         sprite_handler.reset_player(tmxdata)
         game_state = PLAYING
-        background_music.play(-1)      
+        force_full_redraw = True
+        if(sim_pipeline is not None): sim_pipeline.resync()
+        if(game_memory is not None): game_memory.mark("respawn", current_map)
+        sound_bank.play_music(MUSIC_FILE)      
         
     # Paused state renders the background and but doesn't update sprites
     elif(game_state == PAUSED):
@@ -218,84 +404,231 @@ while not done:
         # Check to see if we need to load a new map.
         checked_exit_dict = sprite_handler.check_for_map_exit(tmxdata)
         
-        # Save the last image of the map in case we screen transition.
-        # Important to do this before we update and redraw next frame.
-        loaded_oldmap_image = game_camera.draw(map_image)
-        
         # If player is on an exit tile, transition to new screen and start playing there.
         if(checked_exit_dict["dest"] != "none"):
+            tracing.begin("transition", "load")
             
+            # Save the last image of the map for the screen transition.
+            # Important to do this before we update and redraw next frame.
+            if(map_image is not None): loaded_oldmap_image = game_camera.draw(map_image)
+
             proposed_map = checked_exit_dict["dest"]
             new_tmxdata = preview_new_map(proposed_map) # Load new map and ask Sprite Handler to redo sprites
             landing_coords = get_landing_coords(new_tmxdata, checked_exit_dict["dir"])
             landing_x = landing_coords[0]
             landing_y = landing_coords[1]
 
-            # Convert the direction of the transition to one of the globals. The map data will be in STRING format.
-            direction = 0
-            if(checked_exit_dict["dir"] == "UP"): direction = UP
-            elif(checked_exit_dict["dir"] == "DOWN"): direction = DOWN
-            elif(checked_exit_dict["dir"] == "LEFT"): direction = LEFT
-            elif(checked_exit_dict["dir"] == "RIGHT"): direction = RIGHT
+            # Convert the direction of the transition to one of the globals.
+            direction = direction_from_name(checked_exit_dict["dir"])
                              
             # Actually carry out the transition
             composite_screen = create_transition_screen(tmxdata, new_tmxdata,landing_x,landing_y,
                                                         direction,game_camera, keys)
             scroll_transition_screen(composite_screen, direction, screen, clock)
+            # Let go of the preview map and the transition picture, or they
+            # stay in memory until the next transition.
+            new_tmxdata = None
+            composite_screen = None
             
             # Load the new map and get ready to play on it.        
+            old_map = current_map
             current_map = proposed_map
             tmxdata = load_new_map(current_map, sprite_handler,direction) # Load new map and ask Sprite Handler to redo sprites
             game_camera.snap_to_target()
+            if(player_two_camera is not None): player_two_camera.snap_to_target()
             map_width = tmxdata.width*TILESIZE # Save the size of the incoming map
             map_height = tmxdata.height*TILESIZE
-            map_image = load_map_image(tmxdata) # Set up an image size for the new map
-            loaded_map_image =  pygame.Surface((map_width, map_height)) # Save a copy of the new map's appareance
-            blit_all_tiles(loaded_map_image, tmxdata, (0, 0))
+            if(is_streamed_map(tmxdata)):
+                map_image = None
+                loaded_map_image = None
+            else:
+                map_image = load_map_image(tmxdata) # Set up an image size for the new map
+                loaded_map_image = load_map_image(tmxdata) # Save a copy of the new map's appareance
+                blit_all_tiles(loaded_map_image, tmxdata, (0, 0))
+            if(gc_manager is not None): gc_manager.after_map_load()
+            if(map_watcher is not None): map_watcher.watch(current_map)
+            force_full_redraw = True
+            if(sim_pipeline is not None): sim_pipeline.resync()
+            if(game_memory is not None): game_memory.mark("transition", current_map, old_map + " -> " + current_map)
+            tracing.end()
 
-        # Update game objects
-        sprite_handler.update(tmxdata, keys)
-        
-        # Check for collisions
-        sprite_handler.player_enemy_collision_check()
-        
-        # Update the camera
-        game_camera.update(map_width,map_height,keys)
-        
-        # Stop music if player died.
-        check_player = sprite_handler.get_player()
-        if check_player.state == DEAD:
-            background_music.stop()
+        # Stop music if player died (both players, in split screen).
+        if sprite_handler.all_players_dead():
+            sound_bank.stop_music()
             player_has_died = True
             
         if(player_has_died == True):
             player_death_counter += 1
             if(player_death_counter >= 200): game_state = GAME_OVER
+
+        # Pick up any changes saved to the map. The sprites and the camera
+        # stay where they are.
+        if(map_watcher is not None and is_streamed_map(tmxdata) == False and map_watcher.files_changed()):
+            if(sim_pipeline is not None): sim_pipeline.finish_tick()
+            reloaded_tmxdata = map_watcher.reload(tmxdata, loaded_map_image)
+            if(reloaded_tmxdata is not tmxdata):
+                # Something other than tiles changed, so the whole map
+                # got loaded again and needs drawing from scratch.
+                tmxdata = reloaded_tmxdata
+                map_width = tmxdata.width*TILESIZE
+                map_height = tmxdata.height*TILESIZE
+                map_image = load_map_image(tmxdata)
+                loaded_map_image = load_map_image(tmxdata)
+                blit_all_tiles(loaded_map_image, tmxdata, (0, 0))
+            force_full_redraw = True
+            if(sim_pipeline is not None): sim_pipeline.resync()
+
+        # Streamed maps load the bits the player is getting close to and
+        # unload the ones they've left behind.
+        if(is_streamed_map(tmxdata)):
+            tmxdata.update(sprite_handler)
+
+        # Move everything. In pipelined mode this just starts the tick on
+        # the simulation thread, and it keeps going while we draw below.
+        if(sim_pipeline is not None and is_streamed_map(tmxdata) == False):
+            sim_pipeline.start_tick(keys)
+        else:
+            simulate_tick(keys)
         
+    tracing.end()
+
     # ----------------------------
     # Rendering (Do this in all states)
     # ----------------------------
     # This section handles actually preparing and drawing the screen
     # based on what the currently updated state of the game is.
+    tracing.begin("render")
 
     # Build the map_image
     # Note that we're applying camera offsets because, if we draw the whole map at once
     # first, it starts to slow down dramatically.
-    map_image.fill(0)
-    map_image.blit((loaded_map_image),(0,0))
-        
-    # Draw sprites on map
-    sprite_handler.draw(map_image)
-    map_image.convert()
-        
-    # Draw the right portion of the map to the screen    
-    screen.fill(0)
-    screen.blit(game_camera.draw(map_image),(0,0))
-    screen.blit(sprite_handler.draw_hud(),(16,16))
-
-    # No matter what state we are in, flip the screen.
-    #Update the screen
-    pygame.display.flip()
+    # If the camera hasn't moved, we only need to paint the clean map back over
+    # where the sprites were last frame instead of copying the whole map again.
+    # The HUD changing size (when you lose a heart) also needs a full redraw.
+    if(player_two_camera is not None):
+        # Split screen. The map picture and the sprites are the same for
+        # both players, so make them once and let each camera take its own
+        # bit. A streamed map draws each camera's view instead, from the
+        # same cache of map pictures.
+        views = []
+        if(is_streamed_map(tmxdata)):
+            for view_camera in (game_camera, player_two_camera):
+                view_rect = view_camera.get_view_rect()
+                canvas = tmxdata.draw(view_rect)
+                sprite_handler.draw(canvas, (-view_rect.x, -view_rect.y))
+                views.append(view_camera.draw(canvas, canvas.get_rect()))
+        else:
+            map_image.blit((loaded_map_image),(0,0))
+            sprite_handler.draw(map_image)
+            views.append(game_camera.draw(map_image))
+            views.append(player_two_camera.draw(map_image))
+        screen.fill(0)
+        screen.blit(views[0],(0,0))
+        screen.blit(views[1],(0,SCREEN_H//2))
+        pygame.draw.line(screen, (0,0,0), (0,SCREEN_H//2), (SCREEN_W,SCREEN_H//2), 2)
+        screen.blit(sprite_handler.draw_hud(0),(16,16))
+        screen.blit(sprite_handler.draw_hud(1),(16,SCREEN_H//2+16))
+        if(show_counters == True): counter_overlay(screen, myfont)
+        game_window.present()
+        force_full_redraw = False
+    elif(is_streamed_map(tmxdata)):
+        # There's no picture of the whole map, so draw just what the
+        # camera can see onto a canvas the size of its view, and move the
+        # sprites to match. It always redraws the whole screen.
+        view_rect = game_camera.get_view_rect()
+        canvas = tmxdata.draw(view_rect)
+        sprite_handler.draw(canvas, (-view_rect.x, -view_rect.y))
+        hud_image = sprite_handler.draw_hud()
+        screen.fill(0)
+        screen.blit(game_camera.draw(canvas, canvas.get_rect()),(0,0))
+        screen.blit(hud_image,(16,16))
+        if(show_counters == True): counter_overlay(screen, myfont)
+        game_window.present()
+        force_full_redraw = False
+    elif(sim_pipeline is not None):
+        # In pipelined mode, draw everything from the last tick's snapshot
+        # while the simulation thread works on the next one. It always
+        # redraws the whole screen.
+        snapshot = sim_pipeline.front
+        map_image.blit((loaded_map_image),(0,0))
+        sim_pipeline.draw(map_image)
+        screen.fill(0)
+        screen.blit(game_camera.draw(map_image, snapshot.view_rect),(0,0))
+        screen.blit(snapshot.hud_image,(16,16))
+        if(show_counters == True): counter_overlay(screen, myfont)
+        game_window.present()
+        force_full_redraw = False
+
+        # Now wait for the simulation to catch up before anything else
+        # touches the sprites.
+        with tracing.span("wait for simulation", "update"):
+            sim_pipeline.finish_tick()
+    else:
+        hud_image = sprite_handler.draw_hud()
+        draw_dirty_only = (DIRTY_RECT_MODE and not force_full_redraw and game_camera.is_still()
+                           and hud_image.get_size() == last_hud_size and not show_counters)
+        last_hud_size = hud_image.get_size()
+        if(draw_dirty_only == True):
+            sprite_handler.erase(map_image, loaded_map_image)
+        else:
+            map_image.blit((loaded_map_image),(0,0))
+
+        # Draw sprites on map
+        changed_rects = sprite_handler.draw(map_image)
+        surfaces.check_display_format(loaded_map_image, "loaded_map_image")
+        surfaces.check_display_format(hud_image, "Hud.draw")
+
+        # Draw the right portion of the map to the screen
+        screen.fill(0)
+        screen.blit(game_camera.draw(map_image),(0,0))
+        screen.blit(hud_image,(16,16))
+        if(show_counters == True): counter_overlay(screen, myfont)
+
+        if(draw_dirty_only == True):
+            # Only send the bits of the screen that changed to the display.
+            screen_rects = game_camera.map_rects_to_screen(changed_rects)
+            screen_rects.append(hud_image.get_rect(topleft=(16,16)))
+            game_window.present(screen_rects)
+        else:
+            # No matter what state we are in, flip the screen.
+            #Update the screen
+            game_window.present()
+            force_full_redraw = False
     
+    tracing.end()
+
+    # Let the governor know how long this frame took (not counting the
+    # time clock.tick() spends waiting) and adjust quality to match.
+    if(QUALITY_GOVERNOR == True and game_state == PLAYING):
+        quality_governor.record(time.perf_counter() - frame_start_time)
+        quality_governor.apply(game_camera, sprite_handler)
+        if(player_two_camera is not None): quality_governor.apply(player_two_camera, sprite_handler)
+
+    # Sounds played this frame can be played again next frame.
+    sound_bank.end_frame()
+    counters.end_frame()
+
+    # If this frame finished early, use the spare time to collect garbage.
+    if(gc_manager is not None):
+        gc_manager.idle(FRAME_BUDGET_MS - (time.perf_counter() - frame_start_time) * 1000)
+
+    # Once the first frame of the game is on the screen, say how long
+    # starting up took.
+    if(startup_timer is not None):
+        startup_timer.milestone("first game frame")
+        if(STARTUP_REPORT == True): startup_timer.report()
+        startup_timer = None
+
     # Set the game to run at 60fps
-    clock.tick(60)
+    with tracing.span("wait", "frame"):
+        clock.tick(60)
+    tracing.end_frame()
+
+# Save the memory report for comparing with later runs.
+if(game_memory is not None):
+    game_memory.print_summary()
+    game_memory.export()
+tracing.save()
+counters.close()
+if(gc_manager is not None and GC_REPORT == True): gc_manager.print_summary()
+
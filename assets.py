@@ -0,0 +1,225 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+
+#io has the basic "file-like object" that pygame knows how to read from
+import io
+import os
+#json is how the archive's table of contents is written
+import json
+#mmap lets us treat a whole file like one big chunk of memory
+import mmap
+#struct turns raw bytes into numbers
+import struct
+#Makes sure only one thread opens the archive
+import threading
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+# ============================================
+# ==           ASSET ARCHIVE                ==
+# ============================================
+# Instead of opening dozens of loose files (every picture,
+# sound and map), a finished copy of the game can keep
+# them all packed into ONE file, the "asset archive". You
+# make it by running pack_assets.py.
+#
+# When the game starts, we "memory map" the archive. That
+# asks the operating system to make the file look like a
+# chunk of memory. Nothing actually gets read until we look
+# at it, and the operating system keeps the bits we use
+# cached for us. When pygame wants a picture out of the
+# archive, we give it a little file-like object that reads
+# straight out of that memory instead of a real file.
+#
+# If there's no archive (like while you're working on the
+# game), everything just loads from the loose files the
+# same as always.
+#
+# The archive looks like this:
+#   8 bytes   ARCHIVE_MAGIC, so we know it's really an archive
+#   4 bytes   how long the table of contents is
+#   ...       the table of contents: JSON of {name: [offset, size]}
+#   ...       every file's bytes, one after another
+
+ARCHIVE_MAGIC = b"NMPAK\x00\x01\x00"
+HEADER_FORMAT = "<8sI"
+
+class Asset_Archive(object):
+
+    def __init__(self, filename):
+
+        self.filename = filename
+        self.file = open(filename, "rb")
+        self.memory = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        # A memoryview lets us slice the archive without copying it.
+        self.view = memoryview(self.memory)
+
+        magic, index_size = struct.unpack_from(HEADER_FORMAT, self.memory, 0)
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError(filename + " is not an asset archive")
+        index_start = struct.calcsize(HEADER_FORMAT)
+        self.index = json.loads(bytes(self.view[index_start:index_start + index_size]))
+
+    def has(self, name):
+        return asset_name(name) in self.index
+
+    # The bytes of one file, as a view into the archive (no copying).
+    def get_view(self, name):
+        offset, size = self.index[asset_name(name)]
+        return self.view[offset:offset + size]
+
+    # A file-like object that reads one file out of the archive.
+    def open(self, name):
+        return Asset_File(self.get_view(name), asset_name(name))
+
+# A read-only "file" whose contents are a slice of the archive.
+# pygame only needs read(), seek() and tell(), and io.RawIOBase
+# builds read() for us out of readinto().
+class Asset_File(io.RawIOBase):
+
+    def __init__(self, view, name):
+        io.RawIOBase.__init__(self)
+        self.data = view
+        self.name = name
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self.data) - self.position)
+        if count <= 0: return 0
+        buffer[:count] = self.data[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence = io.SEEK_SET):
+        if whence == io.SEEK_SET: self.position = offset
+        elif whence == io.SEEK_CUR: self.position += offset
+        elif whence == io.SEEK_END: self.position = len(self.data) + offset
+        self.position = max(0, self.position)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+# Every name in the archive is written the same way, so "./Jump.wav"
+# and "Jump.wav" find the same file.
+def asset_name(filename):
+    return os.path.normpath(filename).replace("\\", "/")
+
+# ---------------------------------
+# Shortcuts
+# ---------------------------------
+# The archive gets opened the first time something is loaded.
+# The background loader and the main game can both load things,
+# so the lock makes sure it only gets opened once.
+
+current_archive = None
+archive_checked = False
+archive_lock = threading.Lock()
+
+def get_archive():
+    global current_archive, archive_checked
+    with archive_lock:
+        if archive_checked == False:
+            archive_checked = True
+            if os.path.exists(ASSET_ARCHIVE):
+                try:
+                    current_archive = Asset_Archive(ASSET_ARCHIVE)
+                except (OSError, ValueError) as error:
+                    print("Unable to open asset archive:", error)
+    return current_archive
+
+# True if this file should come out of the archive.
+def in_archive(filename):
+    archive = get_archive()
+    return archive is not None and archive.has(filename)
+
+# Open an asset for reading, from the archive if it's there and
+# from the loose file if it isn't.
+def open_asset(filename):
+    if in_archive(filename):
+        return get_archive().open(filename)
+    return open(filename, "rb")
+
+def load_image(filename):
+    with tracing.span("load image", "asset", filename):
+        if in_archive(filename):
+            return pygame.image.load(get_archive().open(filename), filename)
+        return pygame.image.load(filename)
+
+def load_sound(filename):
+    with tracing.span("load sound", "asset", filename):
+        if in_archive(filename):
+            return pygame.mixer.Sound(file = get_archive().open(filename))
+        return pygame.mixer.Sound(filename)
+
+# Music streams from the file while it plays, so the file-like
+# object has to stay alive. Hang on to whatever this returns
+# until the music stops.
+def load_music(filename):
+    with tracing.span("load music", "asset", filename):
+        if in_archive(filename):
+            music_file = get_archive().open(filename)
+            pygame.mixer.music.load(music_file, filename)
+            return music_file
+        pygame.mixer.music.load(filename)
+        return None
+
+# Load a Tiled map. pack_assets.py puts each tileset straight into
+# the map and points its image at a file in the archive, so pytmx
+# never has to go looking for .tsx files.
+def load_tiled_map(filename):
+    with tracing.span("load tiled map", "asset", filename):
+        return load_tiled_map_file(filename)
+
+def load_tiled_map_file(filename):
+    import pytmx
+    from pytmx.util_pygame import load_pygame, pygame_image_loader
+
+    if not in_archive(filename):
+        return load_pygame(filename, pixelalpha=True)
+
+    # pytmx asks for tileset images by name; hand it the archived copy.
+    def archive_image_loader(image_name, colorkey, **kwargs):
+        return pygame_image_loader(get_archive().open(image_name), colorkey, **kwargs)
+
+    from xml.etree import ElementTree
+    tmxdata = pytmx.TiledMap(image_loader=archive_image_loader, pixelalpha=True)
+    # pytmx finds images next to the map's filename, so it needs one.
+    tmxdata.filename = filename
+    tmxdata.parse_xml(ElementTree.parse(get_archive().open(filename)).getroot())
+    return tmxdata
+
+# Load a Tiled map from XML that's already been read (and maybe changed),
+# with its pictures from the archive or from loose files. filename is
+# where the map came from, so pytmx can find its tilesets.
+def load_tiled_map_xml(filename, root):
+    import pytmx
+    from pytmx.util_pygame import pygame_image_loader
+
+    if in_archive(filename):
+        def image_loader(image_name, colorkey, **kwargs):
+            return pygame_image_loader(get_archive().open(image_name), colorkey, **kwargs)
+    else:
+        image_loader = pygame_image_loader
+    tmxdata = pytmx.TiledMap(image_loader=image_loader, pixelalpha=True)
+    tmxdata.filename = filename
+    tmxdata.parse_xml(root)
+    return tmxdata
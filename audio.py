@@ -0,0 +1,156 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Reads files out of the packed asset archive, if there is one
+import assets
+
+# ============================================
+# ==              SOUND BANK                ==
+# ============================================
+# All of the game's sound effects get loaded here once,
+# when the game starts, and everybody shares them. Before,
+# every enemy loaded its own copy of Toot.wav!
+#
+# The bank also keeps sound from getting out of hand:
+#  - Each sound has a limit on how many copies can play
+#    at once (its "voices").
+#  - If the same sound is asked for twice in one frame
+#    (like squishing two enemies at the same time), it
+#    only plays once. They'd sound the same anyway.
+#  - Sound effects get their own set of mixer channels
+#    that nothing else can use, so we always know how
+#    much mixing is going on.
+#
+# Music is different. Music files are big, so instead of
+# loading the whole thing into memory we "stream" it,
+# which means pygame reads a little bit at a time as it
+# plays.
+
+# Every sound effect: name -> (file, volume, most copies playing at once)
+SOUND_EFFECTS = {
+    "jump":      ("Jump.wav", 1.0, 1),
+    "death":     ("Death.wav", 1.0, 1),
+    "squish":    ("Toot.wav", 1.0, 2),
+    "thud":      ("Thud.wav", 1.0, 2),
+    "game_over": ("game_over_yah.wav", 1.0, 1),
+}
+
+class Sound_Bank(object):
+
+    def __init__(self):
+
+        self.sounds = {}
+        self.voice_limits = {}
+        # Names of sounds already played this frame.
+        self.played_this_frame = set()
+        self.channels = []
+        # Music streaming out of the asset archive needs its file kept open.
+        self.music_file = None
+        # Music files that wouldn't load, so we only complain about each once.
+        self.missing_music = set()
+
+        # If there's no sound card (or it's switched off), just stay quiet.
+        self.enabled = pygame.mixer.get_init() is not None
+        if self.enabled == False:
+            print("No sound mixer available; playing without sound")
+            return
+
+        # Reserve the first few channels for our sound effects. pygame
+        # won't hand these out to anything else.
+        pygame.mixer.set_num_channels(SOUND_CHANNELS)
+        pygame.mixer.set_reserved(SOUND_EFFECT_CHANNELS)
+        for i in range(0, SOUND_EFFECT_CHANNELS):
+            self.channels.append(pygame.mixer.Channel(i))
+
+        for name in SOUND_EFFECTS:
+            filename, volume, max_voices = SOUND_EFFECTS[name]
+            self.load(name, filename, volume, max_voices)
+
+    def load(self, name, filename, volume = 1.0, max_voices = 1):
+
+        try:
+            sound = assets.load_sound(filename)
+        except (pygame.error, FileNotFoundError):
+            print("Unable to load sound:", filename)
+            return
+        sound.set_volume(volume)
+        self.sounds[name] = sound
+        self.voice_limits[name] = max_voices
+
+    # Play a sound effect by name. Returns the channel it's playing on,
+    # or None if it didn't play.
+    def play(self, name):
+
+        if self.enabled == False: return None
+        if name in self.played_this_frame: return None
+        sound = self.sounds.get(name)
+        if sound is None: return None
+
+        # Count how many copies are already playing, and find a free channel.
+        voices = 0
+        free_channel = None
+        for channel in self.channels:
+            if channel.get_busy():
+                if channel.get_sound() is sound: voices += 1
+            elif free_channel is None:
+                free_channel = channel
+
+        if voices >= self.voice_limits[name]: return None
+        if free_channel is None: return None
+
+        free_channel.play(sound)
+        self.played_this_frame.add(name)
+        return free_channel
+
+    # Call once at the end of every frame.
+    def end_frame(self):
+        self.played_this_frame.clear()
+
+    # ---------------------------------
+    # Music
+    # ---------------------------------
+
+    def play_music(self, filename, volume = MUSIC_VOLUME):
+
+        if self.enabled == False: return
+        if filename in self.missing_music: return
+        try:
+            self.music_file = assets.load_music(filename)
+        except (pygame.error, FileNotFoundError):
+            print("Unable to load music:", filename)
+            self.missing_music.add(filename)
+            return
+        pygame.mixer.music.set_volume(volume)
+        # -1 means loop forever
+        pygame.mixer.music.play(-1)
+
+    def stop_music(self):
+
+        if self.enabled == False: return
+        pygame.mixer.music.stop()
+
+# ---------------------------------
+# Shortcuts
+# ---------------------------------
+# The bank gets made the first time somebody needs it, because
+# pygame's mixer has to be started (by pygame.init()) first.
+
+current_sound_bank = None
+
+def get_sound_bank():
+    global current_sound_bank
+    if current_sound_bank is None:
+        current_sound_bank = Sound_Bank()
+    return current_sound_bank
@@ -20,26 +20,6 @@ from pygame.locals import *
 import math
 import random
 
-#Import functions that let us read and write
-#to .tmx files, which are what Tiled Map Editor
-#creates. If you don't have pytmx, it can be
-#added from within Thonny under Tools->Manage Packages.
-import pytmx
-#Share one of pytmx's methods.Note that we're not using
-#the * function this time, so the only methods that
-#get imported are those we expressly name.
-from pytmx.util_pygame import load_pygame
-
-#Import other game files. These are in the same
-#directory as Notmario and exist basically to help
-#organize the code.
-import methods
-#Again, need to expressly share the methods to which
-#we want to have access.
-from methods import blit_all_tiles
-from methods import get_tile_properties
-from methods import play_sound
-
 #This file contains CONSTANTS. Technically, Python does
 #not have a "constant" variable type. But, we just use
 #regular old variables and treat them as constants. To
@@ -48,8 +28,12 @@ import constants
 #More bad practice importing all of constant
 from constants import *
 
-#Import the game classes
-import game_objects
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
 
 # ============================================
 # ==             C A M E R A                ==
@@ -57,7 +41,9 @@ import game_objects
 
 class Camera(object):
     
-    def __init__ (self):
+    # viewport_size is how big the camera's picture is on the screen. It's
+    # the whole screen unless the screen is split (see SPLIT_SCREEN).
+    def __init__ (self, viewport_size = (SCREEN_W, SCREEN_H)):
         
         # The (x,y) coordinates of the camera. Measured from the CENTER!
         # NOT MEASURED FROM TOP LEFT!
@@ -72,12 +58,28 @@ class Camera(object):
         
         self.zoom = STARTING_CAMERA_ZOOM
         self.target_zoom = 1
-        self.view_width = SCREEN_W
-        self.view_height = SCREEN_H
+        self.viewport_width, self.viewport_height = viewport_size
+        self.view_width = self.viewport_width
+        self.view_height = self.viewport_height
         
         self.camera_speed = 2
-        
-        self.camera_scaled = pygame.Surface
+
+        # Quality settings. The quality governor turns these down on slow
+        # computers. smoothscale looks nicer but is slower than scale, and
+        # snapping the zoom to steps means the view size changes less often.
+        self.smooth_scaling = True
+        self.zoom_step = 0
+
+        # The camera reuses the same two images every frame instead of making
+        # new ones. camera_view is the bit of the map we can see, and
+        # camera_scaled is that bit stretched to fill the screen.
+        self.camera_view = None
+        self.camera_scaled = surfaces.new_surface(viewport_size, category = "camera")
+
+        # The part of the map the camera showed last time it drew, and the
+        # part it is going to show next. If they match, the camera is still.
+        self.view_rect = pygame.Rect(0,0,0,0)
+        self.last_view_rect = pygame.Rect(0,0,0,0)
 
     def change_follow(self, target_sprite):
 
@@ -109,8 +111,11 @@ class Camera(object):
             self.zoom -= 0.01
             
         #Determine size of camera view based on zoom.
-        self.view_width = SCREEN_W/self.zoom
-        self.view_height = SCREEN_H/self.zoom
+        zoom = self.zoom
+        if(self.zoom_step > 0):
+            zoom = max(self.zoom_step, round(zoom/self.zoom_step)*self.zoom_step)
+        self.view_width = self.viewport_width/zoom
+        self.view_height = self.viewport_height/zoom
         
         # Move towards the sprite target
         # Currently, assumes that the sprite is one tile wide.
@@ -133,37 +138,84 @@ class Camera(object):
         if(self.y>map_height-(self.view_height/2)):
             self.y = map_height-(self.view_height/2)
 
-    def draw(self,pre_render_image):
-        
+    # Work out which part of the map the camera is looking at, as a Rect.
+    def get_view_rect(self):
+
         # Figure out how much of map image to draw based on zoom
         # We're looking at how much of the map we want to actually see.
         x1 = self.x - self.view_width/2
         y1 = self.y - self.view_height/2
-        x2 = self.view_width
-        y2 = self.view_height
-        
-        # Now, calculate round integers. We're about to make a temporary
-        # image that is exactly as large as the section of the screen
-        # that we want to display. Pygame surfaces only use integers, so
-        # we need to round off the view sizes, which can be floats.
+
+        # Now, calculate round integers. Pygame surfaces only use
+        # integers, so we need to round off the view sizes, which can be floats.
         approx_width = round(self.view_width,0)
         approx_height = round(self.view_height,0)
-        # Create a temporary image just big enough for the part of the map we want.
-        camera_view = pygame.Surface((approx_width,approx_height))
-        
+        return pygame.Rect(x1, y1, approx_width, approx_height)
+
+    # True if the camera will show exactly what it showed last frame.
+    def is_still(self):
+        return self.get_view_rect() == self.last_view_rect
+
+    # Normally the camera draws whatever it's looking at right now. Pass
+    # view_rect to draw a different part of the map instead, like the
+    # view saved in a pipeline snapshot.
+    @tracing.traced("camera draw", "render")
+    def draw(self,pre_render_image, view_rect = None):
+
+        if view_rect is None: view_rect = self.get_view_rect()
+        self.view_rect = view_rect
+
+        surfaces.check_display_format(pre_render_image, "Camera.draw")
+
+        # Make an image just big enough for the part of the map we want.
+        # We only need a new one when the zoom changes its size.
+        if self.camera_view is None or self.camera_view.get_size() != self.view_rect.size:
+            self.camera_view = surfaces.new_surface(self.view_rect.size, category = "camera")
+        # If the camera can see past the edge of the map, clear out whatever
+        # was left there from last frame.
+        if not pre_render_image.get_rect().contains(self.view_rect):
+            self.camera_view.fill(0)
+
         # Grab the portion of the map_image caculated by the zoom and load it
         # into our custom-sized image.
-        camera_view.blit( (pre_render_image), #Start with the pre-render image
+        counters.add("blits")
+        self.camera_view.blit( (pre_render_image), #Start with the pre-render image
                                (0,0), # draw it to the camera starting at corner 0,0
-                               (x1,y1,x2,y2) # Draw the section at the camera view            
+                               self.view_rect # Draw the section at the camera view
             )
 
         # Lastly, scale the image back to match the size of the screen showing to
         # the player.
-        self.camera_scaled = pygame.transform.smoothscale(camera_view, (SCREEN_W, SCREEN_H))
-        
-        self.camera_scaled.convert
+        # Passing camera_scaled in as the last argument makes smoothscale draw
+        # straight into it instead of making a brand new surface.
+        if(self.smooth_scaling == True):
+            pygame.transform.smoothscale(self.camera_view, self.camera_scaled.get_size(), self.camera_scaled)
+        else:
+            pygame.transform.scale(self.camera_view, self.camera_scaled.get_size(), self.camera_scaled)
+
+        self.last_view_rect = self.view_rect
         return self.camera_scaled
 
-            
-    
\ No newline at end of file
+    # Work out where some rects on the map ended up on the screen last time
+    # the camera drew. Used to tell the display which parts actually changed.
+    def map_rects_to_screen(self, map_rects):
+
+        scale_x = self.viewport_width / self.view_rect.width
+        scale_y = self.viewport_height / self.view_rect.height
+        screen_rects = []
+
+        for rect in map_rects:
+            # Don't bother with anything the camera can't see.
+            area = rect.clip(self.view_rect)
+            if area.width == 0 or area.height == 0: continue
+
+            left = math.floor((area.left - self.view_rect.x) * scale_x)
+            top = math.floor((area.top - self.view_rect.y) * scale_y)
+            right = math.ceil((area.right - self.view_rect.x) * scale_x)
+            bottom = math.ceil((area.bottom - self.view_rect.y) * scale_y)
+
+            # smoothscale blurs each pixel a little into its neighbours,
+            # so grow the rect a couple of pixels to catch that too.
+            screen_rects.append(pygame.Rect(left, top, right-left, bottom-top).inflate(4,4))
+
+        return screen_rects
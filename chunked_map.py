@@ -0,0 +1,463 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+import math
+#Compact lists of numbers, for writing down where the chunks are
+import array
+#Keeps where every chunk is in one small array per layer
+import numpy
+#Remembers which chunks were used least recently
+from collections import OrderedDict
+#Reads the XML that Tiled saves maps in
+from xml.etree import ElementTree
+#The XML reader underneath ElementTree, which can say where in the file it is
+from xml.parsers import expat
+
+#Reads the tilesets and objects. It can't read chunked layers itself.
+import pytmx
+from pytmx.pytmx import unpack_gids, decode_gid
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Opens files from the asset archive, or loose ones if there isn't one
+import assets
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#The solidity grid every map gets
+import map_query
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+# ============================================
+# ==            CHUNKED MAPS                ==
+# ============================================
+# A normal Tiled map has a fixed size, and the game turns
+# the whole thing into one big picture when it loads. That
+# gets too big for a really long level (like an
+# auto-scroller that goes on and on).
+#
+# Tiled's "infinite" maps are saved in chunks instead:
+# squares of tiles (usually 16 x 16), each with its own
+# <chunk> in the file. pytmx can't read those, so this file
+# does it itself, one chunk at a time:
+#
+#   - Loading the map only writes down where in the file
+#     each chunk is. A chunk's tiles only get read and
+#     decoded when something asks about a tile in it (like
+#     the player checking the floor). Its solidity flags get
+#     worked out then too.
+#   - A chunk only gets drawn into a picture when the camera
+#     gets within CHUNK_PRELOAD_MARGIN of it.
+#   - Only the CHUNK_DATA_CACHE decoded chunks and the
+#     CHUNK_IMAGE_CACHE chunk pictures used most recently
+#     are kept. Older ones get thrown away and made again
+#     if they're needed.
+#   - Enemies get spawned as the player gets close to their
+#     chunk, and go away again when they get far from it.
+#
+# So however long the level is, only the bit near the
+# player is ever in memory, plus a few numbers for each
+# chunk saying where to find it.
+#
+# A Chunked_Map pretends to be a map (a tmxdata) to the rest
+# of the game, the same way a World in world.py does: it
+# has a width and height, get_tile_properties(), objects,
+# and a solidity grid for map_query.py. It's drawn the same
+# way too, one camera view at a time with draw().
+#
+# Everything is moved so the top left chunk is at (0, 0),
+# since the rest of the game expects maps to start there.
+
+# Is this a Tiled "infinite" map? Only reads as far as the <map> tag.
+def is_infinite_map(filename):
+    with assets.open_asset(filename) as map_file:
+        for event, element in ElementTree.iterparse(map_file, events = ("start",)):
+            return element.get("infinite", "0") == "1"
+    return False
+
+# One tile layer: where its chunks are in the file, and whether to draw it.
+class Chunk_Layer(object):
+
+    def __init__(self, node, chunk_spans):
+        self.name = node.get("name")
+        self.visible = node.get("visible", "1") == "1"
+        data = node.find("data")
+        self.encoding = data.get("encoding")
+        self.compression = data.get("compression")
+        # Where each chunk's tiles are in the file, in bytes. While loading,
+        # it's x, y, start, end for each chunk one after the other. Then
+        # it becomes an array with [chunk y, chunk x] = (start, end), and
+        # start is -1 for chunks that aren't in the file.
+        self.chunk_spans = chunk_spans
+
+# Read a chunked map without keeping its chunks. Returns the map's XML with
+# the <chunk>s left out, the size of a chunk, and for each tile layer an
+# array of x, y, start, end for every chunk, saying where its tiles are in
+# the file. ElementTree can't say where things are in the file, so this
+# uses the expat parser it's built on and builds the tree itself.
+def scan_chunked_map(map_file):
+
+    builder = ElementTree.TreeBuilder()
+    parser = expat.ParserCreate()
+    open_tags = []
+    layer_spans = []
+    chunk_size = [None]
+    chunk_start = [None]
+
+    def start_element(tag, attributes):
+        if tag == "chunk":
+            if chunk_size[0] is None:
+                chunk_size[0] = (int(attributes["width"]), int(attributes["height"]))
+            chunk_start[0] = (int(attributes["x"]), int(attributes["y"]), parser.CurrentByteIndex)
+        else:
+            # Only layers right inside the <map> count, like root.findall("layer").
+            if tag == "layer" and open_tags == ["map"]: layer_spans.append(array.array("q"))
+            builder.start(tag, attributes)
+        open_tags.append(tag)
+
+    def end_element(tag):
+        open_tags.pop()
+        if tag == "chunk":
+            x, y, start = chunk_start[0]
+            layer_spans[-1].extend((x, y, start, parser.CurrentByteIndex))
+            chunk_start[0] = None
+        else:
+            builder.end(tag)
+
+    def character_data(text):
+        if chunk_start[0] is None: builder.data(text)
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.CharacterDataHandler = character_data
+    parser.ParseFile(map_file)
+    return builder.close(), chunk_size[0], layer_spans
+
+# One chunk's decoded tiles.
+class Chunk(object):
+
+    __slots__ = ("gids", "flags")
+
+    def __init__(self, gids, flags):
+        # One list of raw Tiled gids per layer, row by row
+        self.gids = gids
+        # Solidity flags for the Blocks layer, like a Solidity_Grid's
+        self.flags = flags
+
+# The solidity grid of a chunked map. Instead of one big list of flags, it
+# asks the map for each tile, which decodes chunks as they're needed.
+class Chunked_Grid(map_query.Solidity_Grid):
+
+    def __init__(self, chunked_map):
+        self.chunked_map = chunked_map
+        self.width = chunked_map.width
+        self.height = chunked_map.height
+        self.version = 0
+        # There isn't one big list of flags. projectiles.py checks for this.
+        self.flags = None
+
+    def tile_flags(self, tile_x, tile_y):
+        return self.chunked_map.tile_flags(tile_x, tile_y)
+
+    def update_tile(self, tmxdata, tile_x, tile_y):
+        self.chunked_map.forget_chunk(tile_x // self.chunked_map.chunk_width,
+                                      tile_y // self.chunked_map.chunk_height)
+        self.version += 1
+
+class Chunked_Map(object):
+
+    @tracing.traced("load chunked map", "load")
+    def __init__(self, filename):
+
+        self.filename = filename
+        with assets.open_asset(filename) as map_file:
+            root, chunk_size, layer_spans = scan_chunked_map(map_file)
+
+        # The tile layers have no tiles in them now. Give pytmx a tiny empty
+        # layer in place of each one. pytmx still reads the tilesets and
+        # objects for us, and the game still finds a tile layer when it
+        # looks through visible_layers.
+        self.layers = []
+        for node, chunk_spans in zip(root.findall("layer"), layer_spans):
+            self.layers.append(Chunk_Layer(node, chunk_spans))
+            node.remove(node.find("data"))
+            node.set("width", "1")
+            node.set("height", "1")
+            ElementTree.SubElement(node, "data", {"encoding": "csv"}).text = "0"
+        self.tiled_map = assets.load_tiled_map_xml(filename, root)
+
+        # Every chunk is the same size in a map Tiled saved, so the first
+        # one says how big they all are.
+        if chunk_size is None:
+            raise ValueError(filename + " doesn't have any chunks")
+        self.chunk_width, self.chunk_height = chunk_size
+
+        # Chunks are written down by where they start, in tiles. Turn that
+        # into chunk numbers starting from (0, 0) at the top left.
+        spans = [numpy.frombuffer(layer.chunk_spans, dtype = numpy.int64).reshape(-1, 4) for layer in self.layers]
+        self.origin_x = min(int(layer_spans[:, 0].min()) for layer_spans in spans if len(layer_spans))
+        self.origin_y = min(int(layer_spans[:, 1].min()) for layer_spans in spans if len(layer_spans))
+        chunk_xs = [(layer_spans[:, 0] - self.origin_x) // self.chunk_width for layer_spans in spans]
+        chunk_ys = [(layer_spans[:, 1] - self.origin_y) // self.chunk_height for layer_spans in spans]
+        self.chunks_across = max(int(xs.max()) for xs in chunk_xs if len(xs)) + 1
+        self.chunks_down = max(int(ys.max()) for ys in chunk_ys if len(ys)) + 1
+        for layer, layer_spans, xs, ys in zip(self.layers, spans, chunk_xs, chunk_ys):
+            layer.chunk_spans = numpy.full((self.chunks_down, self.chunks_across, 2), -1, dtype = numpy.int64)
+            layer.chunk_spans[ys, xs] = layer_spans[:, 2:4]
+        # The size of the map, in tiles, like a normal map's.
+        self.width = self.chunks_across * self.chunk_width
+        self.height = self.chunks_down * self.chunk_height
+        self.tilewidth = TILESIZE
+        self.tileheight = TILESIZE
+
+        # Move the objects to match, and sort the enemies into the chunks
+        # they start in.
+        offset_x = -self.origin_x * TILESIZE
+        offset_y = -self.origin_y * TILESIZE
+        self.objects = []
+        self.enemy_spawns = {}
+        for tile_object in self.tiled_map.objects:
+            tile_object.x += offset_x
+            tile_object.y += offset_y
+            if tile_object.name == "enemy_spawn":
+                self.enemy_spawns.setdefault(self.chunk_at(tile_object.x, tile_object.y), []).append(tile_object)
+            else:
+                self.objects.append(tile_object)
+
+        # The most recently used decoded chunks and chunk pictures are at the end.
+        self.chunks = OrderedDict()
+        self.chunk_images = OrderedDict()
+        # Raw Tiled gid -> (picture, properties), since every tile of the
+        # same kind looks and acts the same.
+        self.tile_cache = {}
+        # Enemies for each chunk that has spawned them: (chunk x, chunk y) -> list
+        self.spawned_enemies = {}
+
+        self.solidity_grid = Chunked_Grid(self)
+        self.canvas = None
+
+    # pytmx's layers: tiny stand-ins for the tile layers, and the objects.
+    @property
+    def visible_layers(self):
+        return self.tiled_map.visible_layers
+
+    # Which chunk (chunk x, chunk y) the point (x, y) is in, in pixels.
+    def chunk_at(self, x, y):
+        return (int(x // (self.chunk_width * TILESIZE)), int(y // (self.chunk_height * TILESIZE)))
+
+    def chunk_rect(self, chunk_x, chunk_y):
+        width = self.chunk_width * TILESIZE
+        height = self.chunk_height * TILESIZE
+        return Rect(chunk_x * width, chunk_y * height, width, height)
+
+    # ---------------------------------
+    # Tiles
+    # ---------------------------------
+
+    # The picture and properties for a raw gid from the map file. The top
+    # bits of a raw gid say if the tile is flipped.
+    def get_tile(self, raw_gid):
+
+        tile = self.tile_cache.get(raw_gid)
+        if tile is not None: return tile
+        gid, flips = decode_gid(raw_gid)
+        image = None
+        properties = None
+        if gid != 0:
+            pytmx_gid = self.tiled_map.register_gid(gid)
+            if pytmx_gid < len(self.tiled_map.images): image = self.tiled_map.images[pytmx_gid]
+            properties = self.tiled_map.get_tile_properties_by_gid(pytmx_gid)
+        if image is not None:
+            # The same flipping pytmx does for normal maps.
+            if flips.flipped_diagonally:
+                image = pygame.transform.flip(pygame.transform.rotate(image, 270), True, False)
+            if flips.flipped_horizontally or flips.flipped_vertically:
+                image = pygame.transform.flip(image, flips.flipped_horizontally, flips.flipped_vertically)
+        tile = (image, properties)
+        self.tile_cache[raw_gid] = tile
+        return tile
+
+    # A chunk's decoded tiles, decoding it first if it isn't already.
+    # Chunks that aren't in the file are empty.
+    def get_chunk(self, chunk_x, chunk_y):
+
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        with tracing.span("decode chunk", "load"):
+            counters.add("chunks decoded")
+            size = self.chunk_width * self.chunk_height
+            gids = []
+            with assets.open_asset(self.filename) as map_file:
+                for layer in self.layers:
+                    text = self.read_chunk_text(map_file, layer.chunk_spans, chunk_x, chunk_y)
+                    if text == "":
+                        gids.append([0] * size)
+                    else:
+                        gids.append(unpack_gids(text, layer.encoding, layer.compression))
+            flags = bytearray(size)
+            if BLOCK_LAYER < len(gids):
+                gid_flags = {}
+                for i, gid in enumerate(gids[BLOCK_LAYER]):
+                    tile_flags = gid_flags.get(gid)
+                    if tile_flags is None:
+                        tile_flags = map_query.flags_from_properties(self.get_tile(gid)[1])
+                        gid_flags[gid] = tile_flags
+                    flags[i] = tile_flags
+            chunk = Chunk(gids, flags)
+
+        self.chunks[key] = chunk
+        while len(self.chunks) > CHUNK_DATA_CACHE:
+            self.chunks.popitem(last = False)
+            counters.add("chunks dropped")
+        return chunk
+
+    # A chunk's tiles, as written in the file. A span goes from the start
+    # of <chunk ...> to the start of </chunk>, so everything after the
+    # first ">" is the tiles.
+    def read_chunk_text(self, map_file, chunk_spans, chunk_x, chunk_y):
+
+        if not (0 <= chunk_x < self.chunks_across and 0 <= chunk_y < self.chunks_down): return ""
+        start, end = chunk_spans[chunk_y, chunk_x].tolist()
+        if start < 0: return ""
+        map_file.seek(start)
+        raw = map_file.read(end - start)
+        tag_end = raw.find(b">")
+        # A <chunk .../> with nothing in it
+        if tag_end < 0 or raw[tag_end - 1:tag_end] == b"/": return ""
+        return raw[tag_end + 1:].decode("ascii").strip()
+
+    # Throw away a chunk's decoded tiles and picture, so they get made
+    # again from the file next time.
+    def forget_chunk(self, chunk_x, chunk_y):
+        self.chunks.pop((chunk_x, chunk_y), None)
+        self.chunk_images.pop((chunk_x, chunk_y), None)
+
+    # The solidity flags of the tile at (tile_x, tile_y). Off the map is solid.
+    def tile_flags(self, tile_x, tile_y):
+        if 0 <= tile_x < self.width and 0 <= tile_y < self.height:
+            chunk = self.get_chunk(tile_x // self.chunk_width, tile_y // self.chunk_height)
+            return chunk.flags[(tile_y % self.chunk_height) * self.chunk_width + tile_x % self.chunk_width]
+        return map_query.SOLID
+
+    # The same as pytmx's get_tile_properties, for chunked maps.
+    def get_tile_properties(self, tile_x, tile_y, layer):
+        tile_x = int(tile_x)
+        tile_y = int(tile_y)
+        if tile_x < 0 or tile_y < 0 or tile_x >= self.width or tile_y >= self.height:
+            raise ValueError("Tile is outside the map")
+        chunk = self.get_chunk(tile_x // self.chunk_width, tile_y // self.chunk_height)
+        raw_gid = chunk.gids[layer][(tile_y % self.chunk_height) * self.chunk_width + tile_x % self.chunk_width]
+        return self.get_tile(raw_gid)[1]
+
+    # ---------------------------------
+    # Enemies
+    # ---------------------------------
+
+    # Call once a frame. Spawns the enemies of chunks the player is getting
+    # close to, and takes them away again from chunks the player has left.
+    # In split screen, that's close to either player.
+    def update(self, sprite_handler):
+
+        near_areas = []
+        far_areas = []
+        for player in sprite_handler.players:
+            near = player.rect.inflate(SCREEN_W*2 + CHUNK_PRELOAD_MARGIN*2, SCREEN_H*2 + CHUNK_PRELOAD_MARGIN*2)
+            near_areas.append(near)
+            far_areas.append(near.inflate(self.chunk_width * TILESIZE * 2, self.chunk_height * TILESIZE * 2))
+
+        for key in list(self.spawned_enemies):
+            if self.chunk_rect(*key).collidelist(far_areas) == -1:
+                for enemy in self.spawned_enemies.pop(key):
+                    enemy.kill()
+
+        for near in near_areas:
+            for key in self.chunks_touching(near):
+                if key in self.spawned_enemies: continue
+                enemies = []
+                for tile_object in self.enemy_spawns.get(key, []):
+                    enemies.append(sprite_handler.spawn_enemy(tile_object.x, tile_object.y))
+                self.spawned_enemies[key] = enemies
+
+    # The sprite handler has thrown every enemy away (like when entering
+    # the map again), so spawn them all again as the player gets near.
+    def forget_enemies(self):
+        self.spawned_enemies = {}
+
+    # Every chunk (chunk x, chunk y) that rect (in pixels) touches.
+    def chunks_touching(self, rect):
+        left, top = self.chunk_at(max(rect.left, 0), max(rect.top, 0))
+        right, bottom = self.chunk_at(rect.right - 1, rect.bottom - 1)
+        right = min(right, self.chunks_across - 1)
+        bottom = min(bottom, self.chunks_down - 1)
+        return [(chunk_x, chunk_y) for chunk_y in range(top, bottom + 1) for chunk_x in range(left, right + 1)]
+
+    # ---------------------------------
+    # Drawing
+    # ---------------------------------
+
+    # A chunk's picture, drawing it first if it isn't already.
+    def get_chunk_image(self, chunk_x, chunk_y):
+
+        key = (chunk_x, chunk_y)
+        image = self.chunk_images.get(key)
+        if image is not None:
+            self.chunk_images.move_to_end(key)
+            return image
+
+        with tracing.span("render chunk", "render"):
+            counters.add("chunks rendered")
+            chunk = self.get_chunk(chunk_x, chunk_y)
+            image = surfaces.new_surface((self.chunk_width * TILESIZE, self.chunk_height * TILESIZE), category = "chunks")
+            for layer, gids in zip(self.layers, chunk.gids):
+                if not layer.visible: continue
+                blit_sequence = []
+                for i, raw_gid in enumerate(gids):
+                    if raw_gid == 0: continue
+                    tile_image = self.get_tile(raw_gid)[0]
+                    if tile_image is None: continue
+                    blit_sequence.append((tile_image, ((i % self.chunk_width) * TILESIZE, (i // self.chunk_width) * TILESIZE)))
+                counters.add("blits", len(blit_sequence))
+                image.blits(blit_sequence, doreturn = False)
+
+        self.chunk_images[key] = image
+        while len(self.chunk_images) > CHUNK_IMAGE_CACHE:
+            self.chunk_images.popitem(last = False)
+            counters.add("chunk pictures dropped")
+        return image
+
+    # Draw the part of the map in view_rect onto a canvas the size of the
+    # view, like World.draw() does. Chunks just outside the view get drawn
+    # too (but not shown) so they're ready before they scroll on.
+    def draw(self, view_rect):
+
+        if self.canvas is None or self.canvas.get_size() != view_rect.size:
+            self.canvas = surfaces.new_surface(view_rect.size, category = "map")
+        self.canvas.fill(0)
+        for chunk_x, chunk_y in self.chunks_touching(view_rect.inflate(CHUNK_PRELOAD_MARGIN*2, CHUNK_PRELOAD_MARGIN*2)):
+            image = self.get_chunk_image(chunk_x, chunk_y)
+            chunk_rect = self.chunk_rect(chunk_x, chunk_y)
+            if not chunk_rect.colliderect(view_rect): continue
+            counters.add("blits")
+            self.canvas.blit(image, (chunk_rect.x - view_rect.x, chunk_rect.y - view_rect.y))
+        return self.canvas
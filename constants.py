@@ -19,14 +19,23 @@ JUMP = 4
 ZOOM_IN = 5
 ZOOM_OUT = 6
 PAUSE = 7
+SHOOT = 8
 
 # Physics Information
 GRAVITY_STRENGTH = 0.2
 TERMINAL_VELOCITY = 4
+STOMP_DEPTH = 8 # How far (in pixels) the player's feet can sink into an enemy and still squish it
 
 # Screen Information
+# SCREEN_W and SCREEN_H are the size of the picture the game draws.
+# The window can be a different size; the picture gets scaled up by
+# a whole number to fit it, with black bars around it. See window.py.
 SCREEN_W = 640
 SCREEN_H = 480
+WINDOW_W = 640
+WINDOW_H = 480
+FULLSCREEN_MODE = False # F11 switches this while playing
+SCALE2X_FILTER = False # Smooths pixel art edges when scaling up 2x
 STARTING_CAMERA_ZOOM = 1.5
 
 # Map Information
@@ -50,5 +59,140 @@ PLAYING = 1
 PAUSED = 2
 GAME_OVER = 3
 
+# Sound Information
+MUSIC_FILE = "lost_woods.wav"
+MUSIC_VOLUME = 0.3
+SOUND_CHANNELS = 16 # Total mixer channels
+SOUND_EFFECT_CHANNELS = 8 # How many of those are saved just for the sound bank
+
 # Graphics information
-TRANSPARENT_COLOR = 0
\ No newline at end of file
+TRANSPARENT_COLOR = 0
+
+# Render Layers
+# Sprites get drawn in layer order, lowest first, so
+# higher layers end up on top.
+LAYER_ENEMIES = 1
+LAYER_PLAYER = 2
+LAYER_DOODADS = 3
+LAYER_PROJECTILES = 4
+
+# When the camera is standing still, only redraw and
+# update the parts of the screen that actually changed.
+DIRTY_RECT_MODE = False
+
+# Quality Governor (see governor.py)
+# Turns down fancy graphics when frames take too long to make.
+QUALITY_GOVERNOR = True
+FRAME_BUDGET_MS = 1000/60 # How long we have to make each frame at 60fps
+QUALITY_SAMPLE_FRAMES = 60 # How many frames to average over
+QUALITY_DOWN_THRESHOLD = 0.9 # Turn down if average is over 90% of the budget
+QUALITY_UP_THRESHOLD = 0.5 # Turn up if average is under 50% of the budget
+QUALITY_PATIENCE = 30 # Checks in a row before changing
+QUALITY_COOLDOWN_FRAMES = 120 # Frames to wait after changing
+QUALITY_IGNORE_MS = 250 # Frames longer than this are loading stalls; ignore them
+QUALITY_ZOOM_STEP = 0.25
+QUALITY_ACTIVITY_MARGIN = TILESIZE*4 # How far past the camera enemies keep moving
+
+# Print a warning when a surface that gets drawn every frame
+# hasn't been converted to match the screen. See surfaces.py.
+DEBUG_SURFACE_FORMAT = False
+
+# Load the first level in the background while the main menu is up.
+# Turn off to load everything before the menu like we used to.
+BACKGROUND_LOADING = True
+# Print how long each part of starting up took.
+STARTUP_REPORT = True
+
+# All the pictures, sounds and maps packed into one file by pack_assets.py.
+# If it isn't there, the game uses the loose files instead.
+ASSET_ARCHIVE = "Notmario.pak"
+
+# Run the game's simulation on a second thread while the main thread draws
+# the previous tick. Can help on computers with several cores. See pipeline.py.
+PIPELINED_MODE = False
+
+# Memory tracking (see memory_tracker.py). Writes down how much memory the
+# game is using every time it loads a map, goes through a transition or
+# respawns, and warns if coming back to a map uses more than last time.
+# Slows the game down, so only turn it on when looking for leaks.
+MEMORY_TRACKING = False
+MEMORY_REPORT_FILE = "memory_report.json"
+MEMORY_GROWTH_WARNING = 256*1024 # Bytes
+MEMORY_TRACE_FRAMES = 5 # How many calls back to remember for each allocation
+MEMORY_TOP_LINES = 10 # How many lines of code to list in each mark
+
+# Tracing (see tracing.py). Writes a timeline of everything the game does
+# that opens in https://ui.perfetto.dev. Press F9 to save it while playing.
+TRACING = False
+TRACE_FILE = "trace.json"
+TRACE_SAMPLE_FRAMES = 1 # Keep every Nth frame (1 keeps them all)
+TRACE_KEEP_SLOW_MS = 50 # ...but always keep frames slower than this
+TRACE_RING_SIZE = 0 # Only keep the newest this many events (0 keeps them all)
+
+# Counters (see counters.py). Counts tile lookups, blits, new surfaces and
+# so on every frame. Press F3 while playing to see them.
+COUNTERS = False
+COUNTERS_CSV = "" # Filename to save the counts to, or "" to not save them
+COUNTERS_CSV_EVERY = "second" # "frame" or "second"
+
+# Garbage collector control (see gc_control.py). Stops Python's garbage
+# collector from pausing the game in the middle of playing, and cleans
+# up in the quiet moments instead.
+GC_CONTROL = True
+GC_PLAYING_MODE = "thresholds" # "thresholds", or "disable" to turn automatic collection right off
+GC_PLAYING_THRESHOLDS = (50000, 50, 1000) # Used by "thresholds". Much higher than the normal (700, 10, 10)
+GC_IDLE_MIN_MS = 3 # Only clean up if at least this much of the frame is left
+GC_IDLE_THRESHOLDS = (5000, 10, 10) # Like gc.set_threshold(), but for cleaning up in spare time
+GC_REPORT = False # Print how long the collector paused the game when quitting
+
+# Projectiles (see projectiles.py). Every projectile lives in one big pool
+# of NumPy arrays instead of being its own Sprite.
+PROJECTILE_POOL_SIZE = 2048 # The most there can be at once
+PROJECTILE_LIFETIME = 120 # Frames before a projectile disappears
+PROJECTILE_SIZE = 4 # Pixels across
+PROJECTILE_SPEED = 4 # Pixels per frame
+PROJECTILE_CELL_SIZE = TILESIZE*4 # Size of the cells projectiles get sorted into for hitting sprites
+PLAYER_PROJECTILE_COLOR = (255, 220, 80)
+ENEMY_PROJECTILE_COLOR = (255, 80, 60)
+PLAYER_SHOT_COOLDOWN = 15 # Frames between the player's shots
+ENEMY_SHOT_INTERVAL = 0 # Enemies shoot every this-many frames. 0 means they don't shoot.
+
+# Particles (see particles.py). Dust, debris, sparks and explosions, kept in
+# NumPy arrays instead of one Sprite each.
+PARTICLE_POOL_SIZE = 4096 # The most there can be at once
+PARTICLE_SEED = 1234 # Starting point for the particles' random numbers
+QUALITY_PARTICLE_DENSITY = 0.5 # How much of each burst to make when the quality governor turns things down
+
+# World mode (see world.py). Lays the maps out next to each other in one
+# big world from a Tiled .world file, and loads them as the player walks
+# up to them instead of stopping for a screen transition.
+WORLD_MODE = False
+WORLD_FILE = "Notmario.world"
+WORLD_RESIDENCY_RADIUS = SCREEN_W # Start loading a map when the player gets this close to it (pixels)
+WORLD_UNLOAD_MARGIN = TILESIZE*8 # Unload it again once the player is this much further away than that
+
+# Chunked maps (see chunked_map.py). Tiled's "infinite" maps get decoded
+# and drawn a chunk at a time as the camera gets near, so a level can be
+# as long as you like.
+CHUNK_DATA_CACHE = 256 # Decoded chunks (tiles and solidity) to keep
+CHUNK_IMAGE_CACHE = 24 # Chunk pictures to keep. Each is a whole chunk's worth of pixels.
+CHUNK_PRELOAD_MARGIN = TILESIZE*4 # Draw chunks this close to the camera's view before they scroll on
+
+# Split screen. Adds a second player (arrow keys, right Ctrl to jump, right
+# Shift to shoot) with their own camera on the bottom half of the screen.
+# Both cameras look at the same map picture and sprites, so the second
+# view only costs one more camera draw.
+SPLIT_SCREEN = False
+
+# Hot reloading (see hot_reload.py). For making levels: the game watches
+# the map you're playing and its tilesets, and shows what you changed in
+# Tiled as soon as you save. Painted tiles get patched in place.
+HOT_RELOAD = False
+HOT_RELOAD_INTERVAL = 15 # Frames between checking if the files have changed
+
+# The level compiler (see level_compiler.py), which checks every map and
+# writes out ready-to-ship copies of them.
+COMPILED_LEVELS_DIR = "compiled" # Where the compiled maps and levels.json go
+COMPILER_START_MAP = "Notlevel1.tmx" # The map the game starts on
+COMPILER_MAX_SPAWN_DROP = 4 # Spawns can be at most this many tiles above the ground
+COMPILED_GRIDS = True # Read solidity grids from COMPILED_LEVELS_DIR when they're up to date
@@ -0,0 +1,201 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+import time
+#csv writes files that spreadsheets can open
+import csv
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+# ============================================
+# ==              COUNTERS                  ==
+# ============================================
+# Before making something faster, it helps to know how
+# often it actually happens. With COUNTERS on, the busy
+# bits of the game count themselves every time they run:
+#
+#   tile lookups          get_tile_properties() calls
+#   surfaces made         new surfaces from surfaces.py
+#   image_at slices       frames cut out of sprite sheets
+#   blits                 pictures drawn onto other pictures
+#   collision candidates  enemies checked by spritecollide
+#   sound plays           play_sound() calls
+#   hot reload checks     times the map's files were checked for changes
+#   compiled grids loaded solidity grids read from level_compiler.py's files
+#   quality level         the governor's quality level (see governor.py)
+#
+# To count something, call counters.add("name") (or
+# add("name", how_many)). New names can be made up on the
+# spot. At the end of every frame the counts get saved as
+# "last frame" and start again from zero.
+#
+# A histogram keeps track of how big something usually is,
+# instead of just adding it up. observe("name", value) puts
+# the value into a bucket: 0, 1, 2-3, 4-7, 8-15 and so on.
+#
+# Press F3 while playing to see last frame's counts on the
+# screen. If COUNTERS_CSV is set, they also get written to a
+# CSV file, every frame or once a second (COUNTERS_CSV_EVERY).
+#
+# When COUNTERS is off, add() and observe() get swapped for a
+# function that does nothing, so the counting costs almost
+# nothing.
+
+# Counts how many values landed in each power-of-two sized bucket.
+class Histogram(object):
+
+    def __init__(self):
+        # bucket number -> how many values landed in it
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.largest = 0
+
+    def observe(self, value):
+        # Bucket 0 holds 0, bucket 1 holds 1, bucket 2 holds 2-3,
+        # bucket 3 holds 4-7... which is just how many bits value needs.
+        bucket = int(value).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.largest = max(self.largest, value)
+
+    def average(self):
+        if self.count == 0: return 0
+        return self.total / self.count
+
+    # The smallest and largest value that can land in a bucket.
+    def bucket_range(self, bucket):
+        if bucket == 0: return (0, 0)
+        return (1 << (bucket - 1), (1 << bucket) - 1)
+
+class Counter_Registry(object):
+
+    def __init__(self):
+
+        # name -> count so far this frame
+        self.counts = {}
+        # name -> count for the whole of the last frame
+        self.last_frame = {}
+        # name -> Histogram
+        self.histograms = {}
+
+        self.frame_number = 0
+        # Totals for the second that's going on now, and the one before.
+        self.second_counts = {}
+        self.second_frames = 0
+        self.second_start = time.perf_counter()
+        self.last_second = {}
+        self.last_second_frames = 0
+
+        self.csv_file = None
+        self.csv_writer = None
+        if COUNTERS_CSV:
+            self.open_csv(COUNTERS_CSV)
+
+    def add(self, name, amount = 1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = Histogram()
+            self.histograms[name] = histogram
+        histogram.observe(value)
+
+    # Call once at the end of every frame.
+    def end_frame(self):
+
+        self.frame_number += 1
+        self.last_frame = self.counts
+        self.counts = {}
+
+        for name in self.last_frame:
+            self.second_counts[name] = self.second_counts.get(name, 0) + self.last_frame[name]
+        self.second_frames += 1
+        if COUNTERS_CSV_EVERY == "frame":
+            self.write_csv("frame", self.frame_number, self.last_frame, 1)
+
+        now = time.perf_counter()
+        if now - self.second_start >= 1:
+            self.last_second = self.second_counts
+            self.last_second_frames = self.second_frames
+            if COUNTERS_CSV_EVERY == "second":
+                self.write_csv("second", self.frame_number, self.last_second, self.last_second_frames)
+            self.second_counts = {}
+            self.second_frames = 0
+            self.second_start = now
+
+    # ---------------------------------
+    # CSV
+    # ---------------------------------
+    # One row per counter, so new counters can show up at any time:
+    #   period, frame, counter, total, per_frame
+
+    def open_csv(self, filename):
+        try:
+            self.csv_file = open(filename, "w", newline = "")
+        except OSError as error:
+            print("Unable to save counters:", error)
+            return
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(["period", "frame", "counter", "total", "per_frame"])
+
+    def write_csv(self, period, frame_number, counts, frames):
+        if self.csv_writer is None: return
+        for name in sorted(counts):
+            self.csv_writer.writerow([period, frame_number, name, counts[name], round(counts[name] / frames, 2)])
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
+
+# ---------------------------------
+# Shortcuts
+# ---------------------------------
+# These are what the rest of the game calls.
+
+current_registry = None
+
+def add(name, amount = 1):
+    current_registry.add(name, amount)
+
+def observe(name, value):
+    current_registry.observe(name, value)
+
+def end_frame():
+    current_registry.end_frame()
+
+def close():
+    current_registry.close()
+
+# Last frame's counts, name -> count. Empty when counting is off.
+def last_frame():
+    if current_registry is None: return {}
+    return current_registry.last_frame
+
+# Every histogram, name -> Histogram. Empty when counting is off.
+def histograms():
+    if current_registry is None: return {}
+    return current_registry.histograms
+
+# ---------------------------------
+# Turned off
+# ---------------------------------
+
+def do_nothing(*args, **kwargs):
+    pass
+
+if COUNTERS:
+    current_registry = Counter_Registry()
+else:
+    add = observe = end_frame = close = do_nothing
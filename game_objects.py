@@ -19,6 +19,10 @@ from pygame.locals import *
 # Import math functions
 import math
 import random
+#struct packs numbers into bytes, for saving sprite states
+import struct
+#Lets us remember each frame's mask without keeping old frames alive
+import weakref
 
 #Import functions that let us read and write
 #to .tmx files, which are what Tiled Map Editor
@@ -48,6 +52,19 @@ import constants
 #More bad practice importing all of constant
 from constants import *
 
+#Import the render queue so sprites can be drawn in one batch
+import renderer
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Asks bigger questions about which tiles are solid, all at once
+import map_query
+#Every projectile, kept in NumPy arrays instead of as Sprites
+import projectiles
+#Dust, debris, sparks and explosions, also kept in NumPy arrays
+import particles
+
 # ============================================
 # ==             SPRITE SHEET               ==
 # ============================================
@@ -57,12 +74,16 @@ from constants import *
 
 # NOTE: Probably should make a master sprite sheet rather than
 # each object having their own.
+# Each sheet also remembers every frame that has been cut out
+# of it, so a frame is only cut out and converted once.
 
 class Sprite_Sheet(object):
     
     def __init__(self, filename):
+        # Frames we've already cut out, and their flipped versions.
+        self.frames = {}
         try:
-            self.sheet = pygame.image.load(filename)
+            self.sheet = surfaces.load_image(filename, category = "sprite sheets")
         except pygame.error:
             print ("Unable to load spritesheet image:", filename)
             return
@@ -70,12 +91,13 @@ class Sprite_Sheet(object):
     # Load a specific image from a specific rectangle
     def image_at(self, rectangle, colorkey = None):
         "Loads image from x,y,x+offset,y+offset"
+        counters.add("image_at slices")
         rect = pygame.Rect(rectangle)
-        image = pygame.Surface((rect.size),pygame.SRCALPHA).convert_alpha()
+        image = surfaces.new_surface(rect.size, alpha = True, category = "sprite frames")
         image.set_alpha(255)
         image.blit(self.sheet, (0, 0), rect)
         if colorkey is not None:
-            if colorkey is -1:
+            if colorkey == -1:
                 colorkey = image.get_at((0,0))
             image.set_colorkey(colorkey, pygame.RLEACCEL)
         return image
@@ -92,6 +114,74 @@ class Sprite_Sheet(object):
                 for x in range(image_count)]
         return self.images_at(tups, colorkey)
 
+    # Get one frame from the sheet, flipped left-to-right if asked.
+    # Unlike image_at, this hands back the same saved image every time,
+    # so it's cheap enough to call every frame. Don't draw on the result!
+    # Each frame's collision mask gets made at the same time.
+    def get_frame(self, rectangle, flipped = False):
+        key = (tuple(rectangle), flipped)
+        frame = self.frames.get(key)
+        if frame is None:
+            if flipped:
+                frame = surfaces.track(pygame.transform.flip(self.get_frame(rectangle), True, False), "sprite frames")
+            else:
+                frame = self.image_at(rectangle)
+            self.frames[key] = frame
+            make_mask(frame)
+        return frame
+
+# ============================================
+# ==           COLLISION MASKS              ==
+# ============================================
+# Sprites are drawn in 16x16 squares, but the actual
+# character doesn't fill the whole square. Checking if
+# two rects overlap says they touch when only their
+# see-through corners do.
+#
+# A pygame Mask is one bit per pixel: is this pixel solid
+# or see-through? Two masks can check if any solid pixels
+# overlap. It's a lot slower than checking rects, so we
+# only do it for sprites whose rects already overlap
+# (the rects are the "broadphase").
+#
+# Making a mask is slow too, so every frame from a sprite
+# sheet gets its mask made once, when get_frame() first cuts
+# it out (the flipped frames get their own). After that,
+# looking one up is just a dictionary lookup.
+
+# frame image -> (mask, the rect of its solid pixels)
+frame_masks = weakref.WeakKeyDictionary()
+
+def make_mask(image):
+    mask = pygame.mask.from_surface(image)
+    visible = mask.get_bounding_rects()
+    if len(visible) == 0: visible_rect = Rect(0, 0, 0, 0)
+    else: visible_rect = visible[0].unionall(visible)
+    frame_masks[image] = (mask, visible_rect)
+    return frame_masks[image]
+
+# The mask for a sprite's image, and where its solid pixels are.
+def get_mask(image):
+    mask = frame_masks.get(image)
+    if mask is None: mask = make_mask(image)
+    return mask
+
+# Do the solid pixels of two sprites touch?
+def sprites_touch(sprite1, sprite2):
+    mask1 = get_mask(sprite1.image)[0]
+    mask2 = get_mask(sprite2.image)[0]
+    offset = (sprite2.rect.x - sprite1.rect.x, sprite2.rect.y - sprite1.rect.y)
+    return mask1.overlap(mask2, offset) is not None
+
+# Every sprite used to load its own copy of its sprite sheet. Now each
+# sheet is loaded once and shared, along with all the frames cut from it.
+sprite_sheets = {}
+
+def load_sprite_sheet(filename):
+    if filename not in sprite_sheets:
+        sprite_sheets[filename] = Sprite_Sheet(filename)
+    return sprite_sheets[filename]
+
 # ============================================
 # ==            SPRITE HANDLER              ==
 # ============================================
@@ -99,11 +189,21 @@ class Sprite_Sheet(object):
 # of sprites in Pygame Groups.
 
 class Sprite_Handler(object):
+
+    # The start of a saved state: frame_counter, shot_cooldown, how many
+    # enemies, how many particles, how many projectiles.
+    STATE_HEADER = struct.Struct("<5i")
     
     def __init__(self):
         
         self.name = "Hello"
         self.player = Player(100,100,(0,0))
+        # How a brand new player starts out, for respawning.
+        self.fresh_player_state = self.player.get_state()
+        # In split screen there's a second player (see add_player_two()).
+        # Anything that happens to every player goes through this list.
+        self.player_two = None
+        self.players = [self.player]
         
         # Enemies collide with player and are damaged by player projectiles, in general.
         self.enemy_list = pygame.sprite.Group()
@@ -112,74 +212,287 @@ class Sprite_Handler(object):
         self.item_list = pygame.sprite.Group()
         
         # Enemy projectiles collide with player, dealing damage.
-        self.enemy_projectile_list = pygame.sprite.Group()
-        
         # Player projectiles collide with enemies, dealing damage.
-        self.player_projectile_list = pygame.sprite.Group()
+        # There can be a lot of them, so they aren't Sprites. They all live
+        # in one pool and know who fired them. See projectiles.py.
+        self.projectiles = projectiles.Projectile_Pool()
+        # Frames until each player can shoot again.
+        self.shot_cooldowns = [0]
         
         # Doodads don't collide with anything; used for effects, NPCs, etc.
         self.doodad_list = pygame.sprite.Group()
-        
-        # HUD Displays information
-        self.hud = Hud()
+
+        # Particles are just for looks, like doodads, but there are lots
+        # of them so they live in arrays. See particles.py.
+        self.particles = particles.Particle_Emitter()
+        # So we can tell when each player lands, and kick up some dust.
+        self.players_were_on_ground = [True]
+        
+        # HUD Displays information. One for each player.
+        self.huds = [Hud()]
+
+        # Collects every sprite image for the frame so they can be drawn together
+        self.render_queue = renderer.Render_Queue()
+
+        # Quality settings, turned down by the quality governor on slow computers.
+        # Doodads only update every this-many frames.
+        self.doodad_update_interval = 1
+        # If this is set, enemies further than this from the camera's view
+        # don't update. None means everyone always updates.
+        self.activity_margin = None
+        self.activity_rect = None
+        self.frame_counter = 0
         
     def player_enemy_collision_check(self):
+
+        for player in self.players:
+            self.check_player_against_enemies(player)
+
+    def check_player_against_enemies(self, player):
         
         # Only check collisions if the player is not already doing a death
         # animation.
-        if(self.player.state != DYING):
-            self.enemy_hit_list = pygame.sprite.spritecollide(self.player, self.enemy_list, False)
+        if(player.state != DYING):
+            # First find the enemies whose rects touch the player's (quick),
+            # then check those ones pixel by pixel (slow, but there's hardly
+            # ever more than one).
+            self.enemy_hit_list = pygame.sprite.spritecollide(player, self.enemy_list, False)
+            counters.add("collision candidates", len(self.enemy_list))
+            counters.observe("collision candidates per check", len(self.enemy_list))
+            counters.add("mask checks", len(self.enemy_hit_list))
             
             player_was_hit = False
+            # Where the bottom of the player's solid pixels is on the map.
+            player_bottom = player.rect.y + get_mask(player.image)[1].bottom
             
             for enemy in self.enemy_hit_list:
-                 if(enemy.state != DYING) and (enemy.state != DEAD):
-                    if( (self.player.rect.y<enemy.rect.y)and(self.player.vector[1]>0)):
-                         enemy.got_squished()
-                         enemy_position = enemy.getpos()
-                         enemy_x = enemy_position[0]
-                         enemy_y = enemy_position[1]
-                         explosion = Effect(enemy_x,enemy_y)
-                         self.doodad_list.add(explosion)
+                 if(enemy.state != DYING) and (enemy.state != DEAD) and sprites_touch(player, enemy):
+                    # It's a stomp if the player is coming down and their
+                    # feet haven't sunk too far into the top of the enemy.
+                    enemy_top = enemy.rect.y + get_mask(enemy.image)[1].top
+                    if( (player_bottom <= enemy_top + STOMP_DEPTH)and(player.vector[1]>0)):
+                         self.squish_enemy(enemy)
                     else:
                         player_was_hit = True
                         
-            if player_was_hit: self.player.take_damage()
+            if player_was_hit: player.take_damage()
+
+    # Projectiles hit whoever they weren't fired by.
+    def projectile_collision_check(self):
+
+        alive = [player for player in self.players if player.state != DYING and player.state != DEAD]
+        # A player hit by two projectiles at once only gets hurt once.
+        for target in sorted(set(self.projectiles.hit_rects([player.rect for player in alive], ENEMY))):
+            alive[target].take_damage()
+
+        targets = [enemy for enemy in self.enemy_list if enemy.state != DYING and enemy.state != DEAD]
+        for target in self.projectiles.hit_rects([enemy.rect for enemy in targets], PLAYER):
+            enemy = targets[target]
+            if(enemy.state != DYING): self.squish_enemy(enemy)
+
+    # Squish an enemy and leave an explosion where it was.
+    def squish_enemy(self, enemy):
+        enemy.got_squished()
+        enemy_position = enemy.getpos()
+        enemy_x = enemy_position[0]
+        enemy_y = enemy_position[1]
+        Effect(enemy_x,enemy_y,self.particles)
                     
     def get_player(self):
         
         return self.player
+
+    # Add a second player for split screen, standing where the first one
+    # is. It shares the sprite sheets (and every frame cut from them) with
+    # the first player, so it hardly takes any memory.
+    def add_player_two(self):
+
+        if(self.player_two is None):
+            self.player_two = Player(self.player.rect.x, self.player.rect.y, (0,0))
+            self.players.append(self.player_two)
+            self.shot_cooldowns.append(0)
+            self.players_were_on_ground.append(True)
+            self.huds.append(Hud())
+        return self.player_two
+
+    # True once every player has finished dying.
+    def all_players_dead(self):
+        for player in self.players:
+            if(player.state != DEAD): return False
+        return True
     
-    def update(self, tmxdata, keys):
+    # player_two_keys is the second player's keys list, in split screen.
+    def update(self, tmxdata, keys, player_two_keys = None):
         
         # Remove  sprites
         for enemy in self.enemy_list:
             if(enemy.state == DEAD): enemy.kill()
         for doodad in self.doodad_list:
             if(doodad.state == DEAD): doodad.kill()
-        if(self.player.state == DEAD): self.player.kill()
+        for player in self.players:
+            if(player.state == DEAD): player.kill()
+        player_keys = [keys, player_two_keys]
         
         # Update remaining
-        self.player.update(tmxdata, keys)
-        self.enemy_list.update(tmxdata, keys)
-        self.doodad_list.update()
+        for player, their_keys in zip(self.players, player_keys):
+            player.update(tmxdata, their_keys)
+        if(self.activity_margin is None or self.activity_rect is None):
+            self.enemy_list.update(tmxdata, keys)
+        else:
+            active_area = self.activity_rect.inflate(self.activity_margin*2, self.activity_margin*2)
+            for enemy in self.enemy_list:
+                if active_area.colliderect(enemy.rect): enemy.update(tmxdata, keys)
+        self.frame_counter += 1
+        if(self.frame_counter % self.doodad_update_interval == 0):
+            self.doodad_list.update()
+
+        # Shoot, then move every projectile.
+        self.update_shooting(player_keys)
+        self.projectiles.update(tmxdata)
+
+        # Particles: dust when a player lands, sparks where projectiles
+        # hit the walls.
+        for i, player in enumerate(self.players):
+            if(player.on_ground == True and self.players_were_on_ground[i] == False):
+                self.particles.burst("dust", player.rect.centerx, player.rect.bottom)
+            self.players_were_on_ground[i] = player.on_ground
+        for x, y in self.projectiles.wall_hits:
+            self.particles.burst("sparks", x, y)
+        self.particles.update(tmxdata.width*TILESIZE, tmxdata.height*TILESIZE)
         
         #Update 
-        self.hud.update(self.player.get_hp())
+        for player, hud in zip(self.players, self.huds):
+            hud.update(player.get_hp())
         
         # Check to see if map needs to change.
         self.check_for_map_exit(tmxdata)
     
-    def draw(self, map_image):
+    # Players shoot when SHOOT is held, as often as the cooldown lets
+    # them. Enemies shoot every ENEMY_SHOT_INTERVAL frames, if it isn't 0.
+    # player_keys has each player's keys list, in order.
+    def update_shooting(self, player_keys):
+
+        for i, player in enumerate(self.players):
+            keys = player_keys[i]
+            if(self.shot_cooldowns[i] > 0): self.shot_cooldowns[i] -= 1
+            if(keys[SHOOT] == True and self.shot_cooldowns[i] == 0 and player.state != DYING and player.state != DEAD):
+                direction = 1 if player.facing == RIGHT else -1
+                self.projectiles.spawn(player.rect.centerx, player.rect.centery,
+                                       direction*PROJECTILE_SPEED, 0, PLAYER)
+                self.shot_cooldowns[i] = PLAYER_SHOT_COOLDOWN
+
+        if(ENEMY_SHOT_INTERVAL > 0 and self.frame_counter % ENEMY_SHOT_INTERVAL == 0):
+            for enemy in self.enemy_list:
+                if(enemy.state == DYING or enemy.state == DEAD): continue
+                direction = 1 if enemy.vector[0] >= 0 else -1
+                self.projectiles.spawn(enemy.rect.centerx, enemy.rect.centery,
+                                       direction*PROJECTILE_SPEED, 0, ENEMY)
+
+    # Queue up every sprite and draw them all in one go. Returns the
+    # rects on the map that changed, which is handy for dirty rect mode.
+    # offset moves everything, for drawing onto only part of the map.
+    def draw(self, map_image, offset = (0, 0)):
+        
+        self.render_queue.add_group(self.enemy_list, LAYER_ENEMIES)
+        for player in self.players:
+            if(player.i_blink == False):
+                self.render_queue.add(player.image, player.rect, LAYER_PLAYER)
+        self.render_queue.add_group(self.doodad_list, LAYER_DOODADS)
+        self.render_queue.add_sequence(self.particles.blit_sequence(), LAYER_DOODADS)
+        self.render_queue.add_sequence(self.projectiles.blit_sequence(), LAYER_PROJECTILES)
+        return self.render_queue.flush(map_image, offset)
+    
+    # Make a list of everything draw() would draw, as (image, rect, layer).
+    # The rects are copies, so the list doesn't change when the sprites
+    # move again. The pipelined mode in pipeline.py draws from these.
+    def snapshot(self):
+
+        sprites = []
+        for enemy in self.enemy_list:
+            sprites.append((enemy.image, Rect(enemy.rect), LAYER_ENEMIES))
+        for player in self.players:
+            if(player.i_blink == False):
+                sprites.append((player.image, Rect(player.rect), LAYER_PLAYER))
+        for doodad in self.doodad_list:
+            sprites.append((doodad.image, Rect(doodad.rect), LAYER_DOODADS))
+        for image, corner in self.particles.blit_sequence():
+            sprites.append((image, Rect(corner, image.get_size()), LAYER_DOODADS))
+        for image, corner in self.projectiles.blit_sequence():
+            sprites.append((image, Rect(corner, (PROJECTILE_SIZE, PROJECTILE_SIZE)), LAYER_PROJECTILES))
+        return tuple(sprites)
+
+    # ---------------------------------
+    # Saving and loading states
+    # ---------------------------------
+    # save_state() packs everything about the player, the enemies, the
+    # particles and the projectiles into one chunk of bytes. load_state() puts it all back. It
+    # only takes a few microseconds, so it's good for checkpoints and
+    # instant respawns. The state belongs to whatever map was loaded when
+    # it was saved, so only load it on that map. Only the first player is
+    # saved; split screen's second player isn't.
+    #
+    # The bytes look like this:
+    #   STATE_HEADER            frame counter, shot cooldown, enemy count,
+    #                           particle count, projectile count
+    #   Player.STATE_FORMAT     the player
+    #   Enemy.STATE_FORMAT      once for each enemy
+    #   particles.STATE_DTYPE   once for each particle
+    #   projectiles.STATE_DTYPE once for each projectile
+
+    def save_state(self):
+
+        parts = [self.STATE_HEADER.pack(self.frame_counter, self.shot_cooldowns[0], len(self.enemy_list),
+                                        self.particles.count, self.projectiles.count),
+                 self.player.get_state()]
+        for enemy in self.enemy_list:
+            parts.append(enemy.get_state())
+        parts.append(self.particles.get_state())
+        parts.append(self.projectiles.get_state())
+        return b"".join(parts)
+
+    def load_state(self, state):
+
+        (self.frame_counter, self.shot_cooldowns[0], enemy_count,
+         particle_count, projectile_count) = self.STATE_HEADER.unpack_from(state, 0)
+        offset = self.STATE_HEADER.size
+        self.player.set_state(state, offset)
+        offset += Player.STATE_FORMAT.size
+        # Reuse the sprites we already have, and only make or remove
+        # the difference.
+        self.load_group_state(self.enemy_list, enemy_count, state, offset, lambda: Enemy(0,0,(0,0)))
+        offset += enemy_count * Enemy.STATE_FORMAT.size
+        self.particles.set_state(state, offset, particle_count)
+        offset += particle_count * particles.STATE_DTYPE.itemsize
+        self.projectiles.set_state(state, offset, projectile_count)
+
+    def load_group_state(self, group, count, state, offset, make_sprite):
+
+        sprites = group.sprites()
+        while len(sprites) > count:
+            sprites.pop().kill()
+        while len(sprites) < count:
+            sprite = make_sprite()
+            group.add(sprite)
+            sprites.append(sprite)
+        for sprite in sprites:
+            sprite.set_state(state, offset)
+            offset += sprite.STATE_FORMAT.size
+
+    # Paint the map back over where the sprites were last frame.
+    def erase(self, map_image, background_image):
         
-        self.enemy_list.draw(map_image)
-        self.player.draw(map_image)
-        self.doodad_list.draw(map_image)
+        self.render_queue.erase(map_image, background_image)
     
-    def draw_hud(self):
+    # player_number 0 is the first player, 1 the second.
+    def draw_hud(self, player_number = 0):
     
-        return self.hud.draw()
+        return self.huds[player_number].draw()
         
+    # Tell the handler what part of the map the camera can see, so it
+    # knows which enemies are close enough to bother updating.
+    def set_activity_area(self, view_rect):
+        self.activity_rect = view_rect
+
     def get_player_pos(self):
         return self.player.getpos()
     
@@ -195,17 +508,28 @@ class Sprite_Handler(object):
                         enemy = Enemy(tile_object.x,tile_object.y,(0,0))
                         self.enemy_list.add(enemy)
 
+    # Add one enemy at (x, y). World mode uses this to add each map's
+    # enemies as the map loads.
+    def spawn_enemy(self, x, y):
+        enemy = Enemy(x,y,(0,0))
+        self.enemy_list.add(enemy)
+        return enemy
+
     # Clear all sprites other than players.
     def prepare_for_new_map(self):
         
         # Remove all non-player sprites
         self.enemy_list.empty()
         self.doodad_list.empty()
+        self.particles.clear()
+        self.projectiles.clear()
         
+    # Put the players back the way they started (full health, standing
+    # still) at the map's entrance.
     def reset_player(self, tmxdata):
-        self.player.hit_points = 4
+        for player in self.players:
+            player.set_state(self.fresh_player_state)
         self.player_enters_map(tmxdata, RIGHT)
-        self.player.state = self.player.STANDING
         
     # Find the entrance object and put player there.
     # If there isnt a player yet, make one at the spawn point.
@@ -224,6 +548,9 @@ class Sprite_Handler(object):
                         elif(tile_object.properties['dir'] == "DOWN" and entrance_direction == DOWN):
                             self.player.setpos(tile_object.x,tile_object.y)
                         else: print("No appropriate landing direction found!")
+        # The second player comes in at the same place.
+        if(self.player_two is not None):
+            self.player_two.setpos(self.player.rect.x, self.player.rect.y)
                             
     def check_for_map_exit(self, tmxdata):
         
@@ -235,7 +562,6 @@ class Sprite_Handler(object):
         
                 # If the player is intersecting the exit object, need to load a new screen.
                 if(pygame.Rect.colliderect(player_rect,exit_object_rect)):
-                    print(tile_object.properties)
                     return tile_object.properties
                 
         default_dict = {'dest':'none', 'dir':'none'}
@@ -261,6 +587,41 @@ class Sprite_Handler(object):
 # that we're talking about a class-level variable and not
 # a method-level one.
 class Player(pygame.sprite.Sprite):
+
+    # __slots__ lists every variable a Player has. Python then keeps them
+    # in a fixed-size list instead of a dictionary, which is smaller and a
+    # bit faster. The only catch is that we can't make up new variables
+    # on the fly. _Sprite__g is the set of groups pygame's Sprite keeps.
+    __slots__ = ("_Sprite__g", "my_sprite_sheet", "image", "hit_points",
+                 "i_frames", "i_blink_counter", "i_blink", "has_jumped", "on_ground",
+                 "holding_jump", "animation_behavior", "frame_rect", "state", "state_counter",
+                 "animation_frame", "animation_delay", "rect", "vector", "facing")
+
+    # Class-specific constants. Every player shares these, so they live on
+    # the class instead of being copied into every player.
+    # Name. This game object needs a name so others can identify it.
+    name = "player"
+
+    # This will track the "state" of the object.
+    # Different states will have different positions on the sprite sheet.
+    STANDING = 0
+    WALKING = 1
+    JUMPING = 3
+
+    STANDING_START_FRAME = 0 * TILESIZE
+    WALKING_START_FRAME = 0 * TILESIZE
+    JUMPING_START_FRAME = 3 * TILESIZE
+    DYING_START_FRAME = 4 * TILESIZE
+
+    ANIMATION_SPEED = 15
+    ANIMATION_WALKING_FRAMES = 2
+
+    # How a player gets packed into bytes by get_state(). One letter per number:
+    # i = whole number, d = decimal number, ? = True/False.
+    # x, y, vector x, vector y, facing, state, state_counter, animation_behavior,
+    # animation_frame, animation_delay, frame x, hit_points, i_frames,
+    # i_blink_counter, i_blink, has_jumped, on_ground, holding_jump
+    STATE_FORMAT = struct.Struct("<2i2d10i4?")
     
     # Initialization
     def __init__ (self,init_x,init_y,init_vector):
@@ -271,14 +632,12 @@ class Player(pygame.sprite.Sprite):
         # GRAPHICS SETUP ------------        
         # Instead of loading an image directly we will use the
         # spritesheet object, defined below. 
-        self.my_sprite_sheet = Sprite_Sheet("Broman.png")
+        self.my_sprite_sheet = load_sprite_sheet("Broman.png")
         # Now we will initially set the image of this sprite
         # to be the first image on the sprite sheet.
         # Why do we use two paratheses? Because the .image_at function
         # expects to get a single parameter: an array of 4 numbers.
-        self.image = self.my_sprite_sheet.image_at((0,0,16,16))
-        # Name. This game object needs a name so others can identify it.
-        self.name = "player"
+        self.image = self.my_sprite_sheet.get_frame((0,0,16,16))
         
         self.hit_points = 4
         self.i_frames = 0
@@ -290,20 +649,10 @@ class Player(pygame.sprite.Sprite):
         self.on_ground = True #This makes sure you can only jump on the ground.
         self.holding_jump = False #This allows the player some control over jump height
 
-        
-        # This will track the "state" of the object.
-        # Different states will have different positions on the sprite sheet.
-        # Use class-specific constants to make code easier to read.
-        self.STANDING = 0
-        self.WALKING = 1
-        self.JUMPING = 3
-        
-        self.STANDING_START_FRAME = 0 * TILESIZE
-        self.WALKING_START_FRAME = 0 * TILESIZE
-        self.JUMPING_START_FRAME = 3 * TILESIZE
-        self.DYING_START_FRAME = 4 * TILESIZE
-        
+        # Use the class-specific constants (up above) to make code easier to read.
         self.animation_behavior = self.STANDING
+        # The part of the sprite sheet we're currently showing.
+        self.frame_rect = (self.STANDING_START_FRAME,0,TILESIZE,TILESIZE)
         
         # Internal behavior states.
         # These variables handle AI behavior.
@@ -313,8 +662,6 @@ class Player(pygame.sprite.Sprite):
         # This will be used to determine what frame of animation
         # the object is currently displaying within that state.
         self.animation_frame = 0
-        self.ANIMATION_SPEED = 15
-        self.ANIMATION_WALKING_FRAMES = 2
         self.animation_delay = 0
         
         # Next, set the size and position of this object, which
@@ -324,10 +671,6 @@ class Player(pygame.sprite.Sprite):
         # x,y,top, left, bottom, right,topleft, bottomleft, topright, bottomright,midtop, midleft, midbottom, midright,center, centerx, centery,size, width, height,w
         self.rect = pygame.Rect(init_x,init_y,TILESIZE,TILESIZE)
         
-        # Sound effects
-        self.sound_jump = pygame.mixer.Sound("Jump.wav")
-        self.sound_death= pygame.mixer.Sound("Death.wav")
-        
         # The direction this sprite is moving is stored in a vector.
         self.vector = list(init_vector)
         # The direction this sprite is FACING when not moving.
@@ -355,6 +698,27 @@ class Player(pygame.sprite.Sprite):
     def draw(self, map_image):
         if(self.i_blink==False):
             map_image.blit(self.image,(self.rect.x,self.rect.y))
+
+    # Everything that changes while playing, packed into bytes.
+    # See Sprite_Handler.save_state().
+    def get_state(self):
+        return self.STATE_FORMAT.pack(self.rect.x, self.rect.y, self.vector[0], self.vector[1],
+                                      self.facing, self.state, self.state_counter, self.animation_behavior,
+                                      self.animation_frame, self.animation_delay, self.frame_rect[0],
+                                      self.hit_points, self.i_frames, self.i_blink_counter,
+                                      self.i_blink, self.has_jumped, self.on_ground, self.holding_jump)
+
+    # Put back a state from get_state(). buffer can be a bigger chunk of
+    # bytes, with this player's state starting at offset.
+    def set_state(self, buffer, offset = 0):
+        (self.rect.x, self.rect.y, vector_x, vector_y,
+         self.facing, self.state, self.state_counter, self.animation_behavior,
+         self.animation_frame, self.animation_delay, frame_x,
+         self.hit_points, self.i_frames, self.i_blink_counter,
+         self.i_blink, self.has_jumped, self.on_ground, self.holding_jump) = self.STATE_FORMAT.unpack_from(buffer, offset)
+        self.vector = [vector_x, vector_y]
+        self.frame_rect = (frame_x,0,TILESIZE,TILESIZE)
+        self.image = self.my_sprite_sheet.get_frame(self.frame_rect, self.facing == LEFT)
     
     # ----------------------
     # Class Methods
@@ -400,7 +764,7 @@ class Player(pygame.sprite.Sprite):
         # Simple jump. You go higher if you hold the jump button.
         if(keys[JUMP]) == True:
             if(self.on_ground == True and self.has_jumped == False):
-                play_sound(self.sound_jump)
+                play_sound("jump")
                 self.has_jumped = True
                 self.holding_jump = True
                 self.vector[1] = -3.5
@@ -471,7 +835,7 @@ class Player(pygame.sprite.Sprite):
             self_animation_behavior = DYING
             if(self.state_counter == 0):
                 self.vector[1]=-5
-                play_sound(self.sound_death)
+                play_sound("death")
             self.state_counter += 1
             if(self.state_counter >= 100):
                 self.state = DEAD
@@ -495,7 +859,7 @@ class Player(pygame.sprite.Sprite):
         
         # STANDING
         if self.animation_behavior == self.STANDING:
-            self.image = self.my_sprite_sheet.image_at((self.STANDING_START_FRAME,0,TILESIZE,TILESIZE)).convert_alpha()
+            self.frame_rect = (self.STANDING_START_FRAME,0,TILESIZE,TILESIZE)
 
         # WALKING
         if self.animation_behavior == self.WALKING:
@@ -509,11 +873,11 @@ class Player(pygame.sprite.Sprite):
             # Walking frames start at 0 and each frame is 16
             # pixels, wide, so...
             x_target = (TILESIZE*self.animation_frame)
-            self.image = self.my_sprite_sheet.image_at((self.WALKING_START_FRAME+x_target,0,TILESIZE,TILESIZE)).convert_alpha()  
+            self.frame_rect = (self.WALKING_START_FRAME+x_target,0,TILESIZE,TILESIZE)
 
         # JUMPING
         if self.animation_behavior == self.JUMPING:
-            self.image = self.my_sprite_sheet.image_at((self.JUMPING_START_FRAME,0,TILESIZE,TILESIZE)).convert_alpha()
+            self.frame_rect = (self.JUMPING_START_FRAME,0,TILESIZE,TILESIZE)
 
         # IFRAMES
         # Blinking when you're damaged.
@@ -529,17 +893,15 @@ class Player(pygame.sprite.Sprite):
 
         # DYING
         if self.animation_behavior == DYING or self.animation_behavior == DEAD:
-            self.image = self.my_sprite_sheet.image_at((self.DYING_START_FRAME,0,TILESIZE,TILESIZE)).convert_alpha()
+            self.frame_rect = (self.DYING_START_FRAME,0,TILESIZE,TILESIZE)
 
         # Image will be facing right by default, because that is how it is
         # draw. Flip it depending on direction.
         # Note that we don't use .self here. Why? B'c this is a global constant
         # coming from our constants file, not a class constant!
-        if self.facing == LEFT:
-            # The flip function has three parameters: source image,
-            # whether to flip horizonal, whether to flip vertical
-            # Here, we flip horizontaly if facing left.
-            self.image = pygame.transform.flip(self.image, True, False)
+        # The sprite sheet keeps a flipped copy of every frame for us, so
+        # we just ask for the flipped one if we're facing left.
+        self.image = self.my_sprite_sheet.get_frame(self.frame_rect, self.facing == LEFT)
     
     # -----------------------                    
     # Update Method
@@ -577,6 +939,27 @@ class Player(pygame.sprite.Sprite):
 # ============================================
 
 class Enemy(pygame.sprite.Sprite):
+
+    # Every variable an Enemy has. See Player for what this does.
+    __slots__ = ("_Sprite__g", "my_sprite_sheet", "image", "state", "animation_behavior",
+                 "frame_rect", "animation_frame", "state_counter", "animation_delay",
+                 "rect", "vector", "facing", "on_ground")
+
+    # Class-specific constants, shared by every enemy.
+    name = "enemy"
+
+    # This will track the "state" of the object.
+    # Different states will have different positions on the sprite sheet.
+    WALKING = 0
+    WALKING_START_FRAME = 0 * TILESIZE
+    DYING_START_FRAME = 4 * TILESIZE
+
+    ANIMATION_SPEED = 8
+    ANIMATION_WALKING_FRAMES = 4
+
+    # x, y, vector x, vector y, facing, state, state_counter, animation_behavior,
+    # animation_frame, animation_delay, frame x, on_ground
+    STATE_FORMAT = struct.Struct("<2i2d7i?")
     
     # Initialization
     def __init__ (self,init_x,init_y,init_vector):
@@ -587,32 +970,24 @@ class Enemy(pygame.sprite.Sprite):
         # GRAPHICS SETUP ------------        
         # Instead of loading an image directly we will use the
         # spritesheet object, defined below. 
-        self.my_sprite_sheet = Sprite_Sheet("Baddybad.png")
+        self.my_sprite_sheet = load_sprite_sheet("Baddybad.png")
         # Now we will initially set the image of this sprite
         # to be the first image on the sprite sheet.
         # Why do we use two paratheses? Because the .image_at function
         # expects to get a single parameter: an array of 4 numbers.
-        self.image = self.my_sprite_sheet.image_at((0,0,16,16))
-        # Name. This game object needs a name so others can identify it.
-        self.name = "enemy"
-        
-        # This will track the "state" of the object.
-        # Different states will have different positions on the sprite sheet.
-        # Use class-specific constants to make code easier to read.
-        self.WALKING = 0
-        self.WALKING_START_FRAME = 0 * TILESIZE
-        self.DYING_START_FRAME = 4 * TILESIZE
+        self.image = self.my_sprite_sheet.get_frame((0,0,16,16))
         
+        # Use the class-specific constants (up above) to make code easier to read.
         self.state = self.WALKING 
         self.animation_behavior = self.WALKING
+        # The part of the sprite sheet we're currently showing.
+        self.frame_rect = (self.WALKING_START_FRAME,0,TILESIZE,TILESIZE)
         self.animation_frame = 0
         self.state_counter = 0
         
         # This will be used to determine what frame of animation
         # the object is currently displaying within that state.
         self.animation_frame = 0
-        self.ANIMATION_SPEED = 8
-        self.ANIMATION_WALKING_FRAMES = 4
         self.animation_delay = 0
         
         # Next, set the size and position of this object, which
@@ -622,13 +997,11 @@ class Enemy(pygame.sprite.Sprite):
         # x,y,top, left, bottom, right,topleft, bottomleft, topright, bottomright,midtop, midleft, midbottom, midright,center, centerx, centery,size, width, height,w
         self.rect = pygame.Rect(init_x,init_y,TILESIZE,TILESIZE)
         
-        # Sound effects
-        self.sound_squish = pygame.mixer.Sound("Toot.wav")
-        
         # The direction this sprite is moving is stored in a vector.
         self.vector = list(init_vector)
         # The direction this sprite is FACING when not moving.
         self.facing = RIGHT
+        self.on_ground = False
 
     # Class Accessor Methods
     
@@ -643,6 +1016,23 @@ class Enemy(pygame.sprite.Sprite):
     # Returns the image of this object
     
     def draw(self, map_image):map_image.blit(self.image,(self.rect.x,self.rect.y))
+
+    # Everything that changes while playing, packed into bytes.
+    # See Sprite_Handler.save_state().
+    def get_state(self):
+        return self.STATE_FORMAT.pack(self.rect.x, self.rect.y, self.vector[0], self.vector[1],
+                                      self.facing, self.state, self.state_counter, self.animation_behavior,
+                                      self.animation_frame, self.animation_delay, self.frame_rect[0],
+                                      self.on_ground)
+
+    def set_state(self, buffer, offset = 0):
+        (self.rect.x, self.rect.y, vector_x, vector_y,
+         self.facing, self.state, self.state_counter, self.animation_behavior,
+         self.animation_frame, self.animation_delay, frame_x,
+         self.on_ground) = self.STATE_FORMAT.unpack_from(buffer, offset)
+        self.vector = [vector_x, vector_y]
+        self.frame_rect = (frame_x,0,TILESIZE,TILESIZE)
+        self.image = self.my_sprite_sheet.get_frame(self.frame_rect, self.facing == RIGHT)
             
     # Squished by player
     
@@ -650,7 +1040,7 @@ class Enemy(pygame.sprite.Sprite):
         self.state = DYING
         self.animation_behavior = DYING
         self.state_counter = 0
-        play_sound(self.sound_squish)
+        play_sound("squish")
         self.vector = [0,0]
         
     # Update
@@ -668,16 +1058,19 @@ class Enemy(pygame.sprite.Sprite):
             if(self.rect.y >= (tmxdata.height * TILESIZE) - (TILESIZE)): self.got_squished()
             
         # ------- MAP
-        # Apply gravity by seeing what is on the tile below the player.
+        # Enemies ask the map's solidity grid (see map_query.py) about a
+        # whole strip of pixels at once, instead of checking three points
+        # one at a time. A strip TILESIZE+1 wide covers the same tiles as
+        # checking the left edge, the middle and the right edge.
+        grid = map_query.get_grid(tmxdata)
+        solid_or_platform = map_query.SOLID | map_query.PLATFORM
+        # The strip just under the enemy's feet.
+        below = Rect(self.rect.x, math.floor(self.rect.y+self.vector[1]+TILESIZE), TILESIZE+1, 1)
+
+        # Apply gravity by seeing what is on the tile below the enemy.
         # This is checking the TMX map for custom booleans named "solid"
         # or "platform"
-        tile_to_check1 = get_tile_properties(tmxdata, self.rect.x, self.rect.y+self.vector[1]+TILESIZE)
-        tile_to_check2 = get_tile_properties(tmxdata, self.rect.x+(TILESIZE/2), self.rect.y+self.vector[1]+TILESIZE)
-        tile_to_check3 = get_tile_properties(tmxdata, self.rect.x+TILESIZE, self.rect.y+self.vector[1]+TILESIZE)
-        if (
-        tile_to_check1['solid'] == False and tile_to_check1['platform'] == False and
-        tile_to_check2['solid'] == False and tile_to_check2['platform'] == False and
-        tile_to_check3['solid'] == False and tile_to_check3['platform'] == False):
+        if grid.solid_in_rect(below, solid_or_platform) is None:
             self.on_ground = False
             self.vector[1]+= GRAVITY_STRENGTH
             if(self.vector[1]>4): self.vector[1]=TERMINAL_VELOCITY #speed limit
@@ -686,45 +1079,34 @@ class Enemy(pygame.sprite.Sprite):
         # have to break this up depending on direction because we need to know if
         # the size of the tile matters. Remember, we measure from top left corner.
         if (self.vector[0] < 0): #moving left
-            tile_to_check1 = get_tile_properties(tmxdata, self.rect.x+self.vector[0], self.rect.y+(TILESIZE/4))
-            tile_to_check2 = get_tile_properties(tmxdata, self.rect.x+self.vector[0], self.rect.y+(TILESIZE/2))
-            tile_to_check3 = get_tile_properties(tmxdata, self.rect.x+self.vector[0], self.rect.y+TILESIZE-1)
-            if (tile_to_check1['solid'] == True) or (tile_to_check2['solid'] == True) or (tile_to_check3['solid'] == True):
+            ahead = Rect(math.floor(self.rect.x+self.vector[0]), self.rect.y+(TILESIZE//4), 1, TILESIZE-(TILESIZE//4))
+            if grid.solid_in_rect(ahead) is not None:
                 self.vector[0]= -self.vector[0]
     
         # I also want to check the tiles immediately in front of and below, so enemy doesn't walk off cliffs.
-            tile_to_check1 = get_tile_properties(tmxdata, self.rect.x+self.vector[0]-2, self.rect.y+(TILESIZE)+1)
-            if(tile_to_check1['solid'] == False):
+            if not grid.solid_at(self.rect.x+self.vector[0]-2, self.rect.y+(TILESIZE)+1):
                 self.vector[0]= -self.vector[0]
 
         if (self.vector[0] > 0): #moving right
-            tile_to_check1 = get_tile_properties(tmxdata, self.rect.x+self.vector[0]+TILESIZE, self.rect.y+(TILESIZE/4))
-            tile_to_check2 = get_tile_properties(tmxdata, self.rect.x+self.vector[0]+TILESIZE, self.rect.y+(TILESIZE/2))
-            tile_to_check3 = get_tile_properties(tmxdata, self.rect.x+self.vector[0]+TILESIZE, self.rect.y+TILESIZE-1)
-            if (tile_to_check1['solid'] == True) or (tile_to_check2['solid'] == True) or (tile_to_check3['solid'] == True):
+            ahead = Rect(math.floor(self.rect.x+self.vector[0]+TILESIZE), self.rect.y+(TILESIZE//4), 1, TILESIZE-(TILESIZE//4))
+            if grid.solid_in_rect(ahead) is not None:
                 self.vector[0]= -self.vector[0]
                 
             # I also want to check the tiles immediately in front of and below, so enemy doesn't walk off cliffs.
-            tile_to_check1 = get_tile_properties(tmxdata, self.rect.x+self.vector[0]+TILESIZE+2, self.rect.y+(TILESIZE)+1)
-            if(tile_to_check1['solid'] == False):
+            if not grid.solid_at(self.rect.x+self.vector[0]+TILESIZE+2, self.rect.y+(TILESIZE)+1):
                 self.vector[0]= -self.vector[0]
                 
         if (self.vector[1] < 0): #moving up.
-            tile_to_check1 = get_tile_properties(tmxdata, self.rect.x, self.rect.y+self.vector[1]+(TILESIZE/4))
-            tile_to_check2 = get_tile_properties(tmxdata, self.rect.x+(TILESIZE/2), self.rect.y+self.vector[1]+(TILESIZE/4))
-            tile_to_check3 = get_tile_properties(tmxdata, self.rect.x+TILESIZE, self.rect.y+self.vector[1]+(TILESIZE/4))
-            if (tile_to_check1['solid'] == True) or (tile_to_check2['solid'] == True) or (tile_to_check3['solid'] == True):
+            above = Rect(self.rect.x, math.floor(self.rect.y+self.vector[1]+(TILESIZE/4)), TILESIZE+1, 1)
+            if grid.solid_in_rect(above) is not None:
                 self.vector[1]=0
                 
         # Moving down is a little more complicated. We want to not fall through the floor, but also "snap to" the floor
         # when we land on it. We accomplish this by calculating how much the character needs to move to snap to the next
         # grid location. Note that this assumes solidity is only applicable in full TILESIZE tiles.
         if (self.vector[1] > 0): #moving down
-            tile_to_check1 = get_tile_properties(tmxdata, self.rect.x, self.rect.y+self.vector[1]+TILESIZE)
-            tile_to_check2 = get_tile_properties(tmxdata, self.rect.x+(TILESIZE/2), self.rect.y+self.vector[1]+TILESIZE)
-            tile_to_check3 = get_tile_properties(tmxdata, self.rect.x+TILESIZE, self.rect.y+self.vector[1]+TILESIZE)
-            if (tile_to_check1['solid'] == True) or (tile_to_check2['solid'] == True) or (tile_to_check3['solid'] == True or
-                tile_to_check1['platform'] == True) or (tile_to_check2['platform'] == True) or (tile_to_check3['platform'] == True):
+            below = Rect(self.rect.x, math.floor(self.rect.y+self.vector[1]+TILESIZE), TILESIZE+1, 1)
+            if grid.solid_in_rect(below, solid_or_platform) is not None:
                  snap_to_grid = TILESIZE - (self.rect.y%TILESIZE)
                  self.rect.y += snap_to_grid
                  self.vector[1]=0
@@ -760,83 +1142,41 @@ class Enemy(pygame.sprite.Sprite):
             # Walking frames start at 0 and each frame is 16
             # pixels, wide, so...
             x_target = (TILESIZE*self.animation_frame)
-            self.image = self.my_sprite_sheet.image_at((self.WALKING_START_FRAME+x_target,0,TILESIZE,TILESIZE)).convert_alpha()  
+            self.frame_rect = (self.WALKING_START_FRAME+x_target,0,TILESIZE,TILESIZE)
 
         # Dying
         if self.animation_behavior == DYING:
-             self.image = self.my_sprite_sheet.image_at(
-             (self.DYING_START_FRAME,0,TILESIZE,TILESIZE)).convert_alpha()    
+             self.frame_rect = (self.DYING_START_FRAME,0,TILESIZE,TILESIZE)
 
         # Image will be facing left by default, because that is how it is
         # draw. Flip it depending on direction.
         # Note that we don't use .self here. Why? B'c this is a global constant
         # coming from our constants file, not a class constant!
-        if self.facing == RIGHT:
-            # The flip function has three parameters: source image,
-            # whether to flip horizonal, whether to flip vertical
-            # Here, we flip horizontaly if facing left.
-            self.image = pygame.transform.flip(self.image, True, False)
+        # The sprite sheet keeps a flipped copy of every frame for us, so
+        # we just ask for the flipped one if we're facing right.
+        self.image = self.my_sprite_sheet.get_frame(self.frame_rect, self.facing == RIGHT)
             
-class Effect(pygame.sprite.Sprite):
-    
-    def __init__(self,init_x,init_y):
-        
-        # Call the init function of the sprite class from which this inherets.
-        pygame.sprite.Sprite.__init__(self)
-        
-        # GRAPHICS SETUP ------------        
-        # Instead of loading an image directly we will use the
-        # spritesheet object, defined below. 
-        self.my_sprite_sheet = Sprite_Sheet("Little_Boom.png")
-        # Now we will initially set the image of this sprite
-        # to be the first image on the sprite sheet.
-        # Why do we use two paratheses? Because the .image_at function
-        # expects to get a single parameter: an array of 4 numbers.
-        self.image = self.my_sprite_sheet.image_at((0,0,16,16))
-        # Name. This game object needs a name so others can identify it.
-        self.name = "effect"
-        
-        # This will track the "state" of the object.
-        # Different states will have different positions on the sprite sheet.
-        # Use class-specific constants to make code easier to read.
-        self.EXPLODE = 0
-        self.EXPLODE_START_FRAME = 0 * TILESIZE
-        self.state = self.EXPLODE
-        self.state_counter = 0
-        
-        # This will be used to determine what frame of animation
-        # the object is currently displaying within that state.
-        self.animation_behavior = self.EXPLODE
-        self.animation_frame = 0
-        self.ANIMATION_SPEED = 4
-        self.ANIMATION_EXPLODE_FRAMES = 5
-        self.animation_delay = 0
-        
+class Effect(object):
+
+    # An explosion. This used to be a Sprite that played its own
+    # animation. Now it just sends a burst of particles out of an emitter
+    # (see particles.py): the old explosion animation, plus some debris
+    # and sparks. The emitter does all the moving and drawing.
+    __slots__ = ("rect",)
+
+    # Class-specific constants, shared by every effect.
+    name = "effect"
+
+    def __init__(self,init_x,init_y,emitter):
+
         # As we set initial condition, understand the spawn point is going to be up
         # and to the right of where the initial x and y are because this is a larger sprite
         # And, remember, the Rect arguments are (x,y,h,w), not x1,y1 and x2,y2!
         self.rect = pygame.Rect(init_x-TILESIZE/2,init_y-TILESIZE/2,TILESIZE*2,TILESIZE*2)
-        
-    # Returns the image of this object
-    def draw(self, map_image):
-        map_image.blit(self.image,(self.rect.x,self.rect.y))
-            
-    def update(self):
-        #All that the effect does is cycle through its animation and then die.
-        if self.animation_behavior == self.EXPLODE:
-            self.animation_delay +=1
-            if(self.animation_delay > self.ANIMATION_SPEED):
-                self.animation_frame += 1
-                self.animation_delay = 0
-            if(self.animation_frame>self.ANIMATION_EXPLODE_FRAMES):
-                self.animation_frame = self.ANIMATION_EXPLODE_FRAMES
-                self.state = DEAD
-                
-            # We find the right place on the sprite sheet.
-            # Walking frames start at 0 and each frame is 16
-            # pixels, wide, so...
-            x_target = (TILESIZE*2*self.animation_frame)
-            self.image = self.my_sprite_sheet.image_at((self.EXPLODE_START_FRAME+x_target,0,TILESIZE*2,TILESIZE*2)).convert_alpha()  
+
+        emitter.burst("explosion", self.rect.centerx, self.rect.centery)
+        emitter.burst("debris", self.rect.centerx, self.rect.centery)
+        emitter.burst("sparks", self.rect.centerx, self.rect.centery)
 
 # ============================================
 # ==                 HUD                    ==
@@ -845,27 +1185,34 @@ class Effect(pygame.sprite.Sprite):
 # get drawn on top of the screen, like life bars.
 
 class Hud(object):
+
+    # Every variable a Hud has. See Player for what this does. The Hud
+    # isn't a pygame Sprite, so it doesn't even need a dictionary.
+    __slots__ = ("lifebar_sprite_sheet", "lifebar_image", "hit_points", "lifebar", "lifebar_hit_points")
+
+    # Name. This game object needs a name so others can identify it.
+    name = "HUD"
     
     def __init__(self):
         
-         # Call the init function of the sprite class from which this inherets.
-        pygame.sprite.Sprite.__init__(self)
-        
         # GRAPHICS SETUP ------------        
         # Instead of loading an image directly we will use the
         # spritesheet object, defined below. 
-        self.lifebar_sprite_sheet = Sprite_Sheet("Heart.png")
+        self.lifebar_sprite_sheet = load_sprite_sheet("Heart.png")
 
         # Now we will initially set the image of this sprite
         # to be the first image on the sprite sheet.
         # Why do we use two paratheses? Because the .image_at function
         # expects to get a single parameter: an array of 4 numbers.
-        self.lifebar_image = self.lifebar_sprite_sheet.image_at((0,0,16,16))
+        self.lifebar_image = self.lifebar_sprite_sheet.get_frame((0,0,16,16))
 
-        # Name. This game object needs a name so others can identify it.
-        self.name = "HUD"
         # Starting hit points to display
         self.hit_points = 4
+
+        # The finished life bar picture. Hit points don't change very
+        # often, so we only build a new picture when they do.
+        self.lifebar = None
+        self.lifebar_hit_points = None
     
     def update(self, player_life):
         
@@ -873,11 +1220,9 @@ class Hud(object):
         
     def draw(self):
         
-        lifebar = pygame.Surface((16,16))
-        lifebar = pygame.transform.scale(lifebar,(16*self.hit_points,16))
-        for i in range(0,self.hit_points):
-            lifebar.blit(self.lifebar_image,(16*i,0))
-        lifebar.convert_alpha()
-        return lifebar
-        
-    
\ No newline at end of file
+        if(self.lifebar is None or self.lifebar_hit_points != self.hit_points):
+            self.lifebar = surfaces.new_surface((16*self.hit_points,16), category = "hud")
+            for i in range(0,self.hit_points):
+                self.lifebar.blit(self.lifebar_image,(16*i,0))
+            self.lifebar_hit_points = self.hit_points
+        return self.lifebar
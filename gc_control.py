@@ -0,0 +1,155 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#gc is Python's garbage collector
+import gc
+import time
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+
+# ============================================
+# ==        GARBAGE COLLECTOR CONTROL       ==
+# ============================================
+# Python frees most things as soon as nothing is using
+# them. But things that point at each other in a circle
+# (like a map layer that points back at its map) never
+# get freed that way, so every so often Python's "garbage
+# collector" stops everything and goes looking for them.
+#
+# It decides when to do that by counting how many new
+# objects have been made, and the game makes LOTS of
+# little objects every frame (rects, lists, dicts). So
+# the collector runs all the time, and every now and then
+# it does a big "full" collection that looks at every
+# object in the game. That's a hitch you can see.
+#
+# The collector sorts objects into three "generations":
+#   0 - brand new. Most objects die young, so this is
+#       checked often and it's quick.
+#   1 - survived one collection.
+#   2 - survived two. This is where the map, the sprites
+#       and everything else that lasts ends up, so
+#       checking it is slow.
+#
+# The GC manager does a few things about it:
+#   - After a map loads, gc.freeze() moves everything
+#     that exists right then out of the collector's sight
+#     (the "permanent generation"). The map isn't going
+#     anywhere, so there's no point checking it again and
+#     again. Before the next freeze we unfreeze, so the
+#     old map can be cleaned up properly.
+#   - While PLAYING, automatic collection is either turned
+#     off or made to happen much less often
+#     (GC_PLAYING_MODE).
+#   - At the end of a frame with spare time, and in menus
+#     and pauses, it does the cleaning up itself, where a
+#     pause won't be noticed.
+#   - It times every collection, and sends the times to
+#     tracing.py and counters.py.
+
+class GC_Manager(object):
+
+    def __init__(self):
+
+        # What the collector was set to before we started changing it.
+        self.normal_thresholds = gc.get_threshold()
+        self.playing = False
+
+        # Timing collections.
+        self.collection_start_ns = 0
+        self.idle_collection = False
+        # generation -> [how many, total ms, longest ms]
+        self.pauses = {0: [0, 0, 0], 1: [0, 0, 0], 2: [0, 0, 0]}
+        # How many of those were done by us, in spare time.
+        self.idle_collections = 0
+        gc.callbacks.append(self.on_collection)
+
+    # Python calls this at the start and end of every collection.
+    def on_collection(self, phase, info):
+
+        if phase == "start":
+            self.collection_start_ns = time.perf_counter_ns()
+            return
+
+        end_ns = time.perf_counter_ns()
+        generation = info["generation"]
+        pause_ms = (end_ns - self.collection_start_ns) / 1000000
+        stats = self.pauses[generation]
+        stats[0] += 1
+        stats[1] += pause_ms
+        stats[2] = max(stats[2], pause_ms)
+
+        kind = "idle" if self.idle_collection else "automatic"
+        tracing.record("gc " + str(generation), "gc", self.collection_start_ns, end_ns,
+                       kind + ", freed " + str(info["collected"]))
+        counters.add("gc collections")
+        counters.observe("gc pause microseconds", int(pause_ms * 1000))
+
+    # Run a collection ourselves, and remember that it was on purpose.
+    def collect(self, generation = 2):
+        self.idle_collection = True
+        gc.collect(generation)
+        self.idle_collection = False
+        self.idle_collections += 1
+
+    # Call after a new map (and its sprites) are loaded.
+    def after_map_load(self):
+
+        # Let the collector see the last map again so it can be thrown
+        # away, clean up properly, then hide everything that's left.
+        gc.unfreeze()
+        self.collect(2)
+        gc.freeze()
+
+    # Call every frame with whether the game is being played right now.
+    def set_playing(self, playing):
+
+        if playing == self.playing: return
+        self.playing = playing
+        if playing:
+            if GC_PLAYING_MODE == "disable":
+                gc.disable()
+            else:
+                gc.set_threshold(*GC_PLAYING_THRESHOLDS)
+        else:
+            gc.enable()
+            gc.set_threshold(*self.normal_thresholds)
+
+    # Call at the end of each frame with how many milliseconds are left
+    # before the next one is due. Cleans up if there's time, starting
+    # with the oldest generation that needs it, like Python itself does.
+    def idle(self, time_left_ms):
+
+        if time_left_ms < GC_IDLE_MIN_MS: return
+        counts = gc.get_count()
+        for generation in (2, 1, 0):
+            if counts[generation] >= GC_IDLE_THRESHOLDS[generation]:
+                self.collect(generation)
+                return
+
+    def print_summary(self):
+
+        print("Garbage collector pauses (" + str(self.idle_collections) + " done in spare time):")
+        for generation in (0, 1, 2):
+            count, total, longest = self.pauses[generation]
+            average = total / count if count else 0
+            print("  generation " + str(generation) + ": " + str(count).rjust(6) + " collections, " +
+                  "average " + str(round(average, 3)) + " ms, longest " + str(round(longest, 3)) + " ms")
+
+    # Put the collector back the way we found it.
+    def stop(self):
+        self.set_playing(False)
+        if self.on_collection in gc.callbacks:
+            gc.callbacks.remove(self.on_collection)
@@ -0,0 +1,138 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+
+# A deque is a list that can throw away its oldest item when it gets
+# full, which is just what we want for keeping the last few frame times.
+from collections import deque
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+# ============================================
+# ==          QUALITY GOVERNOR              ==
+# ============================================
+# On a slow computer, the game can take longer than
+# 1/60th of a second to draw a frame, and then everything
+# gets choppy. The governor keeps an eye on how long each
+# frame takes to make. If frames are taking too long, it
+# turns some of the fancier stuff down a notch. If there's
+# lots of time to spare, it turns things back up.
+#
+# Each quality level turns off one more thing:
+#   0 - Everything on.
+#   1 - Camera uses fast (blocky) scaling instead of smoothscale.
+#   2 - Camera zoom snaps to steps of QUALITY_ZOOM_STEP.
+#   3 - Doodads only animate every other frame, and particle bursts
+#       are smaller (QUALITY_PARTICLE_DENSITY).
+#   4 - Enemies far away from the camera stop moving until you get close.
+#
+# To stop it flip-flopping back and forth every frame, it only
+# changes level when the average has been too slow (or fast) for a
+# while, and then waits a bit before changing again. That's called
+# "hysteresis".
+#
+# Every change gets marked on the trace (see tracing.py), and the
+# current level is saved with the counters every frame (see
+# counters.py), so it shows up next to the frame times.
+
+class Quality_Governor(object):
+
+    def __init__(self):
+
+        self.level = 0
+        self.MAX_LEVEL = 4
+
+        # The last second or so of frame times, in milliseconds.
+        self.frame_times = deque(maxlen = QUALITY_SAMPLE_FRAMES)
+        self.average_ms = 0
+
+        # How many checks in a row have been too slow or had room to spare.
+        self.slow_count = 0
+        self.fast_count = 0
+        # Frames to wait after a change before we're allowed to change again.
+        self.cooldown = 0
+
+        # Every change we've made, so we can see what happened later.
+        # Each one is (frame number, old level, new level, average ms).
+        self.history = []
+        self.frame_number = 0
+
+    # Tell the governor how long the last frame took to make, in seconds.
+    # Don't include time spent waiting in clock.tick(); that's not work!
+    def record(self, work_seconds):
+
+        self.frame_number += 1
+        milliseconds = work_seconds * 1000
+        counters.add("quality level", self.level)
+
+        # Ignore giant stalls like loading a new map. They aren't the
+        # kind of slowness that turning down quality can fix.
+        if milliseconds > QUALITY_IGNORE_MS:
+            return
+
+        self.frame_times.append(milliseconds)
+        self.average_ms = sum(self.frame_times) / len(self.frame_times)
+
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+        # Wait until we have a full set of samples before judging.
+        if len(self.frame_times) < self.frame_times.maxlen:
+            return
+
+        if self.average_ms > FRAME_BUDGET_MS * QUALITY_DOWN_THRESHOLD:
+            self.slow_count += 1
+            self.fast_count = 0
+        elif self.average_ms < FRAME_BUDGET_MS * QUALITY_UP_THRESHOLD:
+            self.fast_count += 1
+            self.slow_count = 0
+        else:
+            self.slow_count = 0
+            self.fast_count = 0
+
+        if self.slow_count >= QUALITY_PATIENCE and self.level < self.MAX_LEVEL:
+            self.change_level(self.level + 1)
+        elif self.fast_count >= QUALITY_PATIENCE * 2 and self.level > 0:
+            # Be slower to turn quality back up than to turn it down.
+            self.change_level(self.level - 1)
+
+    def change_level(self, new_level):
+
+        print("Quality level " + str(self.level) + " -> " + str(new_level) +
+              " (average frame " + str(round(self.average_ms, 2)) + " ms)")
+        self.history.append((self.frame_number, self.level, new_level, self.average_ms))
+        tracing.instant("quality level " + str(new_level), "frame")
+        self.level = new_level
+        self.slow_count = 0
+        self.fast_count = 0
+        self.cooldown = QUALITY_COOLDOWN_FRAMES
+        # Old frame times were measured at the old level, so start fresh.
+        self.frame_times.clear()
+
+    # Push the current quality settings onto the camera and sprite handler.
+    # Call this once a frame.
+    def apply(self, game_camera, sprite_handler):
+
+        game_camera.smooth_scaling = self.level < 1
+        if self.level >= 2: game_camera.zoom_step = QUALITY_ZOOM_STEP
+        else: game_camera.zoom_step = 0
+        if self.level >= 3: sprite_handler.doodad_update_interval = 2
+        else: sprite_handler.doodad_update_interval = 1
+        if self.level >= 3: sprite_handler.particles.density = QUALITY_PARTICLE_DENSITY
+        else: sprite_handler.particles.density = 1
+        if self.level >= 4: sprite_handler.activity_margin = QUALITY_ACTIVITY_MARGIN
+        else: sprite_handler.activity_margin = None
@@ -0,0 +1,244 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+import os
+#Reads the XML that Tiled saves maps in
+from xml.etree import ElementTree
+
+#Reads the layers' tiles the same way pytmx does
+import pytmx
+from pytmx.pytmx import unpack_gids, decode_gid
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Opens files from the asset archive, or loose ones if there isn't one
+import assets
+#The solidity grid every map gets
+import map_query
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+# ============================================
+# ==             HOT RELOADING              ==
+# ============================================
+# Making a level used to go: change it in Tiled, save, quit
+# the game, start it again, walk back to where you were.
+# With HOT_RELOAD on, the game keeps an eye on the map
+# you're playing instead, and shows your changes as soon as
+# you save.
+#
+# Every HOT_RELOAD_INTERVAL frames, the watcher checks when
+# the map file (and its tilesets, and their pictures) were
+# last changed. If one of them has, it reads the map again.
+#
+# Most edits are just painting tiles, so it tries to be
+# quick about those: it reads only the tiles out of the
+# file, compares them to the map we already have, and
+# changes just the tiles that are different. Only those
+# tiles get drawn again on the map picture, and only those
+# tiles on the Blocks layer get their solidity worked out
+# again. The tileset pictures are already loaded, so they
+# don't get read again.
+#
+# Anything else (a new tileset, a tile the map has never
+# used before, moving an exit, making the map bigger) needs
+# the whole map loaded again. Either way, the player, the
+# enemies and the camera stay just where they were.
+#
+# Maps inside the asset archive can't change, and streamed
+# maps (see world.py and chunked_map.py) don't have one map
+# picture to fix, so those don't get watched.
+
+# The map with the tiles taken out of every layer, as text. If this is
+# the same as last time, only tiles have changed.
+def map_layout(root):
+    layout = ElementTree.fromstring(ElementTree.tostring(root))
+    for data in layout.iter("data"):
+        data.text = ""
+    return ElementTree.tostring(layout)
+
+# Every file the map is made from: the map, any tileset files it uses,
+# and the tileset pictures. Files that aren't there are skipped.
+def map_files(map_name, root):
+    folder = os.path.dirname(map_name)
+    files = [map_name]
+    for tileset in root.findall("tileset"):
+        source = tileset.get("source")
+        tileset_folder = folder
+        if source is not None:
+            source = os.path.join(folder, source)
+            files.append(source)
+            tileset_folder = os.path.dirname(source)
+            try:
+                tileset = ElementTree.parse(source).getroot()
+            except (OSError, ElementTree.ParseError):
+                continue
+        for image in tileset.iter("image"):
+            files.append(os.path.join(tileset_folder, image.get("source", "")))
+    return [filename for filename in files if os.path.isfile(filename)]
+
+class Map_Watcher(object):
+
+    def __init__(self, map_name):
+
+        self.watch(map_name)
+
+    # Start watching a different map (like after a screen transition).
+    def watch(self, map_name):
+
+        self.map_name = map_name
+        self.frame = 0
+        self.mtimes = {}
+        self.layout = None
+        if assets.in_archive(map_name): return
+        try:
+            root = ElementTree.parse(map_name).getroot()
+        except (OSError, ElementTree.ParseError) as error:
+            print("Unable to watch", map_name, "for changes:", error)
+            return
+        self.layout = map_layout(root)
+        self.remember_mtimes(map_files(map_name, root))
+
+    def remember_mtimes(self, files):
+        self.mtimes = {}
+        for filename in files:
+            try:
+                self.mtimes[filename] = os.path.getmtime(filename)
+            except OSError:
+                pass
+
+    # Call once a frame. True if any of the map's files have changed.
+    def files_changed(self):
+
+        if not self.mtimes: return False
+        self.frame += 1
+        if self.frame % HOT_RELOAD_INTERVAL != 0: return False
+        counters.add("hot reload checks")
+        for filename, mtime in self.mtimes.items():
+            try:
+                if os.path.getmtime(filename) != mtime: return True
+            except OSError:
+                # Some editors delete the file and write a new one. Wait
+                # until it's back.
+                pass
+        return False
+
+    # Read the map again and bring tmxdata up to date. Only the changed
+    # tiles get drawn again on map_image. Returns the map to use from now
+    # on: tmxdata itself if only tiles changed, or a whole new map if
+    # anything else did (and then map_image needs drawing from scratch).
+    @tracing.traced("hot reload", "load")
+    def reload(self, tmxdata, map_image):
+
+        try:
+            root = ElementTree.parse(self.map_name).getroot()
+        except (OSError, ElementTree.ParseError) as error:
+            # Tiled might still be saving. Try again next time it changes.
+            print("Unable to reload", self.map_name + ":", error)
+            self.remember_mtimes(self.mtimes)
+            return tmxdata
+        files = map_files(self.map_name, root)
+        layout = map_layout(root)
+
+        tileset_changed = False
+        for filename in files:
+            if filename != self.map_name and os.path.getmtime(filename) != self.mtimes.get(filename):
+                tileset_changed = True
+
+        changed_tiles = None
+        if layout == self.layout and tileset_changed == False:
+            changed_tiles = self.reload_tiles(tmxdata, root)
+
+        if changed_tiles is None:
+            from methods import preview_new_map
+            try:
+                tmxdata = preview_new_map(self.map_name)
+            except Exception as error:
+                print("Unable to reload", self.map_name + ":", error)
+                self.remember_mtimes(files)
+                return tmxdata
+            counters.add("hot reloads (whole map)")
+            print("Reloaded", self.map_name)
+        else:
+            self.redraw_tiles(tmxdata, map_image, changed_tiles)
+            counters.add("hot reloads (tiles)")
+            print("Reloaded", self.map_name + ":", len(changed_tiles), "tiles changed")
+
+        self.layout = layout
+        self.remember_mtimes(files)
+        return tmxdata
+
+    # Copy any tiles that changed in the file into tmxdata. Returns a list
+    # of (tile x, tile y) that changed, or None if the tiles can't be
+    # copied over and the whole map has to be loaded again.
+    def reload_tiles(self, tmxdata, root):
+
+        tile_layers = [layer for layer in tmxdata.layers if isinstance(layer, pytmx.TiledTileLayer)]
+        layer_nodes = root.findall("layer")
+        if len(layer_nodes) != len(tile_layers): return None
+
+        # Work out every layer's new tiles before changing anything, so a
+        # tile we can't use leaves the map how it was.
+        new_layers = []
+        for layer, node in zip(tile_layers, layer_nodes):
+            data = node.find("data")
+            if data is None or data.find("chunk") is not None: return None
+            raw_gids = unpack_gids(data.text.strip(), data.get("encoding"), data.get("compression"))
+            if len(raw_gids) != layer.width * layer.height: return None
+            # pytmx gives each (tile, flips) its own number when it loads
+            # the map. A tile it hasn't seen before has no picture loaded.
+            gids = {}
+            for raw_gid in set(raw_gids):
+                if raw_gid == 0:
+                    gids[raw_gid] = 0
+                    continue
+                mapped = tmxdata.imagemap.get(decode_gid(raw_gid))
+                if mapped is None: return None
+                gids[raw_gid] = mapped[0]
+            new_layers.append([gids[raw_gid] for raw_gid in raw_gids])
+
+        changed_tiles = set()
+        block_layer = tmxdata.layers[BLOCK_LAYER]
+        grid = map_query.get_grid(tmxdata)
+        for layer, new_gids in zip(tile_layers, new_layers):
+            width = layer.width
+            for tile_y, row in enumerate(layer.data):
+                new_row = new_gids[tile_y*width:(tile_y + 1)*width]
+                if row == new_row: continue
+                for tile_x in range(0, width):
+                    if row[tile_x] != new_row[tile_x]:
+                        row[tile_x] = new_row[tile_x]
+                        changed_tiles.add((tile_x, tile_y))
+                        if layer is block_layer: grid.update_tile(tmxdata, tile_x, tile_y)
+        return sorted(changed_tiles)
+
+    # Draw these tiles again, every layer from the bottom up, the same as
+    # blit_all_tiles() in methods.py does for the whole map.
+    def redraw_tiles(self, tmxdata, map_image, tiles):
+
+        layers = [layer for layer in tmxdata.visible_layers if isinstance(layer, pytmx.TiledTileLayer)]
+        for tile_x, tile_y in tiles:
+            tile_rect = Rect(tile_x*TILESIZE, tile_y*TILESIZE, TILESIZE, TILESIZE)
+            map_image.fill(0, tile_rect)
+            for layer in layers:
+                image = tmxdata.images[layer.data[tile_y][tile_x]]
+                if image is not None:
+                    map_image.blit(image, tile_rect)
+                    counters.add("blits")
@@ -0,0 +1,464 @@
+# ======================================
+# ==          L E V E L               ==
+# ==        C O M P I L E R           ==
+# ======================================
+# Checks every level in a folder and gets it ready to ship.
+# Run it like this:
+#
+#     python level_compiler.py
+#
+# For every .tmx map it:
+#
+#   - checks that every exit has a "dest" map that's really
+#     there, and a "dir" that map has an entrance for (the
+#     game looks for an entrance with the same dir as the
+#     exit you walked through).
+#   - checks that every player_spawn and enemy_spawn is
+#     standing on something, within COMPILER_MAX_SPAWN_DROP
+#     tiles, and that nothing starts inside a solid tile.
+#   - checks that every tile on the Blocks layer (BLOCK_LAYER)
+#     has properties. The game quietly treats a tile without
+#     any as solid (see get_tile_properties() in methods.py),
+#     so a mistake there is easy to miss.
+#   - writes the compiled map to COMPILED_LEVELS_DIR: the .tmx
+#     with its tilesets copied in (the same as pack_assets.py
+#     does), the tileset pictures, and a .grid file with the
+#     map's solidity flags (one byte per tile, row by row, the
+#     same as a Solidity_Grid in map_query.py). The game reads
+#     the .grid instead of working the flags out again, as
+#     long as the map hasn't changed since (see compiled_flags()
+#     in map_query.py).
+#
+# The maps get compiled in parallel on a pool of worker
+# processes, one per core. The workers only read XML, so
+# they don't need pygame to open a window or load any
+# pictures.
+#
+# At the end it writes levels.json: every map, the files it
+# was made from, and which maps its exits lead to (the
+# "dependency graph" of the levels). Next time, maps whose
+# files haven't changed since then are skipped. Use --force
+# to compile everything anyway.
+#
+# Problems are either errors (the level is broken) or
+# warnings (it works, but probably isn't what you meant).
+# If there are any errors, it exits with 1, so a build
+# script can stop.
+
+import os
+import sys
+import json
+import time
+import argparse
+#Runs lots of compiles at once on different cores
+import multiprocessing
+#Reads the XML that Tiled saves maps in
+from xml.etree import ElementTree
+
+#Reads the layers' tiles the same way pytmx does
+from pytmx.pytmx import unpack_gids, decode_gid
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Turns tile properties into solidity flags, the same way the game does
+import map_query
+#Copies tilesets into maps, the same way the asset archive does
+import pack_assets
+
+# The directions an exit or entrance can have.
+DIRECTION_NAMES = ["UP", "DOWN", "LEFT", "RIGHT"]
+
+# Which of a map's children are layers (BLOCK_LAYER counts these).
+LAYER_TAGS = ["layer", "objectgroup", "imagelayer", "group"]
+
+# Objects that start something off on the map, and need ground under them.
+SPAWN_NAMES = ["player_spawn", "enemy_spawn"]
+
+# ============================================
+# ==           READING A MAP                ==
+# ============================================
+
+# Properties from a map, tileset or object, with their types, the same
+# as pytmx reads them.
+def read_properties(node):
+
+    properties = {}
+    properties_node = node.find("properties")
+    if properties_node is None: return properties
+    for property_node in properties_node.findall("property"):
+        value = property_node.get("value", property_node.text)
+        kind = property_node.get("type", "string")
+        if kind == "bool": value = value == "true"
+        elif kind == "int": value = int(value)
+        elif kind == "float": value = float(value)
+        properties[property_node.get("name")] = value
+    return properties
+
+# A map's tile layer as one list of raw Tiled gids, row by row. An
+# infinite map's chunks get put together into one big layer, with the
+# top left chunk at (0, 0) like chunked_map.py does.
+def read_layer(node, width, height, origin):
+
+    data = node.find("data")
+    encoding = data.get("encoding")
+    compression = data.get("compression")
+    chunks = data.findall("chunk")
+    if not chunks:
+        return unpack_gids(data.text.strip(), encoding, compression)
+
+    gids = [0] * (width * height)
+    for chunk in chunks:
+        chunk_x = int(chunk.get("x")) - origin[0]
+        chunk_y = int(chunk.get("y")) - origin[1]
+        chunk_width = int(chunk.get("width"))
+        chunk_gids = unpack_gids(chunk.text.strip(), encoding, compression)
+        for i, gid in enumerate(chunk_gids):
+            gids[(chunk_y + i // chunk_width) * width + chunk_x + i % chunk_width] = gid
+    return gids
+
+# An infinite map's size in tiles, and where its top left chunk is.
+def infinite_map_size(root):
+
+    corners = []
+    for chunk in root.iter("chunk"):
+        x = int(chunk.get("x"))
+        y = int(chunk.get("y"))
+        corners.append((x, y, x + int(chunk.get("width")), y + int(chunk.get("height"))))
+    if not corners: return 0, 0, (0, 0)
+    left = min(corner[0] for corner in corners)
+    top = min(corner[1] for corner in corners)
+    right = max(corner[2] for corner in corners)
+    bottom = max(corner[3] for corner in corners)
+    return right - left, bottom - top, (left, top)
+
+# ============================================
+# ==           COMPILING A MAP              ==
+# ============================================
+
+class Level_Report(object):
+
+    def __init__(self, map_name):
+        self.map_name = map_name
+        self.errors = []
+        self.warnings = []
+
+    def error(self, message):
+        self.errors.append(message)
+
+    def warning(self, message):
+        self.warnings.append(message)
+
+# Check one map and write its compiled files into out_dir. Returns a
+# summary of the map (a dictionary, so it can come back from a worker
+# process and go in levels.json).
+def compile_level(job):
+
+    map_name, out_dir = job
+    start = time.perf_counter()
+    report = Level_Report(map_name)
+    summary = {"map": map_name, "files": [map_name], "exits": [], "entrances": []}
+    # Anything going wrong is an error for this map only, so one broken
+    # map can't stop the others from being compiled.
+    try:
+        compile_map(map_name, out_dir, report, summary)
+    except (OSError, ValueError, ElementTree.ParseError) as error:
+        report.error("can't be compiled: " + str(error))
+    except Exception as error:
+        report.error("can't be compiled: " + type(error).__name__ + ": " + str(error))
+    summary["mtimes"] = {}
+    for filename in summary["files"]:
+        try:
+            summary["mtimes"][filename] = os.path.getmtime(filename)
+        except OSError:
+            pass
+    summary["errors"] = report.errors
+    summary["warnings"] = report.warnings
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+def compile_map(map_name, out_dir, report, summary):
+
+    root = ElementTree.parse(map_name).getroot()
+    infinite = root.get("infinite", "0") == "1"
+    if infinite:
+        width, height, origin = infinite_map_size(root)
+    else:
+        width, height, origin = int(root.get("width")), int(root.get("height")), (0, 0)
+    summary["width"] = width
+    summary["height"] = height
+    summary["infinite"] = infinite
+
+    # Tilesets: the files they come from, and every tile's properties.
+    tile_properties = {}
+    for tileset in root.findall("tileset"):
+        firstgid = int(tileset.get("firstgid"))
+        source = tileset.get("source")
+        tileset_file = map_name
+        if source is not None:
+            tileset_file = pack_assets.find_file(source, map_name)
+            if tileset_file is None:
+                report.error("uses tileset " + source + ", which can't be found")
+                continue
+            if not os.path.exists(os.path.join(os.path.dirname(map_name), source)):
+                report.warning("tileset " + source + " isn't there; using " + tileset_file + " instead")
+            summary["files"].append(tileset_file)
+            tileset = ElementTree.parse(tileset_file).getroot()
+        for image in tileset.iter("image"):
+            image_file = pack_assets.find_file(image.get("source"), tileset_file)
+            if image_file is None:
+                report.error(tileset_file + " uses image " + image.get("source") + ", which can't be found")
+            else:
+                summary["files"].append(image_file)
+        for tile in tileset.findall("tile"):
+            tile_properties[firstgid + int(tile.get("id"))] = read_properties(tile)
+
+    # Solidity, from the Blocks layer.
+    layers = [node for node in root if node.tag in LAYER_TAGS]
+    flags = bytearray(width * height)
+    if BLOCK_LAYER >= len(layers) or layers[BLOCK_LAYER].tag != "layer":
+        report.error("has no tile layer number " + str(BLOCK_LAYER) + " for the Blocks")
+    else:
+        gids = read_layer(layers[BLOCK_LAYER], width, height, origin)
+        if len(gids) != width * height:
+            raise ValueError("the Blocks layer has " + str(len(gids)) + " tiles, not " + str(width * height))
+        gid_flags = {}
+        # gid -> the first tile that uses it, for tiles with problems
+        missing = {}
+        not_solid = {}
+        for i, raw_gid in enumerate(gids):
+            tile_flags = gid_flags.get(raw_gid)
+            if tile_flags is None:
+                gid = decode_gid(raw_gid)[0]
+                properties = tile_properties.get(gid)
+                if properties is None: missing.setdefault(gid, i)
+                elif "solid" not in properties: not_solid.setdefault(gid, i)
+                tile_flags = map_query.flags_from_properties(properties)
+                gid_flags[raw_gid] = tile_flags
+            flags[i] = tile_flags
+        for gid, i in sorted(missing.items()):
+            where = "(" + str(i % width) + ", " + str(i // width) + ")"
+            if gid == 0:
+                report.error("has empty tiles on the Blocks layer (like at " + where + "), which the game makes solid")
+            else:
+                report.error("uses tile " + str(gid) + " on the Blocks layer (like at " + where +
+                             "), which has no properties, so the game makes it solid")
+        for gid, i in sorted(not_solid.items()):
+            report.warning("uses tile " + str(gid) + " on the Blocks layer (like at (" + str(i % width) + ", " +
+                           str(i // width) + ")), which has no solid property, so it isn't solid")
+
+    # Objects.
+    def tile_flags(tile_x, tile_y):
+        if 0 <= tile_x < width and 0 <= tile_y < height:
+            return flags[tile_y * width + tile_x]
+        return map_query.SOLID
+
+    for tile_object in root.iter("object"):
+        # Tiled leaves the name out of objects that don't have one.
+        name = tile_object.get("name", "")
+        properties = read_properties(tile_object)
+        x = float(tile_object.get("x", 0)) - origin[0] * TILESIZE
+        y = float(tile_object.get("y", 0)) - origin[1] * TILESIZE
+        where = name + " at (" + str(round(x)) + ", " + str(round(y)) + ")"
+
+        if name == "exit":
+            dest = properties.get("dest")
+            direction = properties.get("dir")
+            if dest is None or direction is None:
+                report.error(where + " needs a dest and a dir")
+                continue
+            if direction not in DIRECTION_NAMES:
+                report.error(where + " has dir " + str(direction) + ", which isn't UP, DOWN, LEFT or RIGHT")
+                continue
+            summary["exits"].append({"dest": dest, "dir": direction})
+
+        elif name == "entrance":
+            direction = properties.get("dir")
+            if direction not in DIRECTION_NAMES:
+                report.error(where + " has dir " + str(direction) + ", which isn't UP, DOWN, LEFT or RIGHT")
+            else:
+                summary["entrances"].append(direction)
+
+        if name in SPAWN_NAMES or name == "entrance":
+            tile_x = int(x // TILESIZE)
+            tile_y = int(y // TILESIZE)
+            if not (0 <= tile_x < width and 0 <= tile_y < height):
+                report.error(where + " is off the map")
+                continue
+            if tile_flags(tile_x, tile_y) & map_query.SOLID:
+                report.error(where + " is inside a solid tile")
+                continue
+
+        if name in SPAWN_NAMES:
+            # Look down from its feet for something to stand on.
+            feet_x = int((x + TILESIZE / 2) // TILESIZE)
+            feet_y = int((y + TILESIZE) // TILESIZE)
+            for drop in range(0, COMPILER_MAX_SPAWN_DROP + 1):
+                if feet_y + drop >= height or tile_flags(feet_x, feet_y + drop) != 0: break
+            else:
+                report.error(where + " isn't on solid ground (nothing within " +
+                             str(COMPILER_MAX_SPAWN_DROP) + " tiles below it)")
+                continue
+            if feet_y + drop >= height:
+                report.error(where + " would fall off the bottom of the map")
+
+    # Write the compiled files. Tiled writes relative paths from where the
+    # map was made, so copying the tilesets in lets the map load anywhere.
+    if report.errors: return
+    files = {}
+    compiled_map = pack_assets.pack_map(map_name, files)
+    base_name = os.path.splitext(os.path.basename(map_name))[0]
+    write_file(os.path.join(out_dir, os.path.basename(map_name)), compiled_map)
+    write_file(os.path.join(out_dir, base_name + ".grid"), bytes(flags))
+    for image_name, data in files.items():
+        write_file(os.path.join(out_dir, image_name), data)
+
+# Write to a temporary file first, so nothing ever sees half a file.
+def write_file(filename, data):
+    temporary_name = filename + ".tmp." + str(os.getpid())
+    with open(temporary_name, "wb") as out_file:
+        out_file.write(data)
+    os.replace(temporary_name, filename)
+
+# ============================================
+# ==       CHECKING THE WHOLE LEVEL SET     ==
+# ============================================
+# Exits point at other maps, so some things can only be checked once
+# every map has been read.
+
+def check_links(summaries, start_map):
+
+    problems = {map_name: ([], []) for map_name in summaries}
+    for map_name, summary in summaries.items():
+        errors = problems[map_name][0]
+        for exit_info in summary["exits"]:
+            dest = summary_for(summaries, exit_info["dest"])
+            if dest is None:
+                errors.append("exit to " + exit_info["dest"] + " goes to a map that isn't here")
+            elif exit_info["dir"] not in dest["entrances"]:
+                errors.append("exit to " + exit_info["dest"] + " goes " + exit_info["dir"] +
+                              ", but " + exit_info["dest"] + " has no " + exit_info["dir"] + " entrance")
+
+    # The game starts on start_map coming in from the RIGHT entrance.
+    start = summaries.get(start_map)
+    if start is not None:
+        if "RIGHT" not in start["entrances"]:
+            problems[start_map][0].append("is the start map, but has no RIGHT entrance to start at")
+        reachable = set([start_map])
+        waiting = [start_map]
+        while waiting:
+            for exit_info in summaries[waiting.pop()]["exits"]:
+                dest = summary_for(summaries, exit_info["dest"])
+                if dest is not None and dest["map"] not in reachable:
+                    reachable.add(dest["map"])
+                    waiting.append(dest["map"])
+        for map_name in summaries:
+            if map_name not in reachable:
+                problems[map_name][1].append("can't be reached from " + start_map)
+    return problems
+
+# Exits name maps relative to the game's folder, like "Notlevel2.tmx".
+def summary_for(summaries, map_name):
+    return summaries.get(os.path.normpath(map_name))
+
+# ============================================
+# ==              RUNNER                    ==
+# ============================================
+
+# Has anything this map was made from changed since it was last compiled?
+def is_stale(summary):
+    if summary is None or summary.get("errors"): return True
+    for filename, mtime in summary.get("mtimes", {}).items():
+        try:
+            if os.path.getmtime(filename) != mtime: return True
+        except OSError:
+            return True
+    return len(summary.get("mtimes", {})) != len(set(summary.get("files", [])))
+
+def compile_levels(out_dir, workers, force, start_map):
+
+    wall_start = time.perf_counter()
+    map_names = sorted(name for name in os.listdir(".") if name.endswith(".tmx"))
+    os.makedirs(out_dir, exist_ok = True)
+    graph_name = os.path.join(out_dir, "levels.json")
+
+    # The last build's summaries, for skipping maps that haven't changed.
+    previous = {}
+    if force == False and os.path.exists(graph_name):
+        try:
+            with open(graph_name) as graph_file:
+                previous = json.load(graph_file).get("maps", {})
+        except (OSError, ValueError):
+            previous = {}
+
+    summaries = {}
+    jobs = []
+    for map_name in map_names:
+        if is_stale(previous.get(map_name)):
+            jobs.append((map_name, out_dir))
+        else:
+            summaries[map_name] = previous[map_name]
+            summaries[map_name]["seconds"] = 0
+
+    if workers == 0 or len(jobs) <= 1:
+        results = [compile_level(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(min(workers, len(jobs))) as pool:
+            results = list(pool.imap_unordered(compile_level, jobs))
+    for summary in results:
+        summaries[summary["map"]] = summary
+
+    problems = check_links(summaries, start_map)
+
+    # The dependency graph: which files each map needs, and which maps
+    # its exits lead to.
+    graph = {"start_map": start_map, "maps": summaries,
+             "edges": sorted(set((map_name, os.path.normpath(exit_info["dest"]))
+                                 for map_name, summary in summaries.items()
+                                 for exit_info in summary["exits"]))}
+    write_file(graph_name, json.dumps(graph, indent = 1, sort_keys = True).encode("utf-8"))
+
+    return {"maps": map_names, "compiled": len(jobs), "summaries": summaries, "problems": problems,
+            "wall_seconds": time.perf_counter() - wall_start}
+
+def print_report(build):
+
+    error_count = 0
+    warning_count = 0
+    for map_name in build["maps"]:
+        summary = build["summaries"][map_name]
+        errors = summary["errors"] + build["problems"][map_name][0]
+        warnings = summary["warnings"] + build["problems"][map_name][1]
+        error_count += len(errors)
+        warning_count += len(warnings)
+        status = "ok" if not errors else "FAILED"
+        if summary["seconds"] == 0: status += " (unchanged)"
+        print(map_name.ljust(24) + status)
+        for message in errors:
+            print("    error: " + message)
+        for message in warnings:
+            print("    warning: " + message)
+    print("Compiled " + str(build["compiled"]) + " of " + str(len(build["maps"])) + " maps in " +
+          str(round(build["wall_seconds"], 2)) + " s: " + str(error_count) + " errors, " +
+          str(warning_count) + " warnings")
+    return error_count
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Check and compile every level in a folder.")
+    parser.add_argument("folder", nargs = "?", default = ".", help = "folder with the .tmx maps")
+    parser.add_argument("--out", default = COMPILED_LEVELS_DIR, help = "where the compiled maps go (inside the folder)")
+    parser.add_argument("--workers", type = int, default = os.cpu_count(),
+                        help = "worker processes (0 compiles everything in this process)")
+    parser.add_argument("--start", default = COMPILER_START_MAP, help = "the map the game starts on")
+    parser.add_argument("--force", action = "store_true", help = "compile every map, even ones that haven't changed")
+    args = parser.parse_args()
+
+    # Maps point at their tilesets (and exits at other maps) relative to
+    # the game's folder, so work from there.
+    os.chdir(args.folder)
+    build = compile_levels(args.out, args.workers, args.force, args.start)
+    if print_report(build) > 0:
+        sys.exit(1)
@@ -0,0 +1,380 @@
+# ======================================
+# ==     L E V E L   G E N E R A T O R  ==
+# ======================================
+# Makes big made-up levels for testing how the game
+# copes with lots of tiles and lots of enemies. Run it
+# like this:
+#
+#     python level_generator.py --width 1000 --height 60 --enemies 300 --seed 1
+#
+# or, for a row of maps linked together by exits:
+#
+#     python level_generator.py --world 5 --name Stressworld --seed 1
+#
+# That also writes Stressworld.world, which lays the maps out
+# side by side for world mode (see world.py).
+#
+# Every map gets a RIGHT entrance near its left edge and a
+# LEFT entrance near its right edge, unless you say otherwise.
+# --entrance DIR:X puts an entrance at tile column X (a
+# minus X counts back from the right edge), and --exit
+# DIR:MAP adds an exit to MAP. UP and DOWN exits go above
+# the map or down a pit, at the middle column unless you add
+# :X on the end:
+#
+#     python level_generator.py --name Bonus --entrance DOWN:10 --exit UP:Notlevel1.tmx:40
+#
+# Add --chunk-size 16 to save "infinite" maps in 16 x 16 chunks,
+# which the game streams in a chunk at a time (see
+# chunked_map.py). That's the way to make really long levels:
+#
+#     python level_generator.py --width 20000 --chunk-size 16 --name Longlevel
+#
+# The maps are normal .tmx files that use Notmario.tsx,
+# so Tiled can open them and the game can play them. The
+# same seed always makes exactly the same map.
+#
+# Each map has the same layers the hand-made ones do:
+#   Background         - sky
+#   Background Blocks  - empty, for decoration
+#   Blocks             - the ground and blocks you stand on
+#                        (this is BLOCK_LAYER in constants.py)
+#   Object Layer 1     - player_spawn, enemy_spawn, exit and entrance
+
+import os
+import sys
+import random
+import argparse
+#.world files are JSON
+import json
+#Writes the XML that Tiled saves maps in
+from xml.etree import ElementTree
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+# The tileset every generated map uses.
+TILESET_FILE = "Notmario.tsx"
+
+# Tiles we build levels out of. These are gids, which are one more
+# than the tile ids in Notmario.tsx.
+EMPTY_TILE = 44 # See-through, not solid
+SKY_TILE = 89
+GROUND_TOP_LEFT = 1
+GROUND_TOP = 2
+GROUND_TOP_RIGHT = 3
+GROUND_FILL = 18
+BLOCK_TILE = 4 # A solid brick block
+PLATFORM_TILES = [29, 30, 31] # Left, middle and right of a platform you can jump up through
+
+# How many columns at each end are kept flat, so there's room for
+# the entrances and exits.
+EDGE_COLUMNS = 5
+
+# The directions an exit or entrance can have.
+DIRECTION_NAMES = ["UP", "DOWN", "LEFT", "RIGHT"]
+
+# How wide the pit under a DOWN exit is, in tiles.
+DOWN_EXIT_PIT = 3
+
+# ============================================
+# ==            GENERATED MAP               ==
+# ============================================
+
+class Generated_Map(object):
+
+    def __init__(self, width, height):
+
+        self.width = width
+        self.height = height
+        # One list of gids per layer, row by row.
+        self.background = [SKY_TILE] * (width * height)
+        self.background_blocks = [EMPTY_TILE] * (width * height)
+        self.blocks = [EMPTY_TILE] * (width * height)
+        # (name, x, y, width, height, properties)
+        self.objects = []
+        # Where the top of the ground is in each column (None for a pit).
+        self.ground_tops = [None] * width
+
+    def set_block(self, x, y, gid):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.blocks[y * self.width + x] = gid
+
+    def get_block(self, x, y):
+        return self.blocks[y * self.width + x]
+
+    def add_object(self, name, x, y, width = 0, height = 0, properties = None):
+        self.objects.append((name, x, y, width, height, properties or {}))
+
+    # Write the map out as a .tmx file. If chunk_size isn't 0, save it as
+    # an infinite map in chunk_size x chunk_size chunks.
+    def write(self, filename, chunk_size = 0):
+
+        tileset_source = os.path.relpath(TILESET_FILE, os.path.dirname(os.path.abspath(filename)) or ".")
+        tileset_source = tileset_source.replace("\\", "/")
+
+        root = ElementTree.Element("map", {
+            "version": "1.5", "tiledversion": "2021.02.15",
+            "orientation": "orthogonal", "renderorder": "right-down",
+            "width": str(self.width), "height": str(self.height),
+            "tilewidth": str(TILESIZE), "tileheight": str(TILESIZE),
+            "infinite": "1" if chunk_size else "0", "nextlayerid": "5", "nextobjectid": str(len(self.objects) + 1)})
+        ElementTree.SubElement(root, "tileset", {"firstgid": "1", "source": tileset_source})
+
+        # Same layer order (and ids) as the hand-made maps, so BLOCK_LAYER still works.
+        self.write_layer(root, 3, "Background", self.background, chunk_size, SKY_TILE)
+        self.write_layer(root, 2, "Background Blocks", self.background_blocks, chunk_size, EMPTY_TILE)
+        self.write_layer(root, 1, "Blocks", self.blocks, chunk_size, EMPTY_TILE)
+
+        group = ElementTree.SubElement(root, "objectgroup", {"id": "4", "name": "Object Layer 1"})
+        for object_id, (name, x, y, width, height, properties) in enumerate(self.objects, 1):
+            attributes = {"id": str(object_id), "name": name, "x": str(x), "y": str(y)}
+            if width: attributes["width"] = str(width)
+            if height: attributes["height"] = str(height)
+            map_object = ElementTree.SubElement(group, "object", attributes)
+            if properties:
+                property_list = ElementTree.SubElement(map_object, "properties")
+                for key in properties:
+                    ElementTree.SubElement(property_list, "property", {"name": key, "value": properties[key]})
+
+        ElementTree.indent(root, " ")
+        ElementTree.ElementTree(root).write(filename, encoding = "UTF-8", xml_declaration = True)
+
+    # Chunks that hang off the right or bottom of the map get filled
+    # with padding.
+    def write_layer(self, root, layer_id, name, gids, chunk_size = 0, padding = 0):
+
+        layer = ElementTree.SubElement(root, "layer", {"id": str(layer_id), "name": name,
+                                                        "width": str(self.width), "height": str(self.height)})
+        data = ElementTree.SubElement(layer, "data", {"encoding": "csv"})
+        if chunk_size == 0:
+            data.text = self.csv_rows(gids, 0, 0, self.width, self.height, padding)
+            return
+        for chunk_y in range(0, self.height, chunk_size):
+            for chunk_x in range(0, self.width, chunk_size):
+                chunk = ElementTree.SubElement(data, "chunk", {"x": str(chunk_x), "y": str(chunk_y),
+                                                               "width": str(chunk_size), "height": str(chunk_size)})
+                chunk.text = self.csv_rows(gids, chunk_x, chunk_y, chunk_size, chunk_size, padding)
+
+    # Part of a layer as CSV. Tiled writes one row per line, with a comma
+    # after every row but the last.
+    def csv_rows(self, gids, left, top, width, height, padding):
+        rows = []
+        for y in range(top, top + height):
+            row = []
+            for x in range(left, left + width):
+                if x < self.width and y < self.height: row.append(gids[y * self.width + x])
+                else: row.append(padding)
+            rows.append(",".join(str(gid) for gid in row))
+        return "\n" + ",\n".join(rows) + "\n"
+
+# ============================================
+# ==             GENERATING                 ==
+# ============================================
+
+# Make one map.
+#   density     - 0 to 1, how much stuff (blocks, platforms, pits) there is
+#   enemies     - how many enemy_spawn objects
+#   left_exit   - map the exit on the left edge goes to, or None
+#   right_exit  - map the exit on the right edge goes to, or None
+#   entrances   - list of (dir, tile x) for the entrance objects. A minus
+#                 tile x counts back from the right edge. None means a
+#                 RIGHT entrance at 2 and a LEFT one at width - 3.
+#   exits       - list of (dir, dest map, tile x) for more exits. LEFT
+#                 and RIGHT ones go on the edges, so their tile x is
+#                 ignored. For UP and DOWN, None means the middle column.
+def generate_map(width, height, seed, density = 0.3, enemies = 20, left_exit = None, right_exit = None,
+                 entrances = None, exits = None):
+
+    rng = random.Random(seed)
+    level = Generated_Map(width, height)
+
+    if entrances is None:
+        entrances = [("RIGHT", 2), ("LEFT", -3)]
+    exits = list(exits or [])
+    if left_exit is not None: exits.append(("LEFT", left_exit, None))
+    if right_exit is not None: exits.append(("RIGHT", right_exit, None))
+    # Work out which column each UP and DOWN exit goes over.
+    exits = [(direction, dest, column_for(width, tile_x)) for direction, dest, tile_x in exits]
+
+    # DOWN exits need a pit to fall down.
+    pit_columns = set()
+    for direction, dest, tile_x in exits:
+        if direction == "DOWN":
+            pit_columns.update(range(tile_x - DOWN_EXIT_PIT // 2, tile_x - DOWN_EXIT_PIT // 2 + DOWN_EXIT_PIT))
+
+    # The ground wanders up and down a tile at a time. Keep it in the
+    # bottom part of the map so there's room to jump.
+    lowest = height - 2
+    highest = max(height // 2, height - 12)
+    ground = (lowest + highest) // 2
+    edge_ground = ground
+    pit_left = 0
+
+    for x in range(0, width):
+        at_edge = x < EDGE_COLUMNS or x >= width - EDGE_COLUMNS
+        if x in pit_columns:
+            continue
+        elif at_edge:
+            ground = edge_ground
+        elif pit_left > 0:
+            pit_left -= 1
+            continue
+        elif rng.random() < density * 0.05:
+            # A pit, two to four tiles wide.
+            pit_left = rng.randint(1, 3)
+            continue
+        elif rng.random() < 0.3:
+            ground = min(lowest, max(highest, ground + rng.choice([-1, 1])))
+        level.ground_tops[x] = ground
+        for y in range(ground, height):
+            level.set_block(x, y, GROUND_FILL)
+
+    # Put a grassy top on the ground, with corners where it steps down.
+    for x in range(0, width):
+        top = level.ground_tops[x]
+        if top is None: continue
+        left = level.ground_tops[x-1] if x > 0 else top
+        right = level.ground_tops[x+1] if x < width - 1 else top
+        if left is None or left > top: level.set_block(x, top, GROUND_TOP_LEFT)
+        elif right is None or right > top: level.set_block(x, top, GROUND_TOP_RIGHT)
+        else: level.set_block(x, top, GROUND_TOP)
+
+    # Floating blocks and platforms above the ground.
+    x = EDGE_COLUMNS
+    while x < width - EDGE_COLUMNS - 3:
+        if rng.random() < density * 0.3:
+            top = level.ground_tops[x]
+            if top is None: top = lowest
+            y = top - rng.randint(4, 6)
+            length = rng.randint(2, 5)
+            if rng.random() < 0.5:
+                for i in range(0, length): level.set_block(x + i, y, BLOCK_TILE)
+            else:
+                level.set_block(x, y, PLATFORM_TILES[0])
+                for i in range(1, length - 1): level.set_block(x + i, y, PLATFORM_TILES[1])
+                level.set_block(x + length - 1, y, PLATFORM_TILES[2])
+            x += length + 1
+        else:
+            x += 1
+
+    # Enemies stand on the ground, away from the edges.
+    standing_columns = [x for x in range(EDGE_COLUMNS, width - EDGE_COLUMNS) if level.ground_tops[x] is not None]
+    for i in range(0, enemies):
+        if not standing_columns: break
+        x = rng.choice(standing_columns)
+        level.add_object("enemy_spawn", x * TILESIZE, (level.ground_tops[x] - 1) * TILESIZE)
+
+    # The player starts near the left edge. Entrances are where the player
+    # lands when coming from another map: walking off a RIGHT exit puts
+    # you at the RIGHT entrance, which is on the left side of the new map.
+    stand_y = (edge_ground - 1) * TILESIZE
+    level.add_object("player_spawn", 2 * TILESIZE, stand_y)
+    for direction, tile_x in entrances:
+        tile_x = column_for(width, tile_x)
+        if direction == "DOWN":
+            # Coming down from the map above, so drop in from the top.
+            y = TILESIZE
+        elif level.ground_tops[tile_x] is None:
+            y = stand_y
+        else:
+            y = (level.ground_tops[tile_x] - 1) * TILESIZE
+        level.add_object("entrance", tile_x * TILESIZE, y, properties = {"dir": direction})
+
+    # Exits hang off the edge of the map a little, like the hand-made ones.
+    for direction, dest, tile_x in exits:
+        properties = {"dest": dest, "dir": direction}
+        if direction == "LEFT":
+            level.add_object("exit", -12, stand_y - TILESIZE, 20, 2 * TILESIZE, properties)
+        elif direction == "RIGHT":
+            level.add_object("exit", width * TILESIZE - 8, stand_y - TILESIZE, 20, 2 * TILESIZE, properties)
+        elif direction == "UP":
+            level.add_object("exit", (tile_x - 1) * TILESIZE, -20, 3 * TILESIZE, 20, properties)
+        else:
+            level.add_object("exit", (tile_x - DOWN_EXIT_PIT // 2) * TILESIZE, height * TILESIZE - 8,
+                             DOWN_EXIT_PIT * TILESIZE, 20, properties)
+
+    return level
+
+# Which tile column to use for an entrance or exit. A minus column counts
+# back from the right edge, and None means the middle.
+def column_for(width, tile_x):
+    if tile_x is None: tile_x = width // 2
+    elif tile_x < 0: tile_x += width
+    return min(width - 1, max(0, tile_x))
+
+# Read "DIR:X" (for --entrance) or "DIR:MAP" / "DIR:MAP:X" (for --exit)
+# from the command line.
+def parse_place(text, with_dest):
+    parts = text.split(":")
+    direction = parts[0].upper()
+    if direction not in DIRECTION_NAMES:
+        raise argparse.ArgumentTypeError("the direction has to be one of " + ", ".join(DIRECTION_NAMES))
+    try:
+        if with_dest:
+            if len(parts) not in (2, 3) or parts[1] == "": raise ValueError
+            return (direction, parts[1], int(parts[2]) if len(parts) == 3 else None)
+        if len(parts) != 2: raise ValueError
+        return (direction, int(parts[1]))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected " + ("DIR:MAP or DIR:MAP:X" if with_dest else "DIR:X") +
+                                         ", not " + text)
+
+# Make a row of maps, each one's right exit leading to the next one's
+# left side. Returns the filenames.
+# entrances and exits are the same as for generate_map(), and go on every map.
+def generate_world(name, maps, width, height, seed, density = 0.3, enemies = 20, folder = ".", chunk_size = 0,
+                   entrances = None, exits = None):
+
+    filenames = [name + str(i) + ".tmx" for i in range(1, maps + 1)]
+    for i in range(0, maps):
+        left_exit = filenames[i-1] if i > 0 else None
+        right_exit = filenames[i+1] if i < maps - 1 else None
+        level = generate_map(width, height, seed * 1000 + i, density, enemies, left_exit, right_exit,
+                             entrances, exits)
+        level.write(os.path.join(folder, filenames[i]), chunk_size)
+
+    # The same maps in a row, for world mode.
+    layout = {"type": "world", "maps": []}
+    for i in range(0, maps):
+        layout["maps"].append({"fileName": filenames[i], "x": i * width * TILESIZE, "y": 0,
+                               "width": width * TILESIZE, "height": height * TILESIZE})
+    with open(os.path.join(folder, name + ".world"), "w") as world_file:
+        json.dump(layout, world_file, indent = 4)
+    return filenames + [name + ".world"]
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Make big test levels.")
+    parser.add_argument("--width", type = int, default = 500, help = "map width in tiles")
+    parser.add_argument("--height", type = int, default = 30, help = "map height in tiles")
+    parser.add_argument("--density", type = float, default = 0.3, help = "0 to 1, how much terrain")
+    parser.add_argument("--enemies", type = int, default = 50, help = "enemy_spawn objects per map")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--world", type = int, default = 0, help = "make this many linked maps")
+    parser.add_argument("--name", default = "Stresslevel", help = "filename (without .tmx) for the map(s)")
+    parser.add_argument("--chunk-size", type = int, default = 0, help = "save infinite maps in chunks this many tiles across")
+    parser.add_argument("--entrance", action = "append", type = lambda text: parse_place(text, False),
+                        metavar = "DIR:X", help = "add an entrance (can be used more than once; "
+                                                  "default RIGHT:2 and LEFT:-3)")
+    parser.add_argument("--exit", action = "append", type = lambda text: parse_place(text, True),
+                        metavar = "DIR:MAP[:X]", help = "add an exit to another map (can be used more than once)")
+    args = parser.parse_args()
+
+    if args.height < 8:
+        print("Maps need to be at least 8 tiles high")
+        sys.exit(1)
+
+    if args.world > 0:
+        filenames = generate_world(args.name, args.world, args.width, args.height, args.seed,
+                                   args.density, args.enemies, chunk_size = args.chunk_size,
+                                   entrances = args.entrance, exits = args.exit)
+    else:
+        level = generate_map(args.width, args.height, args.seed, args.density, args.enemies,
+                             entrances = args.entrance, exits = args.exit)
+        level.write(args.name + ".tmx", args.chunk_size)
+        filenames = [args.name + ".tmx"]
+    for filename in filenames:
+        print("Wrote " + filename)
@@ -0,0 +1,367 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+import os
+import math
+#levels.json (from level_compiler.py) is JSON
+import json
+#Lets us remember a grid for each map without keeping old maps alive
+import weakref
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Tells us if a map came from the asset archive
+import assets
+
+# ============================================
+# ==             MAP QUERIES                ==
+# ============================================
+# get_tile_properties() answers one question about one
+# point: "what's the tile here?" To find out if there's
+# a wall between two places, or if a box is about to hit
+# the floor, you have to ask it over and over.
+#
+# Instead, the first time a map is asked about, we make
+# a "solidity grid": one number per tile in the Blocks
+# layer (BLOCK_LAYER), saying if that tile is SOLID or a
+# PLATFORM (you can jump up through it, but land on it).
+# Then we can answer bigger questions all at once:
+#
+#   raycast()        - go in a straight line from one point
+#                      towards another. What's the first
+#                      tile we hit?
+#   sweep_rect()     - slide a rectangle along. Where does
+#                      it first bump into something?
+#   solid_in_rect()  - is anything solid inside this
+#                      rectangle? Stops at the first one.
+#   solid_at()       - the same question as
+#                      get_tile_properties(), about one point.
+#
+# The grid agrees with get_tile_properties(): anything off
+# the edge of the map counts as solid, and so does a tile
+# with no properties at all.
+#
+# If level_compiler.py has been run, and the map hasn't
+# changed since, the grid is read from the .grid file it
+# wrote instead of being worked out again.
+#
+# All positions and distances are in pixels, like the rest
+# of the game.
+
+# What a tile can be. A tile can be both, so they're bits.
+SOLID = 1
+PLATFORM = 2
+
+# What raycast() and sweep_rect() hand back when they hit something.
+class Query_Hit(object):
+
+    __slots__ = ("tile", "normal", "distance", "point", "fraction")
+
+    def __init__(self, tile, normal, distance, point, fraction):
+        # (x, y) of the tile that was hit, in tiles
+        self.tile = tile
+        # Which way the side we hit faces, like (0, -1) for the top of a
+        # tile. (0, 0) means we started inside it.
+        self.normal = normal
+        # How far we got before hitting it, in pixels
+        self.distance = distance
+        # Where we were when we hit it: the point for raycast(), the
+        # rectangle's top left corner for sweep_rect()
+        self.point = point
+        # How far along the move we got: 0 is the start, 1 is the end
+        self.fraction = fraction
+
+    def __repr__(self):
+        return ("Query_Hit(tile=" + str(self.tile) + ", normal=" + str(self.normal) +
+                ", distance=" + str(round(self.distance, 2)) + ")")
+
+# Turn a tile's properties from the map into SOLID and PLATFORM flags.
+def flags_from_properties(properties):
+    flags = 0
+    if properties is None or properties.get("solid", False) == True:
+        flags |= SOLID
+    if properties is not None and properties.get("platform", False) == True:
+        flags |= PLATFORM
+    return flags
+
+class Solidity_Grid(object):
+
+    # flags are the bytes from a compiled .grid file, if there is one.
+    def __init__(self, tmxdata, flags = None):
+
+        self.width = tmxdata.width
+        self.height = tmxdata.height
+        # Goes up by one every time a tile changes, so anything that keeps
+        # its own copy of the grid knows to make a new one.
+        self.version = 0
+        # One byte per tile, row by row.
+        if flags is not None:
+            self.flags = bytearray(flags)
+            return
+        self.flags = bytearray(self.width * self.height)
+        # Lots of tiles are the same kind of tile (the same "gid"), so only
+        # work out the flags once for each kind.
+        gid_flags = {}
+        layer = tmxdata.layers[BLOCK_LAYER]
+        for tile_y, row in enumerate(layer.data):
+            for tile_x, gid in enumerate(row):
+                flags = gid_flags.get(gid)
+                if flags is None:
+                    flags = flags_from_properties(tmxdata.tile_properties.get(gid))
+                    gid_flags[gid] = flags
+                self.flags[tile_y * self.width + tile_x] = flags
+
+    # Work out one tile's flags from the map again (after it changes).
+    def update_tile(self, tmxdata, tile_x, tile_y):
+
+        try:
+            properties = tmxdata.get_tile_properties(tile_x, tile_y, BLOCK_LAYER)
+        except Exception:
+            properties = None
+        self.flags[tile_y * self.width + tile_x] = flags_from_properties(properties)
+        self.version += 1
+
+    # The flags of the tile at (tile_x, tile_y). Off the map is solid.
+    def tile_flags(self, tile_x, tile_y):
+        if 0 <= tile_x < self.width and 0 <= tile_y < self.height:
+            return self.flags[tile_y * self.width + tile_x]
+        return SOLID
+
+    # Is the tile under this point (in pixels) solid?
+    def solid_at(self, x, y, mask = SOLID):
+        counters.add("map queries")
+        return self.tile_flags(math.floor(x / TILESIZE), math.floor(y / TILESIZE)) & mask != 0
+
+    # ---------------------------------
+    # Area
+    # ---------------------------------
+
+    # The first tile inside rect (in pixels) that matches mask, as
+    # (tile x, tile y), or None if there isn't one. Like pygame,
+    # the right and bottom edges of the rect aren't inside it.
+    def solid_in_rect(self, rect, mask = SOLID):
+
+        counters.add("map queries")
+        rect = Rect(rect)
+        if rect.width <= 0 or rect.height <= 0: return None
+        left = rect.left // TILESIZE
+        right = (rect.right - 1) // TILESIZE
+        top = rect.top // TILESIZE
+        bottom = (rect.bottom - 1) // TILESIZE
+        for tile_y in range(top, bottom + 1):
+            for tile_x in range(left, right + 1):
+                if self.tile_flags(tile_x, tile_y) & mask:
+                    return (tile_x, tile_y)
+        return None
+
+    # ---------------------------------
+    # Raycast
+    # ---------------------------------
+    # Walks from tile to tile along the line, always stepping to
+    # whichever tile edge the line reaches next (this is called
+    # "DDA"). It only ever looks at the tiles the line goes
+    # through, so even a long ray is quick.
+
+    # Go from (x1, y1) towards (x2, y2). Returns a Query_Hit for the
+    # first tile that matches mask, or None if the line gets to the
+    # end without hitting anything.
+    def raycast(self, x1, y1, x2, y2, mask = SOLID):
+
+        counters.add("map queries")
+        dx = x2 - x1
+        dy = y2 - y1
+        length = math.hypot(dx, dy)
+
+        tile_x = math.floor(x1 / TILESIZE)
+        tile_y = math.floor(y1 / TILESIZE)
+        if self.tile_flags(tile_x, tile_y) & mask:
+            return Query_Hit((tile_x, tile_y), (0, 0), 0, (x1, y1), 0)
+        if length == 0: return None
+
+        # step: which way we move through the tiles.
+        # next: how far along the line (0 to 1) the next tile edge is.
+        # delta: how far along the line one whole tile is.
+        step_x, next_x, delta_x = self.dda_axis(x1, dx, tile_x)
+        step_y, next_y, delta_y = self.dda_axis(y1, dy, tile_y)
+
+        while True:
+            if next_x < next_y:
+                fraction = next_x
+                tile_x += step_x
+                next_x += delta_x
+                normal = (-step_x, 0)
+            else:
+                fraction = next_y
+                tile_y += step_y
+                next_y += delta_y
+                normal = (0, -step_y)
+            if fraction > 1: return None
+            if self.tile_flags(tile_x, tile_y) & mask:
+                return Query_Hit((tile_x, tile_y), normal, fraction * length,
+                                 (x1 + dx * fraction, y1 + dy * fraction), fraction)
+
+    def dda_axis(self, start, distance, tile):
+        if distance > 0:
+            return 1, ((tile + 1) * TILESIZE - start) / distance, TILESIZE / distance
+        if distance < 0:
+            return -1, (tile * TILESIZE - start) / distance, TILESIZE / -distance
+        return 0, math.inf, math.inf
+
+    # ---------------------------------
+    # Sweep
+    # ---------------------------------
+    # Slide a rectangle by (dx, dy) and find the first tile it would bump
+    # into. Tiles the rectangle is already touching at the start are
+    # ignored, so something that's stuck can still move out.
+    #
+    # Platforms (if mask has PLATFORM) only stop things moving down onto
+    # them from above, the same as in the game.
+    #
+    # Returns a Query_Hit, or None if the whole move is clear.
+    def sweep_rect(self, rect, dx, dy, mask = SOLID):
+
+        counters.add("map queries")
+        rect = Rect(rect)
+        if dx == 0 and dy == 0: return None
+
+        # Every tile the rectangle could touch on the way.
+        area = rect.union(rect.move(math.floor(dx), math.floor(dy)))
+        area.width += 1
+        area.height += 1
+        left = area.left // TILESIZE
+        right = (area.right - 1) // TILESIZE
+        top = area.top // TILESIZE
+        bottom = (area.bottom - 1) // TILESIZE
+
+        best = None
+        for tile_y in range(top, bottom + 1):
+            for tile_x in range(left, right + 1):
+                flags = self.tile_flags(tile_x, tile_y) & mask
+                if flags == 0: continue
+                tile_rect = Rect(tile_x * TILESIZE, tile_y * TILESIZE, TILESIZE, TILESIZE)
+                if tile_rect.colliderect(rect): continue
+                hit = self.sweep_tile(rect, dx, dy, tile_rect)
+                if hit is None: continue
+                fraction, normal = hit
+                # Platforms only catch things landing on top of them.
+                if flags & SOLID == 0 and normal != (0, -1): continue
+                if best is None or fraction < best[0]:
+                    best = (fraction, normal, (tile_x, tile_y))
+
+        if best is None: return None
+        fraction, normal, tile = best
+        return Query_Hit(tile, normal, fraction * math.hypot(dx, dy),
+                         (rect.x + dx * fraction, rect.y + dy * fraction), fraction)
+
+    # When (0 to 1) a rectangle moving by (dx, dy) first touches tile_rect,
+    # and which side it hits. None if it never does.
+    def sweep_tile(self, rect, dx, dy, tile_rect):
+
+        entry_x, exit_x = self.sweep_axis(rect.left, rect.right, dx, tile_rect.left, tile_rect.right)
+        entry_y, exit_y = self.sweep_axis(rect.top, rect.bottom, dy, tile_rect.top, tile_rect.bottom)
+        entry = max(entry_x, entry_y)
+        # Only touching for an instant (like sliding past a corner) isn't a hit.
+        if entry >= min(exit_x, exit_y) or entry > 1 or entry < 0:
+            return None
+        if entry_x > entry_y:
+            return entry, (-1 if dx > 0 else 1, 0)
+        return entry, (0, -1 if dy > 0 else 1)
+
+    # When the moving edges start and stop overlapping along one axis.
+    def sweep_axis(self, low, high, distance, tile_low, tile_high):
+        if distance > 0:
+            return (tile_low - high) / distance, (tile_high - low) / distance
+        if distance < 0:
+            return (tile_high - low) / distance, (tile_low - high) / distance
+        # Not moving this way: either always overlapping or never.
+        if high > tile_low and low < tile_high:
+            return -math.inf, math.inf
+        return math.inf, -math.inf
+
+# ---------------------------------
+# Shortcuts
+# ---------------------------------
+# The grid for each map gets made the first time someone asks about
+# that map, and forgotten when the map is. Something that isn't really
+# a map (like a World in world.py) can bring its own grid instead, as
+# tmxdata.solidity_grid.
+
+grids = weakref.WeakKeyDictionary()
+
+def get_grid(tmxdata):
+    grid = getattr(tmxdata, "solidity_grid", None)
+    if grid is not None: return grid
+    grid = grids.get(tmxdata)
+    if grid is None:
+        grid = make_grid(tmxdata)
+        grids[tmxdata] = grid
+    return grid
+
+# A new solidity grid for a map: from its compiled .grid file if that's
+# up to date, and from the map's tiles if it isn't.
+def make_grid(tmxdata):
+    return Solidity_Grid(tmxdata, compiled_flags(tmxdata))
+
+# The flags level_compiler.py saved for this map, or None if there aren't
+# any we can trust. They're only used if levels.json says the map
+# compiled without errors, none of the files it was made from have
+# changed since, and the .grid is the right size for the map.
+def compiled_flags(tmxdata):
+
+    if COMPILED_GRIDS == False: return None
+    map_name = getattr(tmxdata, "filename", None)
+    if map_name is None or assets.in_archive(map_name): return None
+    try:
+        with open(os.path.join(COMPILED_LEVELS_DIR, "levels.json")) as graph_file:
+            summary = json.load(graph_file)["maps"].get(os.path.normpath(map_name))
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
+    if summary is None or summary.get("errors"): return None
+    if summary.get("width") != tmxdata.width or summary.get("height") != tmxdata.height: return None
+
+    mtimes = summary.get("mtimes", {})
+    if len(mtimes) != len(set(summary.get("files", []))): return None
+    for filename, mtime in mtimes.items():
+        try:
+            if os.path.getmtime(filename) != mtime: return None
+        except OSError:
+            return None
+
+    base_name = os.path.splitext(os.path.basename(map_name))[0]
+    try:
+        with open(os.path.join(COMPILED_LEVELS_DIR, base_name + ".grid"), "rb") as grid_file:
+            flags = grid_file.read()
+    except OSError:
+        return None
+    if len(flags) != tmxdata.width * tmxdata.height: return None
+    counters.add("compiled grids loaded")
+    return flags
+
+def raycast(tmxdata, x1, y1, x2, y2, mask = SOLID):
+    return get_grid(tmxdata).raycast(x1, y1, x2, y2, mask)
+
+def sweep_rect(tmxdata, rect, dx, dy, mask = SOLID):
+    return get_grid(tmxdata).sweep_rect(rect, dx, dy, mask)
+
+def solid_in_rect(tmxdata, rect, mask = SOLID):
+    return get_grid(tmxdata).solid_in_rect(rect, mask)
+
+def solid_at(tmxdata, x, y, mask = SOLID):
+    return get_grid(tmxdata).solid_at(x, y, mask)
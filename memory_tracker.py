@@ -0,0 +1,184 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+
+#tracemalloc keeps track of every bit of memory Python hands out
+import tracemalloc
+#gc is the garbage collector, which frees things nothing is using anymore
+import gc
+import time
+#json is how the report gets saved
+import json
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Knows how much memory each kind of surface is using
+import surfaces
+
+# ============================================
+# ==           MEMORY TRACKER               ==
+# ============================================
+# Every time we go to a new map, the game makes a new
+# map_image, a new loaded_map_image, transition pictures,
+# a new tmxdata and a new set of sprites. The old ones
+# are supposed to be thrown away, but if anything is still
+# holding onto them, they never get freed, and a game left
+# running all day slowly uses more and more memory. That's
+# called a "leak".
+#
+# With MEMORY_TRACKING on, the game calls mark() whenever
+# something big happens (loading a map, going through a
+# transition, respawning). Each mark writes down:
+#   - how much memory Python is using (from tracemalloc)
+#   - how many bytes of pictures each kind of surface is
+#     using (from surfaces.py; pygame keeps the pixels
+#     outside Python, so tracemalloc can't see them)
+#   - which lines of code made the most new memory since
+#     the last mark
+#
+# Going A -> B -> A should leave memory about where it was
+# the last time we were on A. If it's grown by more than
+# MEMORY_GROWTH_WARNING bytes, that's probably a leak, so
+# we print a warning and put it in the report.
+#
+# Tracking memory makes everything slower, so leave it off
+# unless you're hunting for a leak.
+
+class Memory_Tracker(object):
+
+    def __init__(self):
+
+        # Remember a few calls back for each piece of memory, so the report
+        # shows where it came from.
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+        self.start_time = time.perf_counter()
+
+        # Every mark so far, oldest first.
+        self.marks = []
+        # The last tracemalloc snapshot, to compare the next one against.
+        self.last_snapshot = None
+        # map name -> the last mark made on that map
+        self.last_visit = {}
+        # Every time memory grew coming back to a map.
+        self.warnings = []
+
+    # Write down how much memory is being used right now.
+    #   event     - what just happened ("map load", "transition", "respawn")
+    #   map_name  - the map we're on now
+    #   detail    - anything else worth saying, like "Notlevel1.tmx -> Notlevel2.tmx"
+    def mark(self, event, map_name, detail = ""):
+
+        # Throw away everything that's really unused first, so we only see
+        # memory that something is still holding onto.
+        gc.collect()
+
+        snapshot = tracemalloc.take_snapshot()
+        # Don't count tracemalloc's own memory.
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        python_bytes, peak_bytes = tracemalloc.get_traced_memory()
+
+        surface_totals = surfaces.surface_bytes_by_category()
+        surface_bytes = sum(total[1] for total in surface_totals.values())
+
+        # Which lines made the most new memory since the last mark.
+        top_growth = []
+        if self.last_snapshot is not None:
+            for stat in snapshot.compare_to(self.last_snapshot, "lineno")[:MEMORY_TOP_LINES]:
+                if stat.size_diff <= 0: continue
+                frame = stat.traceback[0]
+                top_growth.append({"where": frame.filename + ":" + str(frame.lineno),
+                                   "bytes": stat.size_diff,
+                                   "count": stat.count_diff})
+        self.last_snapshot = snapshot
+
+        mark = {"number": len(self.marks),
+                "event": event,
+                "map": map_name,
+                "detail": detail,
+                "time": round(time.perf_counter() - self.start_time, 3),
+                "python_bytes": python_bytes,
+                "peak_python_bytes": peak_bytes,
+                "surface_bytes": surface_bytes,
+                "surfaces": surface_totals,
+                "top_growth": top_growth}
+        self.marks.append(mark)
+
+        # Have we been on this map before? Then we should be using about
+        # the same memory as last time.
+        if map_name in self.last_visit:
+            last = self.last_visit[map_name]
+            growth = (python_bytes + surface_bytes) - (last["python_bytes"] + last["surface_bytes"])
+            if growth > MEMORY_GROWTH_WARNING:
+                warning = {"map": map_name,
+                           "from_mark": last["number"],
+                           "to_mark": mark["number"],
+                           "growth_bytes": growth,
+                           "python_growth": python_bytes - last["python_bytes"],
+                           "surface_growth": surface_bytes - last["surface_bytes"]}
+                self.warnings.append(warning)
+                print("Memory grew by " + format_bytes(growth) + " since the last visit to " + map_name +
+                      " (Python " + format_bytes(warning["python_growth"]) +
+                      ", surfaces " + format_bytes(warning["surface_growth"]) + ")")
+        self.last_visit[map_name] = mark
+
+        return mark
+
+    def print_summary(self):
+
+        print("Memory tracking (" + str(len(self.marks)) + " marks):")
+        for mark in self.marks:
+            line = ("  " + str(mark["number"]).rjust(3) + "  " + mark["event"].ljust(11) +
+                    "python " + format_bytes(mark["python_bytes"]).rjust(10) +
+                    "  surfaces " + format_bytes(mark["surface_bytes"]).rjust(10) + "  " + mark["map"])
+            if mark["detail"]: line += "  (" + mark["detail"] + ")"
+            print(line)
+
+        # Where the surface memory is going right now.
+        if self.marks:
+            print("  Surfaces at the last mark:")
+            totals = self.marks[-1]["surfaces"]
+            for category in sorted(totals, key = lambda category: -totals[category][1]):
+                count, size = totals[category]
+                print("    " + category.ljust(15) + str(count).rjust(5) + " surfaces " + format_bytes(size).rjust(10))
+
+        if self.warnings:
+            print("  " + str(len(self.warnings)) + " possible leak(s):")
+            for warning in self.warnings:
+                print("    " + warning["map"] + ": grew " + format_bytes(warning["growth_bytes"]) +
+                      " between marks " + str(warning["from_mark"]) + " and " + str(warning["to_mark"]))
+        else:
+            print("  No growth found coming back to the same map.")
+
+    # Save everything to a file so runs can be compared later.
+    def export(self, filename = MEMORY_REPORT_FILE):
+
+        report = {"marks": self.marks,
+                  "warnings": self.warnings,
+                  "growth_warning_bytes": MEMORY_GROWTH_WARNING}
+        try:
+            with open(filename, "w") as report_file:
+                json.dump(report, report_file, indent = 1)
+        except OSError as error:
+            print("Unable to save memory report:", error)
+
+    def stop(self):
+        tracemalloc.stop()
+
+# Bytes, but easier to read: 1536 -> "1.5 KB"
+def format_bytes(size):
+    sign = "-" if size < 0 else ""
+    size = abs(size)
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024: return sign + str(round(size, 1)) + " " + unit
+        size /= 1024
+    return sign + str(round(size, 1)) + " GB"
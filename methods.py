@@ -18,16 +18,21 @@ from pygame.locals import *
 
 # Import math functions
 import math
+# sys lets us quit the program from inside a menu
+import sys
+# OrderedDict remembers the order things were added, which
+# makes it easy to throw away whatever was used longest ago.
+from collections import OrderedDict
 
-#Import functions that let us read and write
-#to .tmx files, which are what Tiled Map Editor
+#pytmx reads the .tmx files that Tiled Map Editor
 #creates. If you don't have pytmx, it can be
 #added from within Thonny under Tools->Manage Packages.
-import pytmx
-#Share one of pytmx's methods.Note that we're not using
-#the * function this time, so the only methods that
-#get imported are those we expressly name.
-from pytmx.util_pygame import load_pygame
+#We don't import it up here, though. The menus live in
+#this file too, and they get shown before any map is
+#needed, so the functions below import pytmx themselves
+#the first time they run. After that Python remembers it.
+#Maps get loaded through assets.py, which reads them out
+#of the packed asset archive when there is one.
 
 #This file contains CONSTANTS. Technically, Python does
 #not have a "constant" variable type. But, we just use
@@ -37,40 +42,77 @@ import constants
 #More bad practice importing all of constant
 from constants import *
 
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Handles the window and scaling the game's picture up to fit it
+import window
+#The sound bank, which loads and plays all the sound effects
+import audio
+#Reads files out of the packed asset archive, if there is one
+import assets
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+
 # ============================================
 # ==            GLOBAL METHODS              ==
 # ============================================
 
-#Play a sound
+#Play a sound effect by name. The names are listed in audio.py.
 #--------------------------------
 
-def play_sound(sound_to_play):
-    pygame.mixer.Sound.play(sound_to_play)
+def play_sound(sound_name):
+    counters.add("sound plays")
+    audio.get_sound_bank().play(sound_name)
     
 #Load a new Tiled Map. Returns the new map.
 #Also tells sprite handler to update sprite information
 #--------------------------------
+@tracing.traced("load new map", "load")
 def load_new_map(map_name, sprite_handler, entrance_direction):
 
+    tmxdata = preview_new_map(map_name)
+    
+    enter_map(tmxdata, sprite_handler, entrance_direction)
+
+    return tmxdata
+
+#Set up the sprite handler for a map that's already loaded:
+#clear out the old sprites, spawn the new ones and put the
+#player at the entrance.
+#--------------------------------
+@tracing.traced("enter map", "load")
+def enter_map(tmxdata, sprite_handler, entrance_direction):
+
     #Clear sprites
     sprite_handler.prepare_for_new_map()
+    #Streamed maps spawn enemies as the player gets near them, so
+    #they need to know the old ones are gone.
+    if(is_streamed_map(tmxdata)): tmxdata.forget_enemies()
 
-    #Map - This is loading the Tiled Map Editor map we used.
-    tmxdata = load_pygame(map_name, pixelalpha=True)
-    
     #Adjust sprites for new map
     sprite_handler.spawn_sprites_from_map(tmxdata)
     sprite_handler.player_enters_map(tmxdata, entrance_direction)
 
-    return tmxdata
-
 #Load a new Tiled Map. Returns the new map.
 # Does NOT tell the Sprite Handler to do anything.
 #--------------------------------
+@tracing.traced("preview new map", "load")
 def preview_new_map(map_name):
 
+    #Tiled's "infinite" maps get loaded a chunk at a time instead.
+    #See chunked_map.py.
+    import chunked_map
+    if chunked_map.is_infinite_map(map_name):
+        return chunked_map.Chunked_Map(map_name)
+
     #Map - This is loading the Tiled Map Editor map we used.
-    tmxdata = load_pygame(map_name, pixelalpha=True)
+    tmxdata = assets.load_tiled_map(map_name)
+
+    #Let the memory tracker know about the map's tile pictures.
+    for image in tmxdata.images:
+        if image is not None: surfaces.track(image, "map tiles")
     return tmxdata
 
 #Load a new map image based on currently loaded Tiled Map. Returns image.
@@ -78,13 +120,32 @@ def preview_new_map(map_name):
 def load_map_image(tmxdata):
     map_width = tmxdata.width * TILESIZE
     map_height = tmxdata.height * TILESIZE
-    map_image =  pygame.Surface((map_width, map_height))
+    map_image = surfaces.new_surface((map_width, map_height), category = "map")
     return map_image
 
+#Some maps are too big to turn into one picture (a World in world.py,
+#or a Chunked_Map in chunked_map.py). Instead they draw just what the
+#camera can see, with draw(view_rect).
+#--------------------------------
+def is_streamed_map(tmxdata):
+    return hasattr(tmxdata, "draw")
+
+#Draw what the camera can see of a map, scaled to fit the screen.
+#--------------------------------
+def draw_map_view(tmxdata, game_camera):
+    if is_streamed_map(tmxdata):
+        canvas = tmxdata.draw(game_camera.get_view_rect())
+        return game_camera.draw(canvas, canvas.get_rect())
+    map_image = load_map_image(tmxdata)
+    blit_all_tiles(map_image, tmxdata, (0,0))
+    return game_camera.draw(map_image)
+
 #Draw the Tiled Map to the Screen
 #--------------------------------
+@tracing.traced("blit all tiles", "render")
 def blit_all_tiles(window, tmxdata, screen_offset):
 
+    import pytmx
     for layer in tmxdata.visible_layers:
         # Game will crash if we try to blit the object layer, so make sure we're
         # not doing that. Make sure it's a Tile Layer instead.
@@ -96,11 +157,13 @@ def blit_all_tiles(window, tmxdata, screen_offset):
                 x_pixel = tile[0] * TILESIZE + screen_offset[0]
                 y_pixel = tile[1] * TILESIZE + screen_offset[1]
                 window.blit( tile[2], (x_pixel, y_pixel))
+                counters.add("blits")
             
 #Get Tile Properties
 #------------------------------
 def get_tile_properties(tmxdata, x_to_check, y_to_check):
     
+    counters.add("tile lookups")
     world_x = x_to_check;
     world_y = y_to_check;
     tile_x = world_x // TILESIZE
@@ -123,6 +186,16 @@ def get_tile_properties(tmxdata, x_to_check, y_to_check):
 #Screen Transition
 #-------------------------------
 
+# Convert the direction of a map exit to one of the globals. The map
+# data will be in STRING format.
+def direction_from_name(direction_name):
+    direction = 0
+    if(direction_name == "UP"): direction = UP
+    elif(direction_name == "DOWN"): direction = DOWN
+    elif(direction_name == "LEFT"): direction = LEFT
+    elif(direction_name == "RIGHT"): direction = RIGHT
+    return direction
+
 def get_landing_coords(tmxdata, direction):
      # Look for the screen entrance objects
         for tile_object in tmxdata.objects:
@@ -133,6 +206,7 @@ def get_landing_coords(tmxdata, direction):
         print("No entrance location found moving" + direction)
         return (0,0)
 
+@tracing.traced("create transition screen", "transition")
 def create_transition_screen(tmxdata1, #The first map, and the camera's loc 
                        tmxdata2, #The second map, and where the camera needs to go
                        new_camera_x, new_camera_y, # The coords on the new map where the camera should be
@@ -141,51 +215,44 @@ def create_transition_screen(tmxdata1, #The first map, and the camera's loc
                        keys): # b'c camera needs this to update
     
     # Save an image of the existing map.
-    old_map_image = load_map_image(tmxdata1)
-    blit_all_tiles(old_map_image, tmxdata1, (0,0))
     old_map_width = tmxdata1.width*TILESIZE 
     old_map_height = tmxdata1.height*TILESIZE
-    old_map_screen = pygame.Surface((SCREEN_W,SCREEN_H))
-    old_map_screen.blit(game_camera.draw(old_map_image),(0,0))
+    old_map_screen = surfaces.new_surface((SCREEN_W,SCREEN_H), category = "transition")
+    old_map_screen.blit(draw_map_view(tmxdata1, game_camera),(0,0))
     
     # Save an image of the new map at same zoom, focused on the new coordinates passed to this method.
-    new_map_image = load_map_image(tmxdata2)
-    blit_all_tiles(new_map_image, tmxdata2, (0,0))
     new_map_width = tmxdata2.width*TILESIZE 
     new_map_height = tmxdata2.height*TILESIZE
     game_camera.snap_to_coords(new_camera_x, new_camera_y)
     game_camera.update(new_map_width,new_map_height,keys)
-    new_map_screen = pygame.Surface((SCREEN_W,SCREEN_H))
-    new_map_screen.blit(game_camera.draw(new_map_image),(0,0))
+    new_map_screen = surfaces.new_surface((SCREEN_W,SCREEN_H), category = "transition")
+    new_map_screen.blit(draw_map_view(tmxdata2, game_camera),(0,0))
      
     # Create a composite image based on the direction
     
-    composite_screen = pygame.Surface((SCREEN_W,SCREEN_H))
+    # Make it twice as big as the screen in the direction we're scrolling.
+    if(direction_to_scroll == LEFT or direction_to_scroll == RIGHT):
+        composite_screen = surfaces.new_surface((SCREEN_W*2,SCREEN_H), category = "transition")
+    else:
+        composite_screen = surfaces.new_surface((SCREEN_W,SCREEN_H*2), category = "transition")
 
     if(direction_to_scroll == LEFT):
-        composite_screen = pygame.transform.smoothscale(composite_screen, (SCREEN_W*2,SCREEN_H))
-        print(composite_screen)
         composite_screen.blit(new_map_screen,(0,0))
         composite_screen.blit(old_map_screen,(SCREEN_W,0)) 
     elif(direction_to_scroll == RIGHT):
-        composite_screen = pygame.transform.smoothscale(composite_screen, (SCREEN_W*2,SCREEN_H))
-        print(composite_screen)
         composite_screen.blit(old_map_screen,(0,0))
         composite_screen.blit(new_map_screen,(SCREEN_W,0))  
     elif(direction_to_scroll == UP):
-        composite_screen = pygame.transform.smoothscale(composite_screen, (SCREEN_W,SCREEN_H*2))
-        print(composite_screen)
         composite_screen.blit(new_map_screen,(0,0))
         composite_screen.blit(old_map_screen,(0,SCREEN_H)) 
     elif(direction_to_scroll == DOWN):
-        composite_screen = pygame.transform.smoothscale(composite_screen, (SCREEN_W,SCREEN_H*2))
-        print(composite_screen)
         composite_screen.blit(old_map_screen,(0,0))
         composite_screen.blit(new_map_screen,(0,SCREEN_H))
         
     #return composite_screen
     return composite_screen
 
+@tracing.traced("scroll transition screen", "transition")
 def scroll_transition_screen(composite_image, direction_to_scroll, screen, clock):
 
     scroll_counter = 0
@@ -233,7 +300,7 @@ def scroll_transition_screen(composite_image, direction_to_scroll, screen, clock
         screen.blit(composite_image, (0,0), (image_position_x,image_position_y,SCREEN_W,SCREEN_H))
 
         #Update the screen
-        pygame.display.flip()
+        window.present()
         
         # Set the game to run at 60fps
         clock.tick(60)
@@ -241,110 +308,244 @@ def scroll_transition_screen(composite_image, direction_to_scroll, screen, clock
         scroll_counter = scroll_counter + 40
     
 
+#-------------------------------
+# Text Cache
+#-------------------------------
+# Rendering text with a font is surprisingly slow, and most of the
+# text in the game (menu titles, button labels) never changes. So we
+# render each piece of text once, keep the picture, and hand the same
+# picture back next time someone asks for it.
+
+class Text_Cache(object):
+
+    def __init__(self, max_entries = 256):
+
+        # Saved text pictures, oldest used first.
+        self.surfaces = OrderedDict()
+        # Saved pictures of single characters, used to build counters.
+        self.glyphs = {}
+        # Don't let the cache grow forever if something keeps asking
+        # for new text (like a timer).
+        self.max_entries = max_entries
+
+    # Get a picture of some text. Works just like font.render().
+    def render(self, font, text, color, antialias = True):
+
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = surfaces.to_display_format(font.render(text, antialias, color), alpha = True, category = "text")
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last = False)
+        else:
+            # Mark this as recently used so it isn't thrown away.
+            self.surfaces.move_to_end(key)
+        return surface
+
+    # Get a picture of a counter, like a score, coins, or a timer.
+    # These change all the time, so instead of rendering every possible
+    # number we render each digit once and stick the digits together.
+    def render_counter(self, font, text, color, antialias = True):
+
+        key = ("counter", font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        pictures = []
+        for character in text:
+            glyph_key = (font, character, tuple(color), antialias)
+            glyph = self.glyphs.get(glyph_key)
+            if glyph is None:
+                glyph = surfaces.to_display_format(font.render(character, antialias, color), alpha = True, category = "text")
+                self.glyphs[glyph_key] = glyph
+            pictures.append(glyph)
+
+        width = sum(glyph.get_width() for glyph in pictures)
+        height = font.get_height()
+        surface = surfaces.new_surface((width, height), alpha = True, category = "text")
+        x = 0
+        for glyph in pictures:
+            surface.blit(glyph, (x, 0))
+            x += glyph.get_width()
+
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last = False)
+        return surface
+
+# One shared cache for the whole game.
+text_cache = Text_Cache()
+
 #-------------------------------
 # Menus
 #-------------------------------
 
-def main_menu(screen, clock, myfont):
-    
-    menu_running = True
-    
-    while menu_running:
-        
-        screen.fill((0,0,0)) # Fill screen with black
-        
-        # Draw title of menu to screen
-        textsurface = myfont.render('NOT MARIO', True, (255,255,255))
-        screen.blit(textsurface,(SCREEN_W/3,SCREEN_H/9))
-        
-        textsurface = myfont.render('A Game To Play', True, (255,255,255))
-        screen.blit(textsurface,(SCREEN_W/3.2,SCREEN_H/6))
-        
-        mx, my = pygame.mouse.get_pos()
-        
-        button_1 = pygame.Rect(SCREEN_W/3,SCREEN_H/3,200,50)           
-        button_2 = pygame.Rect(SCREEN_W/3,SCREEN_H/2,200,50)
-                  
-        if button_1.collidepoint((mx,my)):
-            if click:
-                menu_running = False
-        if button_2.collidepoint((mx,my)):
-            if click:
-                menu_running = False
-                
-        pygame.draw.rect(screen, (255,0,0), button_1)
-        textsurface = myfont.render('Begin', True, (255,255,255))
-        screen.blit(textsurface,(SCREEN_W/3+20,SCREEN_H/3))
-        
-        pygame.draw.rect(screen, (255,0,0), button_2)
-        textsurface = myfont.render('Nope', True, (255,255,255))
-        screen.blit(textsurface,(SCREEN_W/3+20,SCREEN_H/2))
-        
-        click = False
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == KEYDOWN:
-                if event.key == K_ESCAPE:
+# Menus are just a title, a subtitle and a couple of buttons. Nothing
+# about them changes unless the mouse moves over a button or clicks it,
+# so everything gets drawn once and saved. The menu only redraws when a
+# button changes how it looks, and it sleeps while waiting for input
+# instead of redrawing the same picture 60 times a second.
+
+class Menu(object):
+
+    def __init__(self, title, subtitle, button_labels):
+
+        self.title = title
+        self.subtitle = subtitle
+        self.button_labels = button_labels
+
+        # The ways a button can look.
+        self.NORMAL = 0
+        self.HOVERED = 1
+        self.PRESSED = 2
+        self.BUTTON_COLORS = {self.NORMAL:(255,0,0), self.HOVERED:(255,90,90), self.PRESSED:(170,0,0)}
+
+        # Buttons never move, so we only need to make their rects once.
+        button_tops = [SCREEN_H/3, SCREEN_H/2]
+        self.buttons = []
+        for i in range(0,len(button_labels)):
+            self.buttons.append(pygame.Rect(SCREEN_W/3,button_tops[i],200,50))
+
+        # Saved pictures. The background is everything except the buttons.
+        self.background = None
+        self.button_images = {}
+
+    # Get the picture of a button in one of its states, making it if needed.
+    def get_button_image(self, myfont, index, state):
+
+        key = (index, state)
+        if key not in self.button_images:
+            button_image = surfaces.new_surface(self.buttons[index].size, category = "menu")
+            button_image.fill(self.BUTTON_COLORS[state])
+            textsurface = text_cache.render(myfont, self.button_labels[index], (255,255,255))
+            button_image.blit(textsurface,(20,0))
+            self.button_images[key] = button_image
+        return self.button_images[key]
+
+    # Work out how each button should look based on the mouse.
+    def get_button_states(self, mouse_pos, mouse_pressed):
+
+        states = []
+        for button in self.buttons:
+            if button.collidepoint(mouse_pos):
+                if mouse_pressed: states.append(self.PRESSED)
+                else: states.append(self.HOVERED)
+            else:
+                states.append(self.NORMAL)
+        return states
+
+    def draw(self, screen, myfont, button_states):
+
+        if self.background is None:
+            self.background = surfaces.new_surface((SCREEN_W,SCREEN_H), category = "menu")
+            self.background.fill((0,0,0)) # Fill screen with black
+
+            # Draw title of menu to screen
+            textsurface = text_cache.render(myfont, self.title, (255,255,255))
+            self.background.blit(textsurface,(SCREEN_W/3,SCREEN_H/9))
+
+            textsurface = text_cache.render(myfont, self.subtitle, (255,255,255))
+            self.background.blit(textsurface,(SCREEN_W/3.2,SCREEN_H/6))
+
+        screen.blit(self.background,(0,0))
+        for i in range(0,len(self.buttons)):
+            screen.blit(self.get_button_image(myfont, i, button_states[i]), self.buttons[i])
+
+    # Show the menu until a button is clicked. Returns which button it was.
+    # first_frame_done gets called once the menu is on the screen.
+    def run(self, screen, clock, myfont, first_frame_done = None):
+
+        last_button_states = None
+
+        while True:
+
+            # Only redraw if a button needs to look different.
+            mx, my = window.get_mouse_pos()
+            button_states = self.get_button_states((mx,my), pygame.mouse.get_pressed()[0])
+            if button_states != last_button_states:
+                self.draw(screen, myfont, button_states)
+                window.present()
+                if last_button_states is None and first_frame_done is not None:
+                    first_frame_done()
+                    first_frame_done = None
+                last_button_states = button_states
+            clock.tick(60)
+
+            # Sleep until something happens (or half a second goes by).
+            events = [pygame.event.wait(500)] + pygame.event.get()
+
+            click = False
+            for event in events:
+                if window.handle_event(event):
+                    # The window got cleared, so draw everything again.
+                    last_button_states = None
+                if event.type == QUIT:
                     pygame.quit()
                     sys.exit()
-            if event.type == MOUSEBUTTONDOWN:
-                if event.button == 1:
-                    click = True
-                
-        pygame.display.update()
-        clock.tick(60)
-        
-def game_over_menu(screen, clock, myfont):
-    
-    menu_running = True
-    sound_game_over = pygame.mixer.Sound("game_over_yah.wav")
-    play_sound(sound_game_over)
-    
-    while menu_running:
-        
-        screen.fill((0,0,0)) # Fill screen with black
-        
-        # Draw title of menu to screen
-        textsurface = myfont.render('WHAT DID YOU DO', True, (255,255,255))
-        screen.blit(textsurface,(SCREEN_W/3,SCREEN_H/9))
-        
-        textsurface = myfont.render('P.S. Lost the Game', True, (255,255,255))
-        screen.blit(textsurface,(SCREEN_W/3.2,SCREEN_H/6))
-        
-        mx, my = pygame.mouse.get_pos()
-        
-        button_1 = pygame.Rect(SCREEN_W/3,SCREEN_H/3,200,50)           
-        button_2 = pygame.Rect(SCREEN_W/3,SCREEN_H/2,200,50)
-                  
-        if button_1.collidepoint((mx,my)):
-            if click:
-                menu_running = False
-        if button_2.collidepoint((mx,my)):
+                if event.type == KEYDOWN:
+                    if event.key == K_ESCAPE:
+                        pygame.quit()
+                        sys.exit()
+                if event.type == MOUSEBUTTONDOWN:
+                    if event.button == 1:
+                        click = True
+
             if click:
-                menu_running = False
-                
-        pygame.draw.rect(screen, (255,0,0), button_1)
-        textsurface = myfont.render('Try Again', True, (255,255,255))
-        screen.blit(textsurface,(SCREEN_W/3+20,SCREEN_H/3))
-        
-        pygame.draw.rect(screen, (255,0,0), button_2)
-        textsurface = myfont.render('End It', True, (255,255,255))
-        screen.blit(textsurface,(SCREEN_W/3+20,SCREEN_H/2))
-        
-        click = False
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == KEYDOWN:
-                if event.key == K_ESCAPE:
-                    pygame.quit()
-                    sys.exit()
-            if event.type == MOUSEBUTTONDOWN:
-                if event.button == 1:
-                    click = True
-                
-        pygame.display.update()
-        clock.tick(60)
\ No newline at end of file
+                mx, my = window.get_mouse_pos()
+                for i in range(0,len(self.buttons)):
+                    if self.buttons[i].collidepoint((mx,my)):
+                        return i
+
+# Menus get made the first time they're needed and then reused,
+# so their saved pictures stick around between games.
+menus = {}
+
+@tracing.traced("main menu", "menu")
+def main_menu(screen, clock, myfont, first_frame_done = None):
+
+    if "main" not in menus:
+        menus["main"] = Menu('NOT MARIO', 'A Game To Play', ['Begin', 'Nope'])
+    menus["main"].run(screen, clock, myfont, first_frame_done)
+
+@tracing.traced("game over menu", "menu")
+def game_over_menu(screen, clock, myfont):
+
+    play_sound("game_over")
+
+    if "game_over" not in menus:
+        menus["game_over"] = Menu('WHAT DID YOU DO', 'P.S. Lost the Game', ['Try Again', 'End It'])
+    menus["game_over"].run(screen, clock, myfont)
+
+# Shown if the player gets through the menu before the level
+# has finished loading in the background.
+def loading_screen(screen, myfont):
+
+    screen.fill((0,0,0))
+    textsurface = text_cache.render(myfont, 'Loading...', (255,255,255))
+    screen.blit(textsurface,(SCREEN_W/3,SCREEN_H/2))
+    window.present()
+
+# Show last frame's counters in the top right corner (press F3).
+# See counters.py.
+def counter_overlay(screen, myfont):
+
+    last_frame = counters.last_frame()
+    if not last_frame:
+        lines = [("COUNTERS is off", "")]
+    else:
+        lines = [(name, str(last_frame[name])) for name in sorted(last_frame)]
+
+    line_height = myfont.get_height()
+    width = 260
+    x = SCREEN_W - width - 16
+    y = 16
+    screen.fill((0,0,0), (x - 4, y - 4, width + 8, line_height * len(lines) + 8))
+    for name, value in lines:
+        screen.blit(text_cache.render(myfont, name, (255,255,255)), (x, y))
+        if value:
+            number = text_cache.render_counter(myfont, value, (255,255,0))
+            screen.blit(number, (x + width - number.get_width(), y))
+        y += line_height
@@ -0,0 +1,149 @@
+# ======================================
+# ==       P A C K   A S S E T S      ==
+# ======================================
+# Run this before handing the game to someone else:
+#
+#     python pack_assets.py
+#
+# It packs every picture, sound and map in this folder
+# into one file, ASSET_ARCHIVE (see constants.py). The
+# game uses that file instead of the loose ones when it's
+# there. See assets.py for how it gets read back.
+#
+# Maps need a bit of extra work. A .tmx file points at a
+# .tsx tileset file, which points at the tileset picture,
+# and those paths only work on the computer the map was
+# made on. So we copy each tileset straight into its map,
+# and change the picture's path to just its filename.
+#
+# Delete the archive (or don't make one) while you're
+# working on the game, or it'll keep using the old files!
+
+import os
+import sys
+import json
+import struct
+#Reads and writes the XML that Tiled saves maps in
+from xml.etree import ElementTree
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#The archive format lives in here, so packing and reading always agree
+import assets
+
+# Which kinds of files get packed. Tilesets (.tsx) don't need to be,
+# because they get copied into the maps.
+PACKED_EXTENSIONS = [".png", ".wav", ".ogg", ".tmx", ".world"]
+
+# Find a file a map or tileset points at. If the path doesn't work
+# here, look for a file with the same name in this folder.
+def find_file(path, relative_to):
+    full_path = os.path.join(os.path.dirname(relative_to), path)
+    if os.path.exists(full_path):
+        return full_path
+    if os.path.exists(os.path.basename(path)):
+        return os.path.basename(path)
+    return None
+
+# Copy every tileset a map uses into the map itself. Returns the new map
+# as bytes, and adds every tileset picture it found to "files".
+def pack_map(map_name, files):
+
+    tree = ElementTree.parse(map_name)
+    root = tree.getroot()
+
+    for index, tileset in enumerate(list(root)):
+        if tileset.tag != "tileset": continue
+
+        # Tilesets saved in their own .tsx file need copying in.
+        source = tileset.get("source")
+        tileset_file = map_name
+        if source is not None:
+            tileset_file = find_file(source, map_name)
+            if tileset_file is None:
+                raise FileNotFoundError(map_name + " uses tileset " + source + ", which can't be found")
+            inlined = ElementTree.parse(tileset_file).getroot()
+            inlined.set("firstgid", tileset.get("firstgid"))
+            root[index] = inlined
+            tileset = inlined
+
+        # Point every picture at just its filename, and pack the picture.
+        for image in tileset.iter("image"):
+            image_file = find_file(image.get("source"), tileset_file)
+            if image_file is None:
+                raise FileNotFoundError(tileset_file + " uses image " + image.get("source") + ", which can't be found")
+            image_name = os.path.basename(image_file)
+            image.set("source", image_name)
+            add_file(files, image_name, image_file)
+
+    return ElementTree.tostring(root, encoding="utf-8", xml_declaration=True)
+
+def add_file(files, name, filename):
+    with open(filename, "rb") as source:
+        data = source.read()
+    name = assets.asset_name(name)
+    if name in files and files[name] != data:
+        print("Warning: two different files are both called " + name + "; keeping the first")
+        return
+    files[name] = data
+
+def pack_assets(archive_name):
+
+    # Every file that goes in: name -> bytes
+    files = {}
+    for filename in sorted(os.listdir(".")):
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in PACKED_EXTENSIONS: continue
+        if extension == ".tmx":
+            files[assets.asset_name(filename)] = pack_map(filename, files)
+        else:
+            add_file(files, filename, filename)
+
+    # Work out where each file will go. The data starts right after the
+    # header and table of contents, but the table of contents has the
+    # offsets in it, so first work out the offsets from zero and then
+    # move them all up once we know how big the table is.
+    names = sorted(files)
+    sizes = [len(files[name]) for name in names]
+    offsets = []
+    position = 0
+    for size in sizes:
+        offsets.append(position)
+        position += size
+
+    index = {}
+    data_start = 0
+    # Adding data_start to the offsets can make the table longer (more
+    # digits), so go around until it stops changing.
+    while True:
+        for i in range(0, len(names)):
+            index[names[i]] = [data_start + offsets[i], sizes[i]]
+        index_bytes = json.dumps(index, sort_keys=True).encode("utf-8")
+        new_start = struct.calcsize(assets.HEADER_FORMAT) + len(index_bytes)
+        if new_start == data_start: break
+        data_start = new_start
+
+    # Write to a temporary file first, so a running game never sees half an archive.
+    temporary_name = archive_name + ".tmp"
+    with open(temporary_name, "wb") as archive:
+        archive.write(struct.pack(assets.HEADER_FORMAT, assets.ARCHIVE_MAGIC, len(index_bytes)))
+        archive.write(index_bytes)
+        for name in names:
+            archive.write(files[name])
+    os.replace(temporary_name, archive_name)
+
+    print("Packed " + str(len(names)) + " files (" + str(position) + " bytes) into " + archive_name)
+    for name in names:
+        print("  " + name.ljust(30) + str(len(files[name])).rjust(10))
+
+if __name__ == "__main__":
+    archive_name = ASSET_ARCHIVE
+    if len(sys.argv) > 1: archive_name = sys.argv[1]
+    try:
+        pack_assets(archive_name)
+    except (OSError, ElementTree.ParseError) as error:
+        print("Packing failed:", error)
+        sys.exit(1)
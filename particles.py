@@ -0,0 +1,275 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+#NumPy does maths on whole arrays of numbers at once, in fast C code
+import numpy
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+# ============================================
+# ==              PARTICLES                 ==
+# ============================================
+# An explosion used to be a whole Sprite with its own
+# animation. That's fine for one explosion, but dust,
+# debris and sparks need dozens of little bits each, and a
+# Python object for every bit would be slow.
+#
+# A particle emitter works like the projectile pool in
+# projectiles.py: every particle is one row of some NumPy
+# arrays (position, velocity, age, how long it lives, and
+# what kind it is), and the live ones are kept at the front.
+# Moving them all, adding gravity and throwing away the
+# old ones is a few lines of maths on the whole arrays.
+#
+# Each kind of particle has a list of pictures it goes
+# through as it gets older (its "frames"). The frames are
+# made once and shared by every emitter, and drawing is
+# one Surface.blits() call along with all the sprites.
+#
+# burst() sends out a handful of one kind at once:
+#
+#     emitter.burst("debris", x, y)
+#
+# Particles are just for looks. They don't bump into the
+# map or anything else.
+
+# Every kind of particle.
+#   count       how many one burst() makes
+#   lifetime    frames a particle lasts (a little random)
+#   speed       slowest and fastest it starts out moving
+#   angles      which way it can start moving, in degrees
+#               (0 is right, -90 is straight up)
+#   gravity     added to its downwards speed every frame
+#   drag        its speed gets multiplied by this every frame
+#   frames      what its pictures look like (see make_frames)
+PARTICLE_KINDS = {
+    # The old Effect animation from Little_Boom.png, as one particle.
+    "explosion": {"count": 1, "lifetime": (30, 30), "speed": (0, 0), "angles": (0, 0),
+                  "gravity": 0, "drag": 1,
+                  "frames": ("sheet", "Little_Boom.png", TILESIZE*2, 6)},
+    "debris":    {"count": 8, "lifetime": (30, 45), "speed": (1, 2.5), "angles": (-160, -20),
+                  "gravity": GRAVITY_STRENGTH, "drag": 0.98,
+                  "frames": ("dots", (150, 90, 40), 3, 1, 4)},
+    "sparks":    {"count": 6, "lifetime": (10, 18), "speed": (1.5, 3), "angles": (-180, 180),
+                  "gravity": 0.05, "drag": 0.9,
+                  "frames": ("dots", (255, 230, 120), 2, 1, 3)},
+    "dust":      {"count": 5, "lifetime": (18, 28), "speed": (0.3, 0.8), "angles": (-180, 0),
+                  "gravity": -0.01, "drag": 0.94,
+                  "frames": ("dots", (200, 200, 190), 2, 5, 5)},
+}
+
+# One particle as bytes, for Sprite_Handler.save_state().
+STATE_DTYPE = numpy.dtype([("x", "<f8"), ("y", "<f8"), ("vx", "<f8"), ("vy", "<f8"),
+                           ("age", "<i4"), ("lifetime", "<i4"), ("kind", "<i4")])
+
+# ---------------------------------
+# Frames
+# ---------------------------------
+# Made the first time anything is drawn (we need a screen to make
+# surfaces), then shared by every emitter.
+
+# Every frame of every kind, one after the other.
+all_frames = []
+# Half the size of each frame in all_frames, so particles can be drawn
+# by their middle.
+frame_half_sizes = None
+# kind number -> where its frames start in all_frames, and how many it has
+kind_first_frame = None
+kind_frame_count = None
+
+# The pictures for one kind, from the "frames" entry in PARTICLE_KINDS.
+#   ("sheet", filename, frame size, how many)    a strip from a sprite sheet
+#   ("dots", color, first size, last size, how many)
+#                                                circles that change size
+#                                                and fade out
+def make_frames(description):
+
+    if description[0] == "sheet":
+        kind, filename, size, count = description
+        sheet = surfaces.load_image(filename, category = "particles")
+        # A subsurface is a window onto part of the sheet, so it doesn't
+        # need its own copy of the pixels.
+        return [sheet.subsurface(Rect(size*frame, 0, size, size)) for frame in range(0, count)]
+
+    kind, color, first_size, last_size, count = description
+    frames = []
+    for frame in range(0, count):
+        along = frame / max(count - 1, 1)
+        size = max(1, round(first_size + (last_size - first_size) * along))
+        image = surfaces.new_surface((size, size), alpha = True, category = "particles")
+        alpha = round(255 * (1 - along * 0.75))
+        if size <= 2:
+            image.fill(color + (alpha,))
+        else:
+            pygame.draw.circle(image, color + (alpha,), (size / 2, size / 2), size / 2)
+        frames.append(image)
+    return frames
+
+def load_frames():
+
+    global frame_half_sizes, kind_first_frame, kind_frame_count
+    if frame_half_sizes is not None: return
+    first = []
+    counts = []
+    for name in KIND_NAMES:
+        frames = make_frames(PARTICLE_KINDS[name]["frames"])
+        first.append(len(all_frames))
+        counts.append(len(frames))
+        all_frames.extend(frames)
+    frame_half_sizes = numpy.array([frame.get_size() for frame in all_frames], dtype = numpy.float64) / 2
+    kind_first_frame = numpy.array(first, dtype = numpy.int64)
+    kind_frame_count = numpy.array(counts, dtype = numpy.int64)
+
+# Kinds get stored as numbers in the arrays: this is the order.
+KIND_NAMES = sorted(PARTICLE_KINDS)
+KIND_NUMBERS = {name: number for number, name in enumerate(KIND_NAMES)}
+# Gravity and drag for each kind number, so they can be looked up for
+# every particle at once.
+KIND_GRAVITY = numpy.array([PARTICLE_KINDS[name]["gravity"] for name in KIND_NAMES], dtype = numpy.float64)
+KIND_DRAG = numpy.array([PARTICLE_KINDS[name]["drag"] for name in KIND_NAMES], dtype = numpy.float64)
+
+# ---------------------------------
+# Emitter
+# ---------------------------------
+
+class Particle_Emitter(object):
+
+    def __init__(self, size = PARTICLE_POOL_SIZE):
+
+        self.size = size
+        self.count = 0
+        self.position = numpy.zeros((size, 2))
+        self.velocity = numpy.zeros((size, 2))
+        self.age = numpy.zeros(size, dtype = numpy.int32)
+        self.lifetime = numpy.ones(size, dtype = numpy.int32)
+        self.kind = numpy.zeros(size, dtype = numpy.int32)
+        # Each burst makes this much of its normal count. The quality
+        # governor turns it down on slow computers.
+        self.density = 1
+        # The emitter's own random numbers, so bursts don't change the
+        # random numbers the rest of the game gets.
+        self.random = numpy.random.default_rng(PARTICLE_SEED)
+
+    # Send out a burst of one kind of particle from (x, y).
+    def burst(self, kind_name, x, y, count = None):
+
+        kind = PARTICLE_KINDS[kind_name]
+        if count is None: count = kind["count"]
+        count = max(1, int(count * self.density))
+        if self.count + count > self.size:
+            counters.add("particles dropped", self.count + count - self.size)
+            count = self.size - self.count
+            if count <= 0: return
+        counters.add("particles made", count)
+
+        new = slice(self.count, self.count + count)
+        angles = numpy.radians(self.random.uniform(kind["angles"][0], kind["angles"][1], count))
+        speeds = self.random.uniform(kind["speed"][0], kind["speed"][1], count)
+        self.position[new] = (x, y)
+        self.velocity[new, 0] = numpy.cos(angles) * speeds
+        self.velocity[new, 1] = numpy.sin(angles) * speeds
+        self.age[new] = 0
+        self.lifetime[new] = self.random.integers(kind["lifetime"][0], kind["lifetime"][1] + 1, count)
+        self.kind[new] = KIND_NUMBERS[kind_name]
+        self.count += count
+
+    # Only keep the particles where keep is True, at the front.
+    def keep_only(self, keep):
+
+        count = int(keep.sum())
+        if count == self.count: return
+        self.position[:count] = self.position[:self.count][keep]
+        self.velocity[:count] = self.velocity[:self.count][keep]
+        self.age[:count] = self.age[:self.count][keep]
+        self.lifetime[:count] = self.lifetime[:self.count][keep]
+        self.kind[:count] = self.kind[:self.count][keep]
+        self.count = count
+
+    def clear(self):
+        self.count = 0
+
+    # Move every particle one frame and throw away the ones that are too
+    # old or have gone off the map (map_width, map_height in pixels).
+    def update(self, map_width, map_height):
+
+        if self.count == 0: return
+        with tracing.span("particles", "update", self.count):
+            counters.add("particles", self.count)
+            count = self.count
+            kinds = self.kind[:count]
+            velocity = self.velocity[:count]
+            velocity *= KIND_DRAG[kinds][:, None]
+            velocity[:, 1] += KIND_GRAVITY[kinds]
+            position = self.position[:count]
+            position += velocity
+            self.age[:count] += 1
+
+            keep = self.age[:count] < self.lifetime[:count]
+            keep &= (position[:, 0] >= 0) & (position[:, 0] < map_width)
+            keep &= (position[:, 1] >= 0) & (position[:, 1] < map_height)
+            self.keep_only(keep)
+
+    # Every particle as (image, top left corner), ready for blits().
+    def blit_sequence(self):
+
+        if self.count == 0: return []
+        load_frames()
+        count = self.count
+        kinds = self.kind[:count]
+        frame_count = kind_frame_count[kinds]
+        # How far through its life each particle is picks its frame.
+        frames = kind_first_frame[kinds] + numpy.minimum(
+            self.age[:count] * frame_count // self.lifetime[:count], frame_count - 1)
+        corners = (self.position[:count] - frame_half_sizes[frames]).astype(numpy.int32).tolist()
+        return [(all_frames[frame], corner) for frame, corner in zip(frames.tolist(), corners)]
+
+    # ---------------------------------
+    # Saving and loading states
+    # ---------------------------------
+    # The random numbers for new bursts aren't saved, so bursts after
+    # loading can look different. Particles don't change the game, so
+    # that's fine.
+
+    def get_state(self):
+        state = numpy.empty(self.count, dtype = STATE_DTYPE)
+        state["x"] = self.position[:self.count, 0]
+        state["y"] = self.position[:self.count, 1]
+        state["vx"] = self.velocity[:self.count, 0]
+        state["vy"] = self.velocity[:self.count, 1]
+        state["age"] = self.age[:self.count]
+        state["lifetime"] = self.lifetime[:self.count]
+        state["kind"] = self.kind[:self.count]
+        return state.tobytes()
+
+    def set_state(self, buffer, offset, count):
+        state = numpy.frombuffer(buffer, dtype = STATE_DTYPE, count = count, offset = offset)
+        self.count = count
+        self.position[:count, 0] = state["x"]
+        self.position[:count, 1] = state["y"]
+        self.velocity[:count, 0] = state["vx"]
+        self.velocity[:count, 1] = state["vy"]
+        self.age[:count] = state["age"]
+        self.lifetime[:count] = state["lifetime"]
+        self.kind[:count] = state["kind"]
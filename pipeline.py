@@ -0,0 +1,164 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+
+#Lets the simulation run on its own thread
+import threading
+#Prints out what went wrong if the simulation crashes
+import traceback
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Collects every sprite image for the frame so they can be drawn together
+import renderer
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+# ============================================
+# ==         PIPELINED SIMULATION           ==
+# ============================================
+# Normally each frame does everything one after another:
+# move the sprites, then draw them, then wait. But a lot of
+# pygame's drawing (blits, smoothscale) lets other Python
+# threads run while it works. So on a computer with more
+# than one core, we can move the sprites for the NEXT frame
+# on a second thread while this frame is being drawn.
+#
+# The catch is that the drawing code can't look at the
+# sprites while the other thread is moving them around. So
+# after every tick, the simulation takes a "snapshot" of
+# everything the renderer needs: which image each sprite
+# shows and where, the HUD, and where the camera is looking.
+# The renderer only ever draws from a snapshot.
+#
+# There are two snapshots, "front" and "back" (that's the
+# "double buffer"). The renderer draws the front one while
+# the simulation fills in the back one. When both are done,
+# they swap. What you see is always one tick behind what's
+# being simulated.
+#
+# Anything that touches the window (menus, screen
+# transitions) has to happen on the main thread while the
+# simulation is waiting, and then call resync().
+
+# Everything needed to draw one frame. Don't change it once it's made!
+class Frame_Snapshot(object):
+
+    def __init__(self, sprites, hud_image, view_rect, tick):
+
+        # (image, rect, layer) for every sprite, from Sprite_Handler.snapshot()
+        self.sprites = sprites
+        self.hud_image = hud_image
+        # The part of the map the camera was looking at
+        self.view_rect = view_rect
+        # Which simulation tick this came from
+        self.tick = tick
+
+    # Draw the snapshot's sprites onto the map image.
+    def draw(self, map_image, render_queue):
+
+        for image, rect, layer in self.sprites:
+            render_queue.add(image, rect, layer)
+        return render_queue.flush(map_image)
+
+class Sim_Pipeline(object):
+
+    # simulate is the function that runs one tick of the game, given the keys.
+    def __init__(self, sprite_handler, game_camera, simulate):
+
+        self.sprite_handler = sprite_handler
+        self.game_camera = game_camera
+        self.simulate = simulate
+        # The renderer gets its own render queue so it never shares one
+        # with the sprite handler.
+        self.render_queue = renderer.Render_Queue()
+
+        self.tick = 0
+        self.front = self.take_snapshot()
+        self.back = None
+        self.keys = None
+        self.error = None
+
+        # start_tick() sets tick_ready to wake the simulation thread up,
+        # and the simulation thread sets tick_done when it's finished.
+        self.tick_ready = threading.Event()
+        self.tick_done = threading.Event()
+        self.tick_done.set()
+        self.running = True
+        # daemon means the thread won't stop the game from quitting.
+        self.thread = threading.Thread(target = self.run, name = "simulation", daemon = True)
+        self.thread.start()
+
+    def take_snapshot(self):
+
+        return Frame_Snapshot(self.sprite_handler.snapshot(),
+                              self.sprite_handler.draw_hud(),
+                              self.game_camera.get_view_rect(),
+                              self.tick)
+
+    # This is what the simulation thread does, forever.
+    def run(self):
+
+        while True:
+            self.tick_ready.wait()
+            self.tick_ready.clear()
+            if self.running == False: return
+            try:
+                self.simulate(self.keys)
+                self.tick += 1
+                with tracing.span("snapshot", "update"):
+                    self.back = self.take_snapshot()
+            except Exception as error:
+                print("Simulation thread crashed:")
+                traceback.print_exc()
+                self.error = error
+            self.tick_done.set()
+
+    # Start simulating the next tick on the other thread.
+    def start_tick(self, keys):
+
+        self.finish_tick()
+        # Copy the keys so the main thread can keep changing its list.
+        self.keys = list(keys)
+        self.tick_done.clear()
+        self.tick_ready.set()
+
+    # Wait for the tick to finish, then swap the snapshots. Returns the
+    # newest snapshot. Safe to call when no tick is running.
+    def finish_tick(self):
+
+        self.tick_done.wait()
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+        if self.back is not None:
+            self.front, self.back = self.back, None
+        return self.front
+
+    # Call this after the main thread changes the game itself (loading a
+    # map, resetting the player), so the next frame doesn't draw old news.
+    def resync(self):
+
+        self.finish_tick()
+        self.front = self.take_snapshot()
+
+    # Draw the front snapshot onto the map image. Returns the changed rects.
+    def draw(self, map_image):
+
+        return self.front.draw(map_image, self.render_queue)
+
+    def stop(self):
+
+        self.finish_tick()
+        self.running = False
+        self.tick_ready.set()
@@ -0,0 +1,300 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+#NumPy does maths on whole arrays of numbers at once, in fast C code
+import numpy
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Asks bigger questions about which tiles are solid, all at once
+import map_query
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+# ============================================
+# ==             PROJECTILES                ==
+# ============================================
+# If every bullet was its own Sprite, each one would be a
+# Python object with its own update() to call every frame,
+# and a screen full of bullets would grind the game to a
+# halt.
+#
+# Instead, every projectile lives in a "pool": a few NumPy
+# arrays made once at the start, big enough for
+# PROJECTILE_POOL_SIZE projectiles. Projectile number i is
+# just row i of each array:
+#
+#   position   x, y of its middle, in pixels
+#   velocity   how far it moves each frame
+#   life       frames left before it disappears
+#   owner      who fired it: PLAYER or ENEMY
+#
+# The live ones are always kept at the front, rows 0 to
+# count-1, so "every projectile" is just the first count
+# rows. Moving them all is one line of maths on the whole
+# array, whether there's 5 of them or 2000.
+#
+# Hitting the map: most projectiles are in the open air, far
+# from any wall. A "summed area table" of the map (see
+# Tile_Counts) tells us how many solid tiles are inside any
+# rectangle of tiles with four lookups, so we can check
+# every projectile's path at once and find the few that
+# might hit something. Only those get an exact raycast()
+# from map_query.py.
+#
+# Hitting sprites: the projectiles get sorted into a grid of
+# big cells (PROJECTILE_CELL_SIZE). Each sprite only looks
+# at the cells it's touching, instead of at every single
+# projectile. This is called a "broadphase".
+#
+# Drawing: the whole pool gets added to the render queue in
+# one go, so it's drawn in the same single Surface.blits()
+# call as all the other sprites.
+
+# One projectile as bytes, for Sprite_Handler.save_state().
+STATE_DTYPE = numpy.dtype([("x", "<f8"), ("y", "<f8"), ("vx", "<f8"), ("vy", "<f8"),
+                           ("life", "<i4"), ("owner", "<i4")])
+
+# How many solid tiles are in any rectangle of tiles.
+# Each entry of the table is how many solid tiles there are above and to
+# the left of it, so the count for a rectangle is its bottom right entry,
+# minus the strips above and to the left, plus the corner that got taken
+# away twice.
+class Tile_Counts(object):
+
+    def __init__(self, grid):
+
+        self.grid = grid
+        self.version = grid.version
+        flags = numpy.frombuffer(grid.flags, dtype = numpy.uint8).reshape(grid.height, grid.width)
+        solid = (flags & map_query.SOLID != 0).astype(numpy.int32)
+        self.table = numpy.zeros((grid.height + 1, grid.width + 1), dtype = numpy.int32)
+        self.table[1:, 1:] = solid.cumsum(axis = 0).cumsum(axis = 1)
+
+    # Which of these tile rectangles might have a solid tile in them.
+    # Anything that goes off the map might, since off the map is solid.
+    def maybe_solid(self, left, top, right, bottom):
+
+        off_map = (left < 0) | (top < 0) | (right >= self.grid.width) | (bottom >= self.grid.height)
+        left = left.clip(0, self.grid.width - 1)
+        right = right.clip(0, self.grid.width - 1)
+        top = top.clip(0, self.grid.height - 1)
+        bottom = bottom.clip(0, self.grid.height - 1)
+        table = self.table
+        solid_tiles = (table[bottom + 1, right + 1] - table[top, right + 1]
+                       - table[bottom + 1, left] + table[top, left])
+        return off_map | (solid_tiles > 0)
+
+class Projectile_Pool(object):
+
+    def __init__(self, size = PROJECTILE_POOL_SIZE):
+
+        self.size = size
+        self.count = 0
+        self.position = numpy.zeros((size, 2))
+        self.velocity = numpy.zeros((size, 2))
+        self.life = numpy.zeros(size, dtype = numpy.int32)
+        self.owner = numpy.zeros(size, dtype = numpy.int32)
+        # The tile counts for the map we were last on.
+        self.tile_counts = None
+        # Where projectiles hit the map during the last update(), as (x, y).
+        self.wall_hits = []
+        # A picture for each owner, made the first time it's drawn.
+        self.images = {}
+
+    # ---------------------------------
+    # Adding and removing
+    # ---------------------------------
+
+    # Fire one projectile from (x, y). Returns False if the pool is full.
+    def spawn(self, x, y, velocity_x, velocity_y, owner, life = PROJECTILE_LIFETIME):
+
+        if self.count >= self.size:
+            counters.add("projectiles dropped")
+            return False
+        i = self.count
+        self.position[i] = (x, y)
+        self.velocity[i] = (velocity_x, velocity_y)
+        self.life[i] = life
+        self.owner[i] = owner
+        self.count += 1
+        return True
+
+    # Only keep the projectiles where keep is True, and move them to
+    # the front so they stay in rows 0 to count-1.
+    def keep_only(self, keep):
+
+        count = int(keep.sum())
+        if count == self.count: return
+        self.position[:count] = self.position[:self.count][keep]
+        self.velocity[:count] = self.velocity[:self.count][keep]
+        self.life[:count] = self.life[:self.count][keep]
+        self.owner[:count] = self.owner[:self.count][keep]
+        self.count = count
+
+    def clear(self):
+        self.count = 0
+
+    # ---------------------------------
+    # Moving
+    # ---------------------------------
+
+    def update(self, tmxdata):
+
+        self.wall_hits = []
+        if self.count == 0: return
+        with tracing.span("projectiles", "update", self.count):
+            counters.add("projectiles", self.count)
+            count = self.count
+            start = self.position[:count].copy()
+            self.position[:count] += self.velocity[:count]
+            self.life[:count] -= 1
+            keep = self.life[:count] > 0
+            keep &= ~self.hit_map(tmxdata, start, self.position[:count])
+            self.keep_only(keep)
+
+    # Which projectiles hit something solid moving from start to end.
+    def hit_map(self, tmxdata, start, end):
+
+        grid = map_query.get_grid(tmxdata)
+        if grid.flags is None:
+            # A chunked map (see chunked_map.py) has no single list of flags
+            # to count, so every projectile gets a raycast.
+            hit = numpy.ones(len(start), dtype = bool)
+        else:
+            if self.tile_counts is None or self.tile_counts.grid is not grid or self.tile_counts.version != grid.version:
+                self.tile_counts = Tile_Counts(grid)
+
+            # The rectangle of tiles each projectile's path goes through.
+            low = numpy.floor(numpy.minimum(start, end) / TILESIZE).astype(numpy.int64)
+            high = numpy.floor(numpy.maximum(start, end) / TILESIZE).astype(numpy.int64)
+            hit = self.tile_counts.maybe_solid(low[:, 0], low[:, 1], high[:, 0], high[:, 1])
+
+        # Check the ones that might have hit something properly.
+        maybe = numpy.nonzero(hit)[0]
+        counters.add("projectile raycasts", len(maybe))
+        for i in maybe.tolist():
+            wall = grid.raycast(start[i, 0], start[i, 1], end[i, 0], end[i, 1])
+            hit[i] = wall is not None
+            if wall is not None: self.wall_hits.append(wall.point)
+        return hit
+
+    # ---------------------------------
+    # Hitting sprites
+    # ---------------------------------
+
+    # Find the projectiles fired by owner that are touching any of rects.
+    # Each projectile only hits one thing, and gets removed when it does.
+    # Returns a list with the index into rects of everything that got hit
+    # (something hit twice is in there twice).
+    def hit_rects(self, rects, owner):
+
+        if self.count == 0 or len(rects) == 0: return []
+        count = self.count
+        half = PROJECTILE_SIZE / 2
+        position = self.position[:count]
+
+        # Sort this owner's projectiles by which cell they're in.
+        mine = numpy.nonzero(self.owner[:count] == owner)[0]
+        if len(mine) == 0: return []
+        cell_x = numpy.floor(position[mine, 0] / PROJECTILE_CELL_SIZE).astype(numpy.int64)
+        cell_y = numpy.floor(position[mine, 1] / PROJECTILE_CELL_SIZE).astype(numpy.int64)
+        # One number per cell. The offset keeps it working a little way
+        # off the top and left of the map.
+        cells = (cell_y + 1024) * 65536 + (cell_x + 1024)
+        order = numpy.argsort(cells, kind = "stable")
+        cells = cells[order]
+        mine = mine[order]
+
+        hits = []
+        used = numpy.zeros(count, dtype = bool)
+        for target, rect in enumerate(rects):
+            # The cells this rect touches, grown by half a projectile since
+            # we're sorting by the projectile's middle.
+            left = int((rect.left - half) // PROJECTILE_CELL_SIZE)
+            right = int((rect.right + half) // PROJECTILE_CELL_SIZE)
+            top = int((rect.top - half) // PROJECTILE_CELL_SIZE)
+            bottom = int((rect.bottom + half) // PROJECTILE_CELL_SIZE)
+            for cell_row in range(top, bottom + 1):
+                first = (cell_row + 1024) * 65536 + (left + 1024)
+                last = (cell_row + 1024) * 65536 + (right + 1024)
+                start = numpy.searchsorted(cells, first, side = "left")
+                end = numpy.searchsorted(cells, last, side = "right")
+                if start == end: continue
+                nearby = mine[start:end]
+                x = position[nearby, 0]
+                y = position[nearby, 1]
+                touching = ((x + half > rect.left) & (x - half < rect.right) &
+                            (y + half > rect.top) & (y - half < rect.bottom) & ~used[nearby])
+                for i in nearby[touching].tolist():
+                    used[i] = True
+                    hits.append(target)
+
+        if hits: self.keep_only(~used)
+        return hits
+
+    # ---------------------------------
+    # Drawing
+    # ---------------------------------
+
+    def get_image(self, owner):
+        image = self.images.get(owner)
+        if image is None:
+            image = surfaces.new_surface((PROJECTILE_SIZE, PROJECTILE_SIZE), alpha = True, category = "sprite frames")
+            color = PLAYER_PROJECTILE_COLOR if owner == PLAYER else ENEMY_PROJECTILE_COLOR
+            radius = PROJECTILE_SIZE // 2
+            pygame.draw.circle(image, color, (radius, radius), radius)
+            self.images[owner] = image
+        return image
+
+    # Every projectile as (image, top left corner), ready for blits().
+    def blit_sequence(self):
+
+        if self.count == 0: return []
+        corners = (self.position[:self.count] - PROJECTILE_SIZE / 2).astype(numpy.int32).tolist()
+        images = [self.get_image(PLAYER), self.get_image(ENEMY)]
+        owners = (self.owner[:self.count] != PLAYER).astype(numpy.int8).tolist()
+        return [(images[owner], corner) for owner, corner in zip(owners, corners)]
+
+    # ---------------------------------
+    # Saving and loading states
+    # ---------------------------------
+
+    def get_state(self):
+        state = numpy.empty(self.count, dtype = STATE_DTYPE)
+        state["x"] = self.position[:self.count, 0]
+        state["y"] = self.position[:self.count, 1]
+        state["vx"] = self.velocity[:self.count, 0]
+        state["vy"] = self.velocity[:self.count, 1]
+        state["life"] = self.life[:self.count]
+        state["owner"] = self.owner[:self.count]
+        return state.tobytes()
+
+    def set_state(self, buffer, offset, count):
+        state = numpy.frombuffer(buffer, dtype = STATE_DTYPE, count = count, offset = offset)
+        self.count = count
+        self.position[:count, 0] = state["x"]
+        self.position[:count, 1] = state["y"]
+        self.velocity[:count, 0] = state["vx"]
+        self.velocity[:count, 1] = state["vy"]
+        self.life[:count] = state["life"]
+        self.owner[:count] = state["owner"]
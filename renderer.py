@@ -0,0 +1,102 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+
+# ============================================
+# ==            RENDER QUEUE                ==
+# ============================================
+# Instead of every sprite blitting itself onto the
+# map one at a time, sprites get added to this queue
+# while we draw the frame. At the end, everything is
+# sorted by layer and handed to Surface.blits() in a
+# single call. Python is slow at calling functions, so
+# one big call is a lot cheaper than lots of small ones.
+#
+# The queue also remembers where it drew last frame.
+# If the camera is standing still, we can use that to
+# patch up only the parts of the map that changed
+# (the "dirty rectangles") instead of redrawing it all.
+
+class Render_Queue(object):
+
+    def __init__(self):
+
+        # Everything we want to draw this frame. Each entry is
+        # (layer, image, position). Position can be a Rect; blits()
+        # will just use its top left corner.
+        self.queue = []
+
+        # Where we drew sprites last frame and this frame, in map
+        # coordinates. We need both to know what changed.
+        self.last_rects = []
+        self.drawn_rects = []
+
+    # Add one image to the queue.
+    def add(self, image, position, layer):
+        self.queue.append((layer, image, position))
+
+    # Add a list of (image, position) pairs, like the ones blits() takes.
+    def add_sequence(self, blit_sequence, layer):
+        self.queue.extend([(layer, image, position) for image, position in blit_sequence])
+
+    # Add every sprite in a pygame Group to the queue.
+    def add_group(self, group, layer):
+        for sprite in group:
+            self.queue.append((layer, sprite.image, sprite.rect))
+
+    # Paint the clean background back over wherever we drew sprites
+    # last frame. This is the cheap alternative to copying the whole
+    # map image again when we know only the sprites have changed.
+    def erase(self, target, background):
+        counters.add("blits", len(self.drawn_rects))
+        for rect in self.drawn_rects:
+            target.blit(background, rect, rect)
+
+    # Draw everything in the queue onto the target in one go.
+    # Returns the list of rects that changed since last frame (where
+    # sprites were before plus where they are now).
+    def flush(self, target, offset = (0, 0)):
+
+        # Python's sort is "stable", which means sprites on the same
+        # layer stay in the order they were added.
+        self.queue.sort(key=lambda entry: entry[0])
+        if offset == (0, 0):
+            blit_sequence = [(image, position) for layer, image, position in self.queue]
+        else:
+            # Move everything by offset, for drawing onto something that
+            # isn't the whole map (like world mode's canvas).
+            offset_x, offset_y = offset
+            blit_sequence = [(image, (position[0] + offset_x, position[1] + offset_y))
+                             for layer, image, position in self.queue]
+
+        if DEBUG_SURFACE_FORMAT == True:
+            for image, position in blit_sequence:
+                surfaces.check_display_format(image, "Render_Queue.flush")
+
+        self.last_rects = self.drawn_rects
+        counters.add("blits", len(blit_sequence))
+        self.drawn_rects = target.blits(blit_sequence)
+        self.queue = []
+
+        return self.last_rects + self.drawn_rects
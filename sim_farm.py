@@ -0,0 +1,358 @@
+# ======================================
+# ==       S I M U L A T I O N        ==
+# ==             F A R M              ==
+# ======================================
+# Plays the game thousands of times without a window, to
+# check that level changes don't break anything. Run it
+# like this:
+#
+#     python sim_farm.py --runs 1000 --ticks 3600
+#
+# Each run follows an "input trace": a list of which keys
+# get pressed and let go on which tick. Traces can be made
+# up at random (from a seed, so a run can be repeated) or
+# loaded from a file with --traces.
+#
+# The runs are spread over a pool of worker processes, one
+# per core. Each worker loads every map once when it starts
+# and reuses them for all of its runs. At the end we print
+# one report for all the runs put together. --check plays
+# every trace again in one process afterwards, to make sure
+# the pool didn't change how any run ended.
+
+import os
+import sys
+import json
+import time
+import random
+#Makes a short fingerprint of how each run ended
+import hashlib
+import argparse
+#Runs lots of copies of the game at once on different cores
+import multiprocessing
+
+# There's no window, and no sound. This has to be set before
+# pygame gets imported, including in the worker processes.
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+# SDL catches SIGTERM when the display starts, but the pool stops its
+# workers with SIGTERM. Without this they'd never stop.
+os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+
+#Import Pygame
+import pygame
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#The same game code the real game uses
+import methods
+from methods import enter_map, direction_from_name, preview_new_map, is_streamed_map
+import game_objects
+
+# The keys a trace can press, and where they go in the keys list.
+KEY_NAMES = {"UP":UP, "DOWN":DOWN, "LEFT":LEFT, "RIGHT":RIGHT, "JUMP":JUMP, "SHOOT":SHOOT}
+
+# How long the game waits after the player dies before starting over.
+# Matches the main game's player_death_counter.
+DEATH_WAIT_TICKS = 200
+
+# Tick times get counted into these buckets (in milliseconds) so the
+# workers don't have to send back every single tick time.
+FRAME_TIME_BUCKETS = [0.1, 0.25, 0.5, 1, 2, 4, 8, 16]
+
+# ============================================
+# ==           INPUT TRACES                 ==
+# ============================================
+# A trace is a dictionary like:
+#   {"name": "random-5", "map": "Notlevel1.tmx", "ticks": 3600,
+#    "events": [[0, "RIGHT", true], [40, "JUMP", true], [60, "JUMP", false], ...]}
+# Each event is [tick, key name, pressed or not].
+
+# Make up a trace that wanders around and jumps a lot.
+def random_trace(seed, ticks, start_map):
+
+    rng = random.Random(seed)
+    events = []
+    tick = 0
+    held = None
+    while tick < ticks:
+        # Pick a direction (or stand still) and hold it for a while.
+        if held is not None: events.append([tick, held, False])
+        held = rng.choice(["LEFT", "RIGHT", "RIGHT", None])
+        if held is not None: events.append([tick, held, True])
+        hold_for = rng.randint(30, 180)
+
+        # Jump a few times while we're at it.
+        jump_tick = tick + rng.randint(0, 40)
+        while jump_tick < tick + hold_for:
+            events.append([jump_tick, "JUMP", True])
+            events.append([jump_tick + rng.randint(5, 30), "JUMP", False])
+            jump_tick += rng.randint(20, 90)
+
+        tick += hold_for
+
+    events.sort(key = lambda event: event[0])
+    return {"name": "random-" + str(seed), "map": start_map, "ticks": ticks, "events": events}
+
+# ============================================
+# ==              WORKERS                   ==
+# ============================================
+# Everything in this section runs inside the worker processes.
+
+# Every map, loaded once per worker: map name -> tmxdata
+worker_maps = {}
+
+def start_worker(map_names, quiet):
+
+    # The game prints a lot of debugging messages (like walking off the
+    # edge of the map), and thousands of runs make that very slow. Errors
+    # still get sent back to the runner.
+    if quiet: sys.stdout = open(os.devnull, "w")
+
+    # pygame needs a (pretend) screen before it can load images.
+    pygame.display.init()
+    pygame.display.set_mode((SCREEN_W, SCREEN_H))
+    for map_name in map_names:
+        worker_maps[map_name] = preview_new_map(map_name)
+
+def get_map(map_name):
+    if map_name not in worker_maps:
+        worker_maps[map_name] = preview_new_map(map_name)
+    return worker_maps[map_name]
+
+# A fingerprint of everything about how the run ended. Two runs of the
+# same trace should always end with the same fingerprint.
+def state_hash(sprite_handler, current_map):
+
+    player = sprite_handler.get_player()
+    state = [current_map, player.rect.x, player.rect.y, player.hit_points,
+             player.state, list(player.vector)]
+    enemies = []
+    for enemy in sprite_handler.enemy_list:
+        enemies.append((enemy.rect.x, enemy.rect.y, enemy.state))
+    state.append(sorted(enemies))
+    return hashlib.sha1(repr(state).encode("utf-8")).hexdigest()[:16]
+
+# Play one trace from start to finish. Returns the run's stats.
+def run_trace(trace):
+
+    sprite_handler = game_objects.Sprite_Handler()
+    current_map = trace["map"]
+    tmxdata = get_map(current_map)
+    enter_map(tmxdata, sprite_handler, RIGHT)
+    player = sprite_handler.get_player()
+
+    # Sort the events by tick so we can look them up quickly.
+    events = {}
+    for tick, key_name, pressed in trace["events"]:
+        events.setdefault(tick, []).append((KEY_NAMES[key_name], bool(pressed)))
+
+    keys = [False, False, False, False, False, False, False, False, False]
+    map_visits = {current_map: 1}
+    deaths = 0
+    death_counter = 0
+    was_dying = False
+    tick_times = []
+
+    for tick in range(0, trace["ticks"]):
+
+        for key, pressed in events.get(tick, []):
+            keys[key] = pressed
+
+        tick_start = time.perf_counter()
+
+        # The same map exit check the main game does, minus the scrolling.
+        checked_exit_dict = sprite_handler.check_for_map_exit(tmxdata)
+        if(checked_exit_dict["dest"] != "none"):
+            current_map = checked_exit_dict["dest"]
+            tmxdata = get_map(current_map)
+            enter_map(tmxdata, sprite_handler, direction_from_name(checked_exit_dict["dir"]))
+            map_visits[current_map] = map_visits.get(current_map, 0) + 1
+
+        if(is_streamed_map(tmxdata)): tmxdata.update(sprite_handler)
+        sprite_handler.update(tmxdata, keys)
+        sprite_handler.player_enemy_collision_check()
+        sprite_handler.projectile_collision_check()
+
+        tick_times.append((time.perf_counter() - tick_start) * 1000)
+
+        # Count deaths, and start over like the game over menu would.
+        dying = player.state == DYING or player.state == DEAD
+        if dying and not was_dying: deaths += 1
+        was_dying = dying
+        if player.state == DEAD:
+            death_counter += 1
+            if death_counter >= DEATH_WAIT_TICKS:
+                sprite_handler.reset_player(tmxdata)
+                death_counter = 0
+
+    return {"name": trace["name"],
+            "ticks": trace["ticks"],
+            "deaths": deaths,
+            "map_visits": map_visits,
+            "final_map": current_map,
+            "final_hash": state_hash(sprite_handler, current_map),
+            "tick_ms": summarize_times(tick_times)}
+
+# Boil a list of tick times down to a few numbers and a histogram.
+def summarize_times(tick_times):
+
+    ordered = sorted(tick_times)
+    histogram = [0] * (len(FRAME_TIME_BUCKETS) + 1)
+    for milliseconds in tick_times:
+        bucket = 0
+        while bucket < len(FRAME_TIME_BUCKETS) and milliseconds > FRAME_TIME_BUCKETS[bucket]:
+            bucket += 1
+        histogram[bucket] += 1
+
+    def percentile(fraction):
+        if len(ordered) == 0: return 0
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {"total": sum(ordered),
+            "max": percentile(1),
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "histogram": histogram}
+
+# ============================================
+# ==              RUNNER                    ==
+# ============================================
+
+def run_farm(traces, workers, quiet = True):
+
+    map_names = sorted(name for name in os.listdir(".") if name.endswith(".tmx"))
+    wall_start = time.perf_counter()
+
+    if workers == 0:
+        # Run everything right here, which is handy for debugging.
+        real_stdout = sys.stdout
+        start_worker(map_names, quiet)
+        try:
+            results = [run_trace(trace) for trace in traces]
+        finally:
+            sys.stdout = real_stdout
+    else:
+        # Hand out runs a few at a time so every worker stays busy.
+        chunk_size = max(1, len(traces) // (workers * 4))
+        with multiprocessing.Pool(workers, start_worker, (map_names, quiet)) as pool:
+            results = list(pool.imap_unordered(run_trace, traces, chunk_size))
+            pool.close()
+            pool.join()
+
+    wall_seconds = time.perf_counter() - wall_start
+    results.sort(key = lambda result: result["name"])
+    return results, wall_seconds
+
+# Play the same traces again in this process, and list the runs that
+# ended differently from the pool's. There shouldn't be any: a run
+# should end the same way wherever it's played.
+def check_against_serial(traces, report, quiet = True):
+
+    results, wall_seconds = run_farm(traces, 0, quiet)
+    mismatches = []
+    for result in results:
+        if report["final_hashes"].get(result["name"]) != result["final_hash"]:
+            mismatches.append(result["name"])
+    return mismatches
+
+# Add every run's stats together into one report.
+def build_report(results, wall_seconds, workers):
+
+    total_ticks = 0
+    total_deaths = 0
+    total_ms = 0
+    max_ms = 0
+    map_visits = {}
+    histogram = [0] * (len(FRAME_TIME_BUCKETS) + 1)
+    final_hashes = {}
+
+    for result in results:
+        total_ticks += result["ticks"]
+        total_deaths += result["deaths"]
+        total_ms += result["tick_ms"]["total"]
+        max_ms = max(max_ms, result["tick_ms"]["max"])
+        for map_name in result["map_visits"]:
+            map_visits[map_name] = map_visits.get(map_name, 0) + result["map_visits"][map_name]
+        for bucket in range(0, len(histogram)):
+            histogram[bucket] += result["tick_ms"]["histogram"][bucket]
+        final_hashes[result["name"]] = result["final_hash"]
+
+    return {"runs": len(results),
+            "workers": workers,
+            "wall_seconds": wall_seconds,
+            "ticks": total_ticks,
+            "ticks_per_second": total_ticks / max(wall_seconds, 0.000001),
+            "deaths": total_deaths,
+            "runs_with_deaths": sum(1 for result in results if result["deaths"] > 0),
+            "map_visits": map_visits,
+            "tick_ms_mean": total_ms / max(total_ticks, 1),
+            "tick_ms_max": max_ms,
+            "tick_ms_buckets": FRAME_TIME_BUCKETS,
+            "tick_ms_histogram": histogram,
+            "final_hashes": final_hashes,
+            "results": results}
+
+def print_report(report):
+
+    print("Simulation farm report")
+    print("  runs: " + str(report["runs"]) + " on " + str(report["workers"]) + " workers")
+    print("  ticks: " + str(report["ticks"]) + " in " + str(round(report["wall_seconds"], 2)) +
+          " s (" + str(round(report["ticks_per_second"])) + " ticks/s)")
+    print("  deaths: " + str(report["deaths"]) + " (" + str(report["runs_with_deaths"]) + " runs had at least one)")
+    print("  map visits:")
+    for map_name in sorted(report["map_visits"]):
+        print("    " + map_name.ljust(20) + str(report["map_visits"][map_name]))
+    print("  tick time: mean " + str(round(report["tick_ms_mean"], 3)) + " ms, max " +
+          str(round(report["tick_ms_max"], 3)) + " ms")
+    low = 0
+    for bucket in range(0, len(report["tick_ms_histogram"])):
+        if bucket < len(FRAME_TIME_BUCKETS): label = str(low) + "-" + str(FRAME_TIME_BUCKETS[bucket]) + " ms"
+        else: label = "over " + str(low) + " ms"
+        print("    " + label.ljust(16) + str(report["tick_ms_histogram"][bucket]))
+        if bucket < len(FRAME_TIME_BUCKETS): low = FRAME_TIME_BUCKETS[bucket]
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Play lots of headless games at once.")
+    parser.add_argument("--runs", type = int, default = 100, help = "how many random traces to play")
+    parser.add_argument("--ticks", type = int, default = 3600, help = "how long each random trace is")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed of the first random trace")
+    parser.add_argument("--map", default = "Notlevel1.tmx", help = "map random traces start on")
+    parser.add_argument("--traces", help = "play the traces in this JSON file instead")
+    parser.add_argument("--save-traces", help = "write the traces played to this JSON file")
+    parser.add_argument("--workers", type = int, default = os.cpu_count(),
+                        help = "worker processes (0 runs everything in this process)")
+    parser.add_argument("--json", help = "write the full report to this JSON file")
+    parser.add_argument("--verbose", action = "store_true", help = "show the game's own messages")
+    parser.add_argument("--check", action = "store_true",
+                        help = "play every trace again with --workers 0 and check it ends the same")
+    args = parser.parse_args()
+
+    if args.traces:
+        with open(args.traces) as trace_file:
+            traces = json.load(trace_file)
+    else:
+        traces = [random_trace(args.seed + i, args.ticks, args.map) for i in range(0, args.runs)]
+    if args.save_traces:
+        with open(args.save_traces, "w") as trace_file:
+            json.dump(traces, trace_file)
+
+    results, wall_seconds = run_farm(traces, args.workers, not args.verbose)
+    report = build_report(results, wall_seconds, args.workers)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump(report, report_file, indent = 1)
+
+    if args.check:
+        mismatches = check_against_serial(traces, report, not args.verbose)
+        if mismatches:
+            print("  check: " + str(len(mismatches)) + " runs ended differently with --workers 0: " +
+                  ", ".join(mismatches))
+            sys.exit(1)
+        print("  check: all " + str(report["runs"]) + " runs ended the same with --workers 0")
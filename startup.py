@@ -0,0 +1,130 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+#
+# This file gets imported before everything else
+# (even pygame!) so it can time how long the other
+# imports take. So it only uses Python's own libraries.
+
+#Lets us measure time very precisely
+import time
+#Lets us run the loading code at the same time as the menu
+import threading
+#Prints out what went wrong if the loader crashes
+import traceback
+#Writes a timeline of everything the game does, if TRACING is on.
+#It only uses Python's own libraries too.
+import tracing
+
+# ============================================
+# ==           STARTUP TIMER                ==
+# ============================================
+# Keeps track of how long each part of starting the
+# game takes, so we can see what to speed up. Each
+# "track" is one thing happening at a time: "main" is
+# the normal game code, and "loader" is the background
+# loader that runs while the menu is up.
+#
+# Call stage_done() at the END of each part, with the
+# name of the part that just finished. Call milestone()
+# for moments we care about, like the menu showing up.
+
+class Startup_Timer(object):
+
+    def __init__(self):
+
+        self.start_time = time.perf_counter()
+        # When the last stage on each track finished.
+        self.last_time = {"main": self.start_time}
+        # Every finished stage: (track, name, milliseconds it took)
+        self.stages = []
+        # Every milestone: (name, milliseconds since the game started)
+        self.milestones = []
+        # Both threads write in here, so take turns.
+        self.lock = threading.Lock()
+
+    # Start timing a new track from right now.
+    def start_track(self, track):
+        with self.lock:
+            self.last_time[track] = time.perf_counter()
+
+    def stage_done(self, name, track = "main"):
+        now = time.perf_counter()
+        with self.lock:
+            self.stages.append((track, name, (now - self.last_time[track]) * 1000))
+            self.last_time[track] = now
+
+    def milestone(self, name):
+        now = time.perf_counter()
+        with self.lock:
+            self.milestones.append((name, (now - self.start_time) * 1000))
+
+    def report(self):
+
+        with self.lock:
+            print("Startup timing:")
+            for track, name, milliseconds in self.stages:
+                print("  " + track.ljust(8) + name.ljust(28) + str(round(milliseconds, 1)).rjust(8) + " ms")
+            for name, milliseconds in self.milestones:
+                print("  " + (name + " at").ljust(36) + str(round(milliseconds, 1)).rjust(8) + " ms")
+
+# ============================================
+# ==          BACKGROUND LOADER             ==
+# ============================================
+# Runs a loading function on a separate thread, so the
+# menu can be up and responding while the level loads.
+# Python threads can't both run Python code at exactly
+# the same instant, but the menu spends nearly all its
+# time asleep waiting for input, and pygame lets other
+# threads run while it's loading images and sounds.
+#
+# Only ever call pygame.display from the main thread.
+# Loading images and making surfaces is fine.
+
+class Background_Loader(object):
+
+    # job is the function to run, and args are handed to it.
+    # If in_background is False, the job just runs right now
+    # instead, which is handy for checking if threads are
+    # causing a problem.
+    def __init__(self, job, args = (), in_background = True):
+
+        self.job = job
+        self.args = args
+        self.result = None
+        self.error = None
+
+        if in_background:
+            # daemon means the thread won't stop the game from quitting.
+            self.thread = threading.Thread(target = self.run, name = "background loader", daemon = True)
+            self.thread.start()
+        else:
+            self.thread = None
+            self.run()
+
+    def run(self):
+        try:
+            with tracing.span(self.job.__name__, "background"):
+                self.result = self.job(*self.args)
+        except Exception as error:
+            print("Background loading failed:")
+            traceback.print_exc()
+            self.error = error
+
+    def is_done(self):
+        return self.thread is None or not self.thread.is_alive()
+
+    # Wait for the job to finish and give back whatever it returned.
+    # while_waiting gets called every now and then, so the window can
+    # keep answering the operating system while we wait.
+    def wait(self, while_waiting = None):
+
+        while not self.is_done():
+            if while_waiting is not None: while_waiting()
+            self.thread.join(0.05)
+        if self.error is not None:
+            raise self.error
+        return self.result
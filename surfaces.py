@@ -0,0 +1,133 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Reads files out of the packed asset archive, if there is one
+import assets
+
+#Lets us keep a list of surfaces without keeping them alive
+import weakref
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+
+# ============================================
+# ==           SURFACE FACTORY              ==
+# ============================================
+# Every time pygame blits one surface onto another,
+# it has to make sure their pixels are stored the
+# same way. If they aren't, it quietly converts every
+# single pixel, every single time. That's slow!
+#
+# .convert() and .convert_alpha() fix this by changing
+# a surface to match the screen ONCE. The catch is that
+# they return a NEW surface, so it's easy to call them
+# and throw the result away by accident. So, anything
+# that we keep around and draw every frame (maps, sprite
+# frames, the HUD) should be made with these functions.
+#
+# NOTE: These only work after pygame.display.set_mode()
+# has been called, because until then pygame doesn't know
+# what the screen looks like.
+#
+# category says what the surface is for ("map", "hud", ...).
+# It's only used by the memory tracker; see track() below.
+
+# Make a new blank surface that already matches the screen.
+# Use alpha=True if it needs see-through pixels.
+def new_surface(size, alpha = False, category = "other"):
+    counters.add("surfaces made")
+    if alpha:
+        return track(pygame.Surface(size, pygame.SRCALPHA).convert_alpha(), category)
+    return track(pygame.Surface(size).convert(), category)
+
+# Convert an existing surface to match the screen.
+def to_display_format(surface, alpha = False, category = "other"):
+    if alpha:
+        return track(surface.convert_alpha(), category)
+    return track(surface.convert(), category)
+
+# Load an image file and convert it to match the screen.
+def load_image(filename, alpha = True, category = "images"):
+    return to_display_format(assets.load_image(filename), alpha, category)
+
+# ---------------------------------
+# Debug check
+# ---------------------------------
+# Turn on DEBUG_SURFACE_FORMAT in constants to have the game
+# complain about surfaces that get drawn every frame without
+# being converted first. Each place only complains once.
+
+# Places that have already complained, so we don't spam the console.
+reported_surfaces = set()
+
+def is_display_format(surface):
+    display = pygame.display.get_surface()
+    if display is None:
+        return True
+    # Surfaces with see-through pixels just need a per-pixel alpha
+    # layout the screen can blit quickly. Solid surfaces need to match
+    # the screen's pixel layout exactly.
+    if surface.get_flags() & pygame.SRCALPHA:
+        return surface.get_bitsize() == 32 and surface.get_masks()[3] != 0
+    return (surface.get_bitsize() == display.get_bitsize()
+            and surface.get_masks() == display.get_masks())
+
+def check_display_format(surface, where):
+    if DEBUG_SURFACE_FORMAT == False:
+        return
+    if where in reported_surfaces:
+        return
+    if not is_display_format(surface):
+        reported_surfaces.add(where)
+        print("Unconverted surface used every frame in " + where + ": " + str(surface))
+
+# ---------------------------------
+# Memory tracking
+# ---------------------------------
+# With MEMORY_TRACKING on, every surface we make remembers what it's
+# for, so memory_tracker.py can add up how much memory each kind of
+# surface is using. It's a WeakKeyDictionary, so being on the list
+# doesn't keep a surface alive. Once nothing else is using a surface
+# it just drops off the list.
+
+tracked_surfaces = weakref.WeakKeyDictionary()
+
+# Remember what a surface is for. Returns the surface, so it can wrap
+# wherever the surface gets made.
+def track(surface, category):
+    if MEMORY_TRACKING:
+        tracked_surfaces[surface] = category
+    return surface
+
+# About how many bytes of pixels a surface holds. Subsurfaces share
+# their parent's pixels, so they don't count.
+def surface_bytes(surface):
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_pitch() * surface.get_height()
+
+# Add up every tracked surface that's still alive:
+# category -> [how many, how many bytes]
+def surface_bytes_by_category():
+    totals = {}
+    for surface, category in list(tracked_surfaces.items()):
+        if category not in totals: totals[category] = [0, 0]
+        totals[category][0] += 1
+        totals[category][1] += surface_bytes(surface)
+    return totals
@@ -0,0 +1,276 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+import os
+#perf_counter_ns is the most exact clock Python has
+import time
+#json is how the trace file gets written
+import json
+#Spans can happen on the loader and simulation threads too
+import threading
+# A deque is a list that can throw away its oldest item when it gets
+# full, which is how the ring buffer forgets old events.
+from collections import deque
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+# ============================================
+# ==              TRACING                   ==
+# ============================================
+# The frame time tells you a frame was slow, but not why.
+# A hitch might start with a map loading on the background
+# thread and end with the main thread waiting for it.
+#
+# With TRACING on, the game writes down a "span" every time
+# it does something interesting: each part of the main loop,
+# loading maps and pictures, drawing the tiles, transitions,
+# and the work done on other threads. Each span is just a
+# name, when it started, and how long it took.
+#
+# When the game quits (or you press F9) they get saved to
+# TRACE_FILE in Chrome's "trace event" format. Open it at
+# https://ui.perfetto.dev (or chrome://tracing) and you get
+# a timeline with one row per thread.
+#
+# To write down a span, use one of these:
+#
+#     with tracing.span("draw tiles"):
+#         ...
+#
+#     @tracing.traced("load map", "load")
+#     def preview_new_map(map_name):
+#
+#     tracing.begin("update")   # for code that's awkward to indent
+#     ...
+#     tracing.end()
+#
+# Recording everything forever makes a huge file, so there
+# are two ways to keep less:
+#   TRACE_SAMPLE_FRAMES  - only keep every Nth frame of the
+#                          main loop. Frames slower than
+#                          TRACE_KEEP_SLOW_MS are always kept,
+#                          since those are the ones you want.
+#   TRACE_RING_SIZE      - only keep the newest this many
+#                          events (a "ring buffer"), so the
+#                          game can run all day and F9 saves
+#                          what just happened. 0 keeps them all.
+#
+# When TRACING is off, everything at the bottom of this file
+# gets swapped for versions that do nothing, and traced()
+# hands back the function it was given without wrapping it.
+
+class Tracer(object):
+
+    def __init__(self):
+
+        # The ring buffer forgets the oldest events once it's full.
+        if TRACE_RING_SIZE > 0:
+            self.events = deque(maxlen = TRACE_RING_SIZE)
+        else:
+            self.events = []
+        self.start_ns = time.perf_counter_ns()
+        self.pid = os.getpid()
+
+        # thread id -> thread name. These get written when saving, so the
+        # ring buffer can't throw them away.
+        self.thread_names = {}
+
+        # The main loop's events for the frame that's going on right now.
+        # They wait here until end_frame() decides whether to keep them.
+        self.main_thread = threading.main_thread().ident
+        self.frame_events = None
+        self.frame_number = 0
+        self.frame_start_ns = 0
+        self.dropped_frames = 0
+
+    # Microseconds since tracing started, which is what the trace format uses.
+    def timestamp(self, ns):
+        return (ns - self.start_ns) / 1000
+
+    def add(self, event):
+
+        thread = threading.get_ident()
+        event["pid"] = self.pid
+        event["tid"] = thread
+        if thread not in self.thread_names:
+            self.thread_names[thread] = threading.current_thread().name
+        # During a frame, the main thread's events wait to see if the frame is kept.
+        if self.frame_events is not None and thread == self.main_thread:
+            self.frame_events.append(event)
+        else:
+            self.events.append(event)
+
+    # A span that's already finished: started at start_ns and just ended.
+    # detail is anything extra to show when you click on it, like a filename.
+    def add_span(self, name, category, start_ns, end_ns, detail = None):
+        event = {"name": name, "cat": category, "ph": "X",
+                 "ts": self.timestamp(start_ns), "dur": (end_ns - start_ns) / 1000}
+        if detail is not None: event["args"] = {"detail": detail}
+        self.add(event)
+
+    def add_begin(self, name, category):
+        self.add({"name": name, "cat": category, "ph": "B", "ts": self.timestamp(time.perf_counter_ns())})
+
+    def add_end(self):
+        self.add({"ph": "E", "ts": self.timestamp(time.perf_counter_ns())})
+
+    # Something that happened at one moment, like the player dying.
+    def add_instant(self, name, category):
+        self.add({"name": name, "cat": category, "ph": "i", "s": "t",
+                  "ts": self.timestamp(time.perf_counter_ns())})
+
+    # ---------------------------------
+    # Frames
+    # ---------------------------------
+
+    def begin_frame(self):
+        self.frame_number += 1
+        self.frame_start_ns = time.perf_counter_ns()
+        self.frame_events = []
+
+    def end_frame(self):
+
+        if self.frame_events is None: return
+        end_ns = time.perf_counter_ns()
+        events = self.frame_events
+        self.frame_events = None
+
+        # Keep every Nth frame, and any frame that was slow.
+        slow = (end_ns - self.frame_start_ns) / 1000000 >= TRACE_KEEP_SLOW_MS
+        if self.frame_number % TRACE_SAMPLE_FRAMES == 0 or slow:
+            self.events.extend(events)
+            self.add_span("frame", "frame", self.frame_start_ns, end_ns, self.frame_number)
+        else:
+            self.dropped_frames += 1
+
+    # ---------------------------------
+    # Saving
+    # ---------------------------------
+
+    def save(self, filename = TRACE_FILE):
+
+        # Copy them first, since other threads might still be adding events.
+        events = list(self.events)
+        # Perfetto shows a thread's name on its row, instead of a number.
+        for thread, thread_name in list(self.thread_names.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": thread,
+                           "args": {"name": thread_name}})
+        trace = {"traceEvents": events,
+                 "displayTimeUnit": "ms",
+                 "otherData": {"frames": self.frame_number,
+                               "dropped frames": self.dropped_frames,
+                               "sample every": TRACE_SAMPLE_FRAMES,
+                               "ring size": TRACE_RING_SIZE}}
+        try:
+            with open(filename, "w") as trace_file:
+                json.dump(trace, trace_file)
+        except OSError as error:
+            print("Unable to save trace:", error)
+            return
+        print("Saved " + str(len(events)) + " trace events to " + filename)
+
+# Used by span(). Writes down how long the code inside the "with" took.
+class Span(object):
+
+    def __init__(self, name, category, detail):
+        self.name = name
+        self.category = category
+        self.detail = detail
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *error):
+        current_tracer.add_span(self.name, self.category, self.start_ns, time.perf_counter_ns(), self.detail)
+        return False
+
+# What span() hands back when tracing is off. There's only ever one,
+# so turning tracing off doesn't make a new object every time.
+class Null_Span(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        return False
+
+NULL_SPAN = Null_Span()
+
+# ---------------------------------
+# Shortcuts
+# ---------------------------------
+# These are what the rest of the game calls.
+
+current_tracer = None
+
+def span(name, category = "game", detail = None):
+    return Span(name, category, detail)
+
+def begin(name, category = "game"):
+    current_tracer.add_begin(name, category)
+
+def end():
+    current_tracer.add_end()
+
+# Write down a span that was timed somewhere else, like a garbage
+# collection (see gc_control.py). The times are from time.perf_counter_ns().
+def record(name, category, start_ns, end_ns, detail = None):
+    current_tracer.add_span(name, category, start_ns, end_ns, detail)
+
+def instant(name, category = "game"):
+    current_tracer.add_instant(name, category)
+
+def begin_frame():
+    current_tracer.begin_frame()
+
+def end_frame():
+    current_tracer.end_frame()
+
+def save(filename = TRACE_FILE):
+    current_tracer.save(filename)
+
+# Put a span around every call to a function. name defaults to the
+# function's name.
+def traced(name = None, category = "game"):
+    def wrap(function):
+        span_name = name or function.__name__
+        def traced_function(*args, **kwargs):
+            start_ns = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                current_tracer.add_span(span_name, category, start_ns, time.perf_counter_ns())
+        traced_function.__name__ = function.__name__
+        traced_function.__doc__ = function.__doc__
+        return traced_function
+    return wrap
+
+# ---------------------------------
+# Turned off
+# ---------------------------------
+
+def do_nothing(*args, **kwargs):
+    pass
+
+def null_span(name, category = "game", detail = None):
+    return NULL_SPAN
+
+def not_traced(name = None, category = "game"):
+    def wrap(function):
+        return function
+    return wrap
+
+if TRACING:
+    current_tracer = Tracer()
+else:
+    span = null_span
+    traced = not_traced
+    begin = end = record = instant = begin_frame = end_frame = save = do_nothing
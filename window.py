@@ -0,0 +1,167 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+# ============================================
+# ==             GAME WINDOW                ==
+# ============================================
+# The game always draws its picture at the same size,
+# SCREEN_W x SCREEN_H. We call that picture the "render
+# target". The window the player sees can be any size,
+# though, even fullscreen on a huge monitor.
+#
+# To get the picture into the window, we blow it up by
+# a whole number (2x, 3x, ...) so every pixel turns into
+# a neat square block, and center it with black bars
+# around the edges ("letterboxing"). Whole number scaling
+# is about the cheapest scaling there is, so a big window
+# costs barely more than a small one.
+#
+# The render target never changes, even when the window
+# does, so the rest of the game can hang on to it.
+
+class Game_Window(object):
+
+    def __init__(self):
+
+        self.fullscreen = FULLSCREEN_MODE
+        self.open_window((WINDOW_W, WINDOW_H))
+
+        # Everything in the game draws onto this.
+        self.render_target = surfaces.new_surface((SCREEN_W, SCREEN_H), category = "screen")
+
+    # Make (or remake) the actual window and work out the scaling.
+    def open_window(self, size):
+
+        if self.fullscreen:
+            # (0,0) asks pygame for the size of the monitor.
+            self.window = pygame.display.set_mode((0,0), pygame.FULLSCREEN)
+        else:
+            self.window = pygame.display.set_mode(size, pygame.RESIZABLE)
+
+        window_w, window_h = self.window.get_size()
+
+        # The biggest whole number that still fits. Never go below 1;
+        # if the window is tiny the picture just gets cut off.
+        self.scale = max(1, min(window_w // SCREEN_W, window_h // SCREEN_H))
+        scaled_w = SCREEN_W * self.scale
+        scaled_h = SCREEN_H * self.scale
+        self.offset = ((window_w - scaled_w) // 2, (window_h - scaled_h) // 2)
+
+        # Paint the letterbox bars once. They never change, but it does
+        # mean the next present() has to redraw the whole window.
+        self.window.fill(0)
+        self.needs_full_present = True
+
+        # The part of the window the scaled picture goes in. Scaling
+        # straight into it saves making a big temporary surface.
+        area = pygame.Rect(self.offset, (scaled_w, scaled_h)).clip(self.window.get_rect())
+        self.scaled_area = self.window.subsurface(area)
+
+    # Call this with every event. Handles the window being resized
+    # and F11 switching fullscreen on and off. Returns True if the
+    # window got remade, in case you need to draw something again.
+    def handle_event(self, event):
+
+        if event.type == pygame.VIDEORESIZE and not self.fullscreen:
+            self.open_window(event.size)
+            return True
+        elif event.type == pygame.KEYDOWN and event.key == K_F11:
+            self.fullscreen = not self.fullscreen
+            self.open_window((WINDOW_W, WINDOW_H))
+            return True
+        return False
+
+    # Send the finished picture to the monitor. If you pass a list of
+    # rects (in render target coordinates), only those parts get updated.
+    @tracing.traced("present", "render")
+    def present(self, dirty_rects = None):
+
+        if self.needs_full_present == True:
+            dirty_rects = None
+            self.needs_full_present = False
+
+        if dirty_rects is None:
+            # Scale the whole picture. scale2x is a special filter that
+            # smooths out diagonal edges on pixel art, but only does 2x.
+            if self.scale == 1:
+                self.window.blit(self.render_target, self.offset)
+            elif self.scale == 2 and SCALE2X_FILTER == True:
+                pygame.transform.scale2x(self.render_target, self.scaled_area)
+            else:
+                pygame.transform.scale(self.render_target, self.scaled_area.get_size(), self.scaled_area)
+            pygame.display.flip()
+            return
+
+        # Otherwise, scale and send just the parts that changed.
+        window_rects = []
+        for rect in dirty_rects:
+            rect = rect.clip(self.render_target.get_rect())
+            if rect.width == 0 or rect.height == 0: continue
+            window_rect = pygame.Rect(self.offset[0] + rect.x * self.scale,
+                                      self.offset[1] + rect.y * self.scale,
+                                      rect.width * self.scale,
+                                      rect.height * self.scale)
+            if self.scale == 1:
+                self.window.blit(self.render_target, window_rect, rect)
+            elif self.scale == 2 and SCALE2X_FILTER == True:
+                # scale2x looks at the pixels around each pixel, so filter a
+                # slightly bigger area and then only use the middle of it.
+                around = rect.inflate(2,2).clip(self.render_target.get_rect())
+                patch = pygame.transform.scale2x(self.render_target.subsurface(around))
+                middle = pygame.Rect((rect.x-around.x)*2, (rect.y-around.y)*2, rect.width*2, rect.height*2)
+                self.window.blit(patch, window_rect, middle)
+            else:
+                self.window.blit(pygame.transform.scale(self.render_target.subsurface(rect), window_rect.size), window_rect)
+            window_rects.append(window_rect)
+        pygame.display.update(window_rects)
+
+    # Turn a position in the window (like the mouse) into a position
+    # on the render target.
+    def window_to_screen(self, position):
+
+        return ((position[0] - self.offset[0]) // self.scale,
+                (position[1] - self.offset[1]) // self.scale)
+
+# ---------------------------------
+# Shortcuts
+# ---------------------------------
+# There's only ever one window, so the rest of the game can use
+# these instead of passing the window object around everywhere.
+
+current_window = None
+
+def open_game_window():
+    global current_window
+    current_window = Game_Window()
+    return current_window
+
+def present(dirty_rects = None):
+    current_window.present(dirty_rects)
+
+def handle_event(event):
+    return current_window.handle_event(event)
+
+def get_mouse_pos():
+    return current_window.window_to_screen(pygame.mouse.get_pos())
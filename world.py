@@ -0,0 +1,350 @@
+# ======================================
+# ==          I M P O R T S           ==
+# ======================================
+# Tell main where to find the libraries
+# and other game code. It will search in
+# this directory and in Thonny's directory.
+
+#Import Pygame
+import pygame
+#Share all of Pygame's methods and variables
+#so we can use them here without worrying about
+#telling the code to look in pygame for them
+#each time.
+from pygame.locals import *
+
+import math
+#.world files are JSON
+import json
+
+#This file contains CONSTANTS. To remind us not to
+#change them, we name them in all caps.
+import constants
+from constants import *
+
+import methods
+from methods import preview_new_map, load_map_image, blit_all_tiles
+#Opens files from the asset archive, or loose ones if there isn't one
+import assets
+#Makes surfaces that already match the screen's pixel format
+import surfaces
+#Loads maps on another thread
+import startup
+#The solidity grid every map gets
+import map_query
+#Counts how often the busy bits of the game run, if COUNTERS is on
+import counters
+#Writes a timeline of everything the game does, if TRACING is on
+import tracing
+
+# ============================================
+# ==              WORLD MODE                ==
+# ============================================
+# Normally each map is its own little world. Walking into
+# an exit stops the game, scrolls the screen over to the
+# next map, and loads it.
+#
+# In world mode (WORLD_MODE in constants.py), the maps are
+# laid out next to each other in one big world, like
+# rooms in a house, and you just walk from one to the next.
+# Where each map goes comes from a ".world" file, which is
+# what Tiled uses for this:
+#
+#   {"type": "world",
+#    "maps": [{"fileName": "Notlevel1.tmx", "x": 0, "y": 0,
+#              "width": 2880, "height": 480}, ...]}
+#
+# x, y, width and height are in pixels. Exits aren't used in
+# world mode; the maps just touch.
+#
+# The whole world would be too big to keep in memory, so
+# only maps near the player are "resident": loaded, drawn,
+# solid and full of enemies. When the player gets within
+# WORLD_RESIDENCY_RADIUS pixels of a map, it starts loading
+# on a background thread, so walking up to it never stops
+# the game. Once it's WORLD_UNLOAD_MARGIN further away than
+# that, it gets thrown away again, along with its enemies.
+# The map the player starts on always stays, so respawning
+# never has to wait.
+#
+# A World pretends to be a map (a tmxdata) as far as the
+# rest of the game is concerned: it has a width and height,
+# get_tile_properties(), objects, and a solidity grid for
+# map_query.py that covers the whole world. So sprites,
+# projectiles and the camera work across the seams between
+# maps without knowing anything about them.
+#
+# In the solidity grid, a map that isn't loaded yet is solid
+# (so nothing falls through it while it loads), and places
+# where there's no map at all are empty (so falling off the
+# bottom of a map works like it always did).
+
+# The properties get_tile_properties() hands back, for each combination
+# of solidity flags.
+TILE_PROPERTIES = {
+    0: {"solid": False, "platform": False},
+    map_query.SOLID: {"solid": True, "platform": False},
+    map_query.PLATFORM: {"solid": False, "platform": True},
+    map_query.SOLID | map_query.PLATFORM: {"solid": True, "platform": True},
+}
+
+# One map's place in the world.
+class World_Map(object):
+
+    UNLOADED = 0
+    LOADING = 1
+    LOADED = 2
+
+    def __init__(self, name, x, y, width, height):
+
+        self.name = name
+        # Where the map is in the world, in pixels.
+        self.rect = Rect(x, y, width, height)
+        self.state = self.UNLOADED
+        # The Background_Loader loading this map, while it's loading.
+        self.loader = None
+        # These are only set while the map is loaded.
+        self.tmxdata = None
+        self.image = None
+        # Enemies from this map, so they can go when the map does.
+        self.enemies = []
+        self.spawned = False
+
+    # Where the map's top left corner is, in tiles.
+    def tile_position(self):
+        return (self.rect.x // TILESIZE, self.rect.y // TILESIZE)
+
+# An object from one of the maps, moved to where it is in the world.
+# Has the same variables the game uses from pytmx's objects.
+class World_Object(object):
+
+    def __init__(self, tile_object, offset_x, offset_y):
+        self.name = tile_object.name
+        self.type = tile_object.type
+        self.x = tile_object.x + offset_x
+        self.y = tile_object.y + offset_y
+        self.width = tile_object.width
+        self.height = tile_object.height
+        self.properties = tile_object.properties
+
+# A solidity grid for the whole world. Maps get copied into it when they
+# load, and taken back out when they unload.
+class World_Grid(map_query.Solidity_Grid):
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.version = 0
+        # Start out empty everywhere.
+        self.flags = bytearray(width * height)
+
+    # Copy a map's grid in, with its top left corner at (tile_x, tile_y).
+    def paste(self, grid, tile_x, tile_y):
+        for row in range(0, grid.height):
+            start = (tile_y + row) * self.width + tile_x
+            self.flags[start:start + grid.width] = grid.flags[row * grid.width:(row + 1) * grid.width]
+        self.version += 1
+
+    # Set every tile in a rectangle of tiles to the same flags.
+    def fill(self, tile_x, tile_y, width, height, flags):
+        for row in range(0, height):
+            start = (tile_y + row) * self.width + tile_x
+            self.flags[start:start + width] = bytes([flags]) * width
+        self.version += 1
+
+# Read a .world file. Returns a list of World_Maps, moved so the top left
+# corner of the whole world is at (0, 0).
+def load_world_layout(filename):
+
+    with assets.open_asset(filename) as world_file:
+        layout = json.load(world_file)
+
+    world_maps = []
+    for entry in layout["maps"]:
+        width = entry.get("width")
+        height = entry.get("height")
+        # Tiled normally saves the size, but if it's missing we have to
+        # load the map to find out.
+        if width is None or height is None:
+            tmxdata = preview_new_map(entry["fileName"])
+            width = tmxdata.width * TILESIZE
+            height = tmxdata.height * TILESIZE
+        world_maps.append(World_Map(entry["fileName"], entry["x"], entry["y"], width, height))
+
+    left = min(world_map.rect.x for world_map in world_maps)
+    top = min(world_map.rect.y for world_map in world_maps)
+    for world_map in world_maps:
+        world_map.rect.move_ip(-left, -top)
+        if world_map.rect.x % TILESIZE != 0 or world_map.rect.y % TILESIZE != 0:
+            print("World map isn't lined up with the tiles:", world_map.name)
+    return world_maps
+
+# Everything about loading one map that can happen on another thread.
+def load_world_map(map_name):
+    tmxdata = preview_new_map(map_name)
+    image = load_map_image(tmxdata)
+    blit_all_tiles(image, tmxdata, (0, 0))
+    return tmxdata, image, map_query.make_grid(tmxdata)
+
+class World(object):
+
+    def __init__(self, filename, start_map_name):
+
+        self.maps = load_world_layout(filename)
+        world_rect = self.maps[0].rect.unionall([world_map.rect for world_map in self.maps])
+        # The size of the whole world, in tiles, like a map's.
+        self.width = math.ceil(world_rect.right / TILESIZE)
+        self.height = math.ceil(world_rect.bottom / TILESIZE)
+        self.tilewidth = TILESIZE
+        self.tileheight = TILESIZE
+        self.filename = filename
+
+        # map_query.get_grid() uses this instead of making its own.
+        self.solidity_grid = World_Grid(self.width, self.height)
+        for world_map in self.maps:
+            self.mark_unloaded(world_map)
+
+        # The start map loads right now, and never unloads.
+        self.start_map = None
+        for world_map in self.maps:
+            if world_map.name == start_map_name: self.start_map = world_map
+        if self.start_map is None:
+            print("Start map isn't in the world:", start_map_name)
+            self.start_map = self.maps[0]
+        self.start_loading(self.start_map, False)
+        self.finish_loading(self.start_map)
+
+        # The only objects the rest of the game sees are the start map's
+        # entrances, so respawning puts the player back at the start.
+        # Enemies get spawned by update() as each map loads.
+        offset_x, offset_y = self.start_map.rect.topleft
+        self.objects = [World_Object(tile_object, offset_x, offset_y)
+                        for tile_object in self.start_map.tmxdata.objects if tile_object.name == "entrance"]
+        # The canvas draw() draws onto.
+        self.canvas = None
+
+    # The start map's layers. Sprite_Handler looks through these when it
+    # looks for entrances.
+    @property
+    def visible_layers(self):
+        return self.start_map.tmxdata.visible_layers
+
+    # The same as pytmx's get_tile_properties, for anywhere in the world.
+    # Only "solid" and "platform" are filled in.
+    def get_tile_properties(self, tile_x, tile_y, layer):
+        tile_x = int(tile_x)
+        tile_y = int(tile_y)
+        if tile_x < 0 or tile_y < 0 or tile_x >= self.width or tile_y >= self.height:
+            raise ValueError("Tile is outside the world")
+        return TILE_PROPERTIES[self.solidity_grid.tile_flags(tile_x, tile_y)]
+
+    # ---------------------------------
+    # Loading and unloading
+    # ---------------------------------
+
+    # Call once a frame. Loads maps as the player gets close to them,
+    # unloads them when they get far away, and spawns the enemies of any
+    # maps that finished loading. In split screen, a map stays loaded
+    # while either player is near it.
+    def update(self, sprite_handler):
+
+        player_centers = [player.rect.center for player in sprite_handler.players]
+        for world_map in self.maps:
+            if world_map.state == World_Map.LOADING and world_map.loader.is_done():
+                self.finish_loading(world_map)
+            if world_map.state == World_Map.LOADED and world_map.spawned == False:
+                self.spawn_enemies(world_map, sprite_handler)
+
+            distance = min(self.distance_to_map(world_map, x, y) for x, y in player_centers)
+            if world_map.state == World_Map.UNLOADED and distance <= WORLD_RESIDENCY_RADIUS:
+                self.start_loading(world_map, BACKGROUND_LOADING)
+            elif (world_map.state == World_Map.LOADED and world_map is not self.start_map and
+                  distance > WORLD_RESIDENCY_RADIUS + WORLD_UNLOAD_MARGIN):
+                self.unload(world_map)
+
+    # How far (x, y) is from the nearest edge of a map. 0 if it's inside.
+    def distance_to_map(self, world_map, x, y):
+        rect = world_map.rect
+        distance_x = max(rect.left - x, 0, x - rect.right)
+        distance_y = max(rect.top - y, 0, y - rect.bottom)
+        return math.hypot(distance_x, distance_y)
+
+    def start_loading(self, world_map, in_background):
+        world_map.state = World_Map.LOADING
+        world_map.loader = startup.Background_Loader(load_world_map, (world_map.name,), in_background)
+
+    def finish_loading(self, world_map):
+
+        try:
+            tmxdata, image, grid = world_map.loader.wait()
+        except Exception:
+            # Background_Loader has already printed what went wrong. Leave
+            # the map solid, and don't keep trying.
+            world_map.loader = None
+            world_map.state = World_Map.LOADED
+            world_map.spawned = True
+            return
+        world_map.loader = None
+        world_map.tmxdata = tmxdata
+        world_map.image = image
+        tile_x, tile_y = world_map.tile_position()
+        self.solidity_grid.paste(grid, tile_x, tile_y)
+        world_map.state = World_Map.LOADED
+        world_map.spawned = False
+        counters.add("world maps loaded")
+        tracing.instant("loaded " + world_map.name, "load")
+
+    def spawn_enemies(self, world_map, sprite_handler):
+        world_map.spawned = True
+        if world_map.tmxdata is None: return
+        for tile_object in world_map.tmxdata.objects:
+            if tile_object.name == "enemy_spawn":
+                world_map.enemies.append(sprite_handler.spawn_enemy(tile_object.x + world_map.rect.x,
+                                                                    tile_object.y + world_map.rect.y))
+
+    # The sprite handler has thrown every enemy away (like when entering
+    # the world again), so spawn them all again.
+    def forget_enemies(self):
+        for world_map in self.maps:
+            world_map.enemies = []
+            if world_map.state == World_Map.LOADED: world_map.spawned = False
+
+    def unload(self, world_map):
+
+        for enemy in world_map.enemies:
+            enemy.kill()
+        world_map.enemies = []
+        world_map.tmxdata = None
+        world_map.image = None
+        world_map.state = World_Map.UNLOADED
+        self.mark_unloaded(world_map)
+        counters.add("world maps unloaded")
+        tracing.instant("unloaded " + world_map.name, "load")
+
+    # Make a map that isn't loaded solid, so nothing wanders into it.
+    def mark_unloaded(self, world_map):
+        tile_x, tile_y = world_map.tile_position()
+        self.solidity_grid.fill(tile_x, tile_y, world_map.rect.width // TILESIZE,
+                                world_map.rect.height // TILESIZE, map_query.SOLID)
+
+    # The names of the maps that are loaded right now.
+    def resident_maps(self):
+        return [world_map.name for world_map in self.maps if world_map.state == World_Map.LOADED]
+
+    # ---------------------------------
+    # Drawing
+    # ---------------------------------
+    # There's no picture of the whole world. Instead, every frame the
+    # bits of the loaded maps the camera can see get copied onto a canvas
+    # the size of the camera's view.
+
+    def draw(self, view_rect):
+
+        if self.canvas is None or self.canvas.get_size() != view_rect.size:
+            self.canvas = surfaces.new_surface(view_rect.size, category = "map")
+        self.canvas.fill(0)
+        for world_map in self.maps:
+            if world_map.image is None or not world_map.rect.colliderect(view_rect): continue
+            counters.add("blits")
+            self.canvas.blit(world_map.image, (world_map.rect.x - view_rect.x, world_map.rect.y - view_rect.y))
+        return self.canvas